@@ -0,0 +1,122 @@
+import asyncio
+import concurrent.futures
+import os
+import sys
+
+import compiler
+
+
+def make_executor(kind="thread", workers=None):
+    """
+    Creates an executor for compile_source() and compile_many().
+    :param kind: "thread" or "process".
+    :param workers: number of workers; None means executor's default.
+    """
+    if kind == "thread":
+        return concurrent.futures.ThreadPoolExecutor(workers)
+    elif kind == "process":
+        return concurrent.futures.ProcessPoolExecutor(workers)
+    raise ValueError("Unknown executor kind: %s" % kind)
+
+
+async def compile_source(source, insert_dir="", executor=None):
+    """
+    Compiles SIGNAL program given as a string off the event loop: lexical
+    analysis, parsing, code generation and reading of assembly insertion
+    files are run in 'executor'.
+    :param source: text of SIGNAL program.
+    :param insert_dir: directory, where assembly insertion files are searched
+    for.
+    :param executor: thread or process pool (see make_executor()); if None,
+    event loop's default executor is used.
+    :returns compiler.compile_string() result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, compiler.compile_string,
+                                      source, insert_dir)
+
+
+async def compile_path(filename, executor=None, write=True):
+    """
+    Compiles 'filename'.sig file. Source file is read and output files are
+    written in event loop's default executor, so they never block the loop.
+    :param filename: source file name without '.sig' extension.
+    :param executor: see compile_source() description.
+    :param write: if False, .asm and .lst files are not written.
+    :returns compiler.compile_file() result complemented by 'asm' and
+    'listing' keys (see compiler.compile_string() description).
+    """
+    loop = asyncio.get_running_loop()
+    source = await loop.run_in_executor(None, compiler.read_source, filename)
+    if source is None:
+        return compiler.file_result(filename)
+    compiled = await compile_source(source, os.path.dirname(filename),
+                                    executor)
+    asm_written = False
+    if write:
+        asm_written = await loop.run_in_executor(
+            None, compiler.write_outputs, filename, compiled)
+    res = compiler.file_result(filename, compiled, asm_written)
+    res["asm"] = compiled["asm"]
+    res["listing"] = compiled["listing"]
+    return res
+
+
+async def compile_many(filenames, max_concurrency=4, executor=None,
+                       write=True):
+    """
+    Compiles many files with at most 'max_concurrency' compilations running
+    at the same time. Results are yielded as soon as each compilation
+    completes, so their order may differ from the order of 'filenames'.
+
+    Usage:
+        async for res in compile_many(filenames):
+            ...
+
+    :param filenames: iterable of source file names without '.sig'
+    extension.
+    :param max_concurrency: maximal number of simultaneous compilations.
+    :param executor: see compile_source() description.
+    :param write: see compile_path() description.
+    :returns asynchronous generator of compile_path() results.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be positive")
+    pending = set()
+    names = iter(filenames)
+    try:
+        while True:
+            for filename in names:
+                pending.add(asyncio.ensure_future(
+                    compile_path(filename, executor, write)))
+                if len(pending) >= max_concurrency:
+                    break
+            if not pending:
+                break
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def main(paths, jobs=4, kind="thread"):
+    """
+    Compiles all of the given files and directories and prints results as
+    they complete.
+    :returns number of failed files.
+    """
+    failed = 0
+    with make_executor(kind, jobs) as executor:
+        async for res in compile_many(compiler.collect_sources(paths), jobs,
+                                      executor):
+            compiler.report(res)
+            if not res["found"] or res["errors"]:
+                failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main(sys.argv[1:])) else 0)
@@ -0,0 +1,456 @@
+import argparse
+import datetime
+import gc
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmark
+import build_manifest
+import compiler
+import tree_export
+import workload_generator
+
+DEFAULT_HISTORY = ".benchhistory.json"
+DEFAULT_SCALE = 1000
+DEFAULT_REPEAT = 7
+# A phase is a regression, if its median throughput has dropped by more
+# than DEFAULT_THRESHOLD (a fraction) and the drop is significant at level
+# DEFAULT_ALPHA (one-sided Mann-Whitney U test on the samples).
+DEFAULT_THRESHOLD = 0.1
+DEFAULT_ALPHA = 0.05
+# Samples' sizes, up to which the exact distribution of U is used
+EXACT_LIMIT = 400
+# Iterations of the calibration loop (see calibrate())
+CALIBRATION_LOOPS = 50000
+# Phases' throughput metrics: phase -> [unit, amount of work per second,
+# amount's divisor]
+METRICS = {"lex": ["MB/s", "bytes", 1e6],
+           "parse": ["tokens/s", "tokens", 1],
+           "codegen": ["statements/s", "statements", 1],
+           "listing": ["lines/s", "lines", 1]}
+
+
+def git_commit():
+    """
+    Returns [commit hash, dirty], where dirty is True if compiler's working
+    tree has uncommitted changes; [None, False] if git is not available.
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd,
+                                capture_output=True, text=True)
+        status = subprocess.run(["git", "status", "--porcelain", "-uno"],
+                                cwd=cwd, capture_output=True, text=True)
+    except OSError:
+        return [None, False]
+    if commit.returncode != 0:
+        return [None, False]
+    return [commit.stdout.strip(), bool(status.stdout.strip())]
+
+
+def calibrate():
+    """
+    Times a fixed pure Python loop, that doesn't depend on the compiler.
+    Speed of the machine drifts (frequency scaling, other processes), and
+    the drift is seen by this loop as well as by the compiler, so
+    throughput multiplied by this time is comparable between runs.
+    :returns seconds.
+    """
+    start = time.perf_counter()
+    counts = {}
+    for i in range(CALIBRATION_LOOPS):
+        key = i % 1000
+        counts[key] = counts.get(key, 0) + len(str(i))
+    return time.perf_counter() - start
+
+
+def workload_amounts(source, insert_dir, codegen=True):
+    """
+    Returns dictionary of amounts of work of 'source' (see METRICS): bytes,
+    tokens, statements and lines of listing.
+    """
+    code_gen = benchmark.prepare(source, insert_dir)
+    res = {"bytes": len(source.encode("latin-1", "replace")),
+           "tokens": len(code_gen.parser.token_list), "statements": 0,
+           "lines": 0}
+    for depth, node in tree_export.walk(code_gen.parser.syntax_tree):
+        if node == "<STATEMENT>":
+            res["statements"] += 1
+    if codegen:
+        code_gen.generate(io.StringIO())
+        listing = io.StringIO()
+        code_gen.listing(listing)
+        res["lines"] = listing.getvalue().count("\n") + 1
+    return res
+
+
+def measure(scenarios, scale=DEFAULT_SCALE, repeat=DEFAULT_REPEAT):
+    """
+    Runs benchmark.time_phases() 'repeat' times on every scenario's
+    workload and converts times into throughput (see METRICS). Runs go
+    round-robin over the scenarios, so that slow spells of the machine are
+    spread over all of them instead of shifting one scenario's samples, and
+    every run is preceded by calibrate().
+    :returns dictionary: 'SCENARIO:PHASE' -> {'unit', 'median', 'samples',
+    'normalized'}, where 'samples' are throughputs of the runs, 'median' is
+    their median, 'normalized' are throughputs multiplied by calibration
+    times. Phases without work (e.g. code generation of a program with
+    errors) are left out.
+    """
+    insert_dir = tempfile.mkdtemp(prefix="signal-bench-")
+    workloads = []
+    for scenario in scenarios:
+        codegen = workload_generator.SCENARIOS[scenario][2]
+        source = workload_generator.generate(scenario, scale, insert_dir)
+        workloads.append([scenario, source, codegen,
+                          workload_amounts(source, insert_dir, codegen)])
+        # The first run warms up caches and is not counted
+        benchmark.time_phases(source, insert_dir, codegen)
+    samples = dict((x[0], dict((y, []) for y in METRICS)) for x in workloads)
+    normalized = dict((x[0], dict((y, []) for y in METRICS))
+                      for x in workloads)
+    # Garbage collection is disabled, as its pauses make samples noisy
+    gc.disable()
+    try:
+        for i in range(repeat):
+            for scenario, source, codegen, amounts in workloads:
+                calibration = calibrate()
+                times = benchmark.time_phases(source, insert_dir,
+                                              codegen)[0]
+                for phase in times:
+                    unit, amount, divisor = METRICS[phase]
+                    if amounts[amount] and times[phase] > 0:
+                        throughput = amounts[amount] / divisor / times[phase]
+                        samples[scenario][phase].append(throughput)
+                        normalized[scenario][phase].append(
+                            throughput * calibration)
+            gc.collect()
+    finally:
+        gc.enable()
+    res = {}
+    for scenario, source, codegen, amounts in workloads:
+        for phase in benchmark.PHASES:
+            if samples[scenario][phase]:
+                res["%s:%s" % (scenario, phase)] = {
+                    "unit": METRICS[phase][0],
+                    "median": statistics.median(samples[scenario][phase]),
+                    "samples": samples[scenario][phase],
+                    "normalized": normalized[scenario][phase]}
+    return res
+
+
+def u_distribution(m, n):
+    """
+    Returns exact distribution of Mann-Whitney U statistic of samples of
+    sizes 'm' and 'n' without ties: list, which element #k is the number of
+    orderings with U = k.
+    """
+    # prev[j] is the distribution for sizes (i - 1, j)
+    prev = [[1] for j in range(n + 1)]
+    for i in range(1, m + 1):
+        row = [[1]]
+        for j in range(1, n + 1):
+            # The largest element is from the first sample (it exceeds all
+            # of j elements) or from the second one
+            counts = [0] * (i * j + 1)
+            for k, c in enumerate(row[j - 1]):
+                counts[k] += c
+            for k, c in enumerate(prev[j]):
+                counts[k + j] += c
+            row.append(counts)
+        prev = row
+    return prev[n]
+
+
+def mann_whitney(xs, ys):
+    """
+    One-sided Mann-Whitney U test: the probability to get U at least as
+    large as the observed one if 'ys' are not stochastically smaller than
+    'xs'. U counts pairs, where y < x (ties count as 1/2). The exact
+    distribution is used for small samples without ties, the normal
+    approximation with tie and continuity corrections otherwise.
+    :returns p-value.
+    """
+    m, n = len(xs), len(ys)
+    if m == 0 or n == 0:
+        return 1.0
+    u = 0.0
+    for x in xs:
+        for y in ys:
+            if y < x:
+                u += 1
+            elif y == x:
+                u += 0.5
+    values = sorted(xs + ys)
+    ties = len(values) != len(set(values))
+    if not ties and m * n <= EXACT_LIMIT:
+        counts = u_distribution(m, n)
+        return sum(counts[int(u):]) / sum(counts)
+    # Tie correction: sum of t^3 - t over groups of equal values
+    correction = 0
+    i = 0
+    while i < len(values):
+        j = i
+        while j < len(values) and values[j] == values[i]:
+            j += 1
+        correction += (j - i) ** 3 - (j - i)
+        i = j
+    total = m + n
+    variance = m * n / 12.0 * (total + 1 - correction / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - m * n / 2.0 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(base, new, threshold=DEFAULT_THRESHOLD, alpha=DEFAULT_ALPHA,
+            normalize=True):
+    """
+    Compares throughput of two runs (see measure()).
+    :param normalize: if True, normalized throughput is compared (see
+    calibrate()); raw one otherwise.
+    :returns list of [key, unit, base median, new median, relative change,
+    p-value of slowdown, verdict], where medians are raw throughputs,
+    verdict is "SLOWER" for regressions, "faster" for significant speedups,
+    "ok" otherwise.
+    """
+    field = "normalized" if normalize else "samples"
+    res = []
+    for key in sorted(base):
+        if key not in new:
+            continue
+        old_samples = base[key][field]
+        new_samples = new[key][field]
+        old_median = statistics.median(old_samples)
+        change = statistics.median(new_samples) / old_median - 1 \
+            if old_median else 0.0
+        p = mann_whitney(old_samples, new_samples)
+        verdict = "ok"
+        if change < -threshold and p < alpha:
+            verdict = "SLOWER"
+        elif change > threshold and \
+                mann_whitney(new_samples, old_samples) < alpha:
+            verdict = "faster"
+        res.append([key, base[key]["unit"], base[key]["median"],
+                    new[key]["median"], change, p, verdict])
+    return res
+
+
+class BenchHistory:
+    """
+    Benchmark history: a JSON file with a list of runs. A run is a
+    dictionary:
+        1) 'commit', 'dirty' - compiler's commit (see git_commit());
+        2) 'compiler' - hash of compiler's modules (see
+        build_manifest.compiler_hash());
+        3) 'date', 'python' - when and by what the run was made;
+        4) 'scale', 'repeat' - workloads' scale and number of runs;
+        5) 'results' - measure() result.
+
+    Class contents lists:
+    1. runs - runs in the order they were recorded.
+
+    Class contents methods:
+    1. __init__(self, path)
+    2. load(self)
+    3. save(self)
+    4. record(self, results, scale, repeat, commit=None)
+    5. find(self, ref)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.runs = []
+        self.load()
+
+    def load(self):
+        """
+        Reads history file; a missing file is treated as empty history.
+        :raises ValueError if the file is damaged.
+        """
+        try:
+            f = open(self.path, "r")
+        except FileNotFoundError:
+            return
+        try:
+            self.runs = json.load(f)["runs"]
+        except (KeyError, TypeError):
+            raise ValueError("%s is not a benchmark history" % self.path)
+        finally:
+            f.close()
+
+    def save(self):
+        """
+        Writes history file atomically.
+        """
+        compiler.replace_file(self.path, json.dumps({"runs": self.runs},
+                                                    indent=1))
+
+    def record(self, results, scale, repeat, commit=None):
+        """
+        Appends a run.
+        :param commit: commit to tag the run with; if None, the current one
+        is used.
+        :returns the run.
+        """
+        dirty = False
+        if commit is None:
+            commit, dirty = git_commit()
+        run = {"commit": commit, "dirty": dirty,
+               "compiler": build_manifest.compiler_hash(),
+               "date": datetime.datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(),
+               "scale": scale, "repeat": repeat, "results": results}
+        self.runs.append(run)
+        return run
+
+    def find(self, ref):
+        """
+        Finds a run by 'ref': its index in self.runs (negative ones count
+        from the end) or a prefix of its commit (the latest such run).
+        :returns the run.
+        :raises ValueError if there is no such run.
+        """
+        try:
+            return self.runs[int(ref)]
+        except IndexError:
+            raise ValueError("no run #%s in %s" % (ref, self.path))
+        except ValueError:
+            pass
+        for run in reversed(self.runs):
+            if run["commit"] and run["commit"].startswith(ref):
+                return run
+        raise ValueError("no run of commit %s in %s" % (ref, self.path))
+
+
+def run_name(run):
+    """
+    Returns a short description of a run: its commit and date.
+    """
+    return "%s%s (%s)" % ((run["commit"] or "unknown")[:12],
+                          "+" if run["dirty"] else "", run["date"])
+
+
+def print_comparison(rows, output=None):
+    """
+    Prints compare() result as a table.
+    """
+    print("%-26s %-13s %12s %12s %8s %7s" % (
+        "scenario:phase", "unit", "base", "new", "change", "p"),
+        file=output)
+    for key, unit, old, new, change, p, verdict in rows:
+        print("%-26s %-13s %12.4g %12.4g %+7.1f%% %7.3f  %s" % (
+            key, unit, old, new, change * 100, p, verdict), file=output)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Stores benchmark results (per-phase throughput "
+                    "medians) tagged with the commit and compares them, "
+                    "failing on significant slowdowns.")
+    arg_parser.add_argument("--history", default=DEFAULT_HISTORY,
+                            help="history file (default: %(default)s)")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="run benchmarks and store "
+                                                "the results")
+    check = commands.add_parser("check", help="run benchmarks and compare "
+                                              "them with a stored run")
+    check.add_argument("base", nargs="?", default="-1",
+                       help="run to compare with: index or commit "
+                            "(default: the latest one)")
+    check.add_argument("--save", action="store_true",
+                       help="store the results too")
+    for command in (record, check):
+        command.add_argument("-s", "--scenario", action="append",
+                             choices=sorted(workload_generator.SCENARIOS),
+                             help="scenario to run (default: all)")
+        command.add_argument("-n", "--scale", type=int,
+                             help="workload scale (default: %i, or the "
+                                  "base run's one for check)"
+                                  % DEFAULT_SCALE)
+        command.add_argument("-r", "--repeat", type=int,
+                             help="runs per workload (default: %i, or the "
+                                  "base run's number for check)"
+                                  % DEFAULT_REPEAT)
+        command.add_argument("--commit",
+                             help="commit to tag the results with "
+                                  "(default: the current one)")
+    compare_command = commands.add_parser("compare",
+                                          help="compare two stored runs")
+    compare_command.add_argument("base", nargs="?", default="-2",
+                                 help="index or commit (default: -2)")
+    compare_command.add_argument("new", nargs="?", default="-1",
+                                 help="index or commit (default: -1)")
+    for command in (check, compare_command):
+        command.add_argument("-t", "--threshold", type=float,
+                             default=DEFAULT_THRESHOLD,
+                             help="slowdown to ignore, as a fraction "
+                                  "(default: %(default)s)")
+        command.add_argument("-a", "--alpha", type=float,
+                             default=DEFAULT_ALPHA,
+                             help="significance level (default: "
+                                  "%(default)s)")
+        command.add_argument("--raw", action="store_true",
+                             help="compare raw throughput instead of the "
+                                  "one normalized by the calibration loop")
+    commands.add_parser("list", help="list stored runs")
+    args = arg_parser.parse_args(argv)
+    try:
+        history = BenchHistory(args.history)
+        if args.command == "list":
+            for i in range(len(history.runs)):
+                print("#%i %s" % (i, run_name(history.runs[i])))
+            return 0
+        if args.command == "compare":
+            base = history.find(args.base)
+            new = history.find(args.new)
+        elif args.command == "check":
+            base = history.find(args.base)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.command in ("record", "check"):
+        scale = args.scale or DEFAULT_SCALE
+        repeat = args.repeat or DEFAULT_REPEAT
+        if args.command == "check":
+            # Throughput depends on workload's size: the same one is used
+            scale = args.scale or base["scale"]
+            repeat = args.repeat or base["repeat"]
+        scenarios = args.scenario or sorted(workload_generator.SCENARIOS)
+        results = benchmark.with_recursion_limit(measure, scenarios, scale,
+                                                 repeat)
+        new = {"commit": args.commit, "dirty": False, "date": "now",
+               "scale": scale, "repeat": repeat, "results": results}
+        if args.command == "record" or args.save:
+            new = history.record(results, scale, repeat, args.commit)
+            history.save()
+            print("Results of %s are stored in %s"
+                  % (run_name(new), args.history))
+        if args.command == "record":
+            return 0
+    print("Base: %s\nNew:  %s" % (run_name(base), run_name(new)))
+    if base["scale"] != new["scale"]:
+        print("Warning: workloads' scales differ (%i and %i): throughput "
+              "is not comparable" % (base["scale"], new["scale"]))
+    rows = compare(base["results"], new["results"], args.threshold,
+                   args.alpha, not args.raw)
+    print_comparison(rows)
+    slower = [x for x in rows if x[6] == "SLOWER"]
+    if slower:
+        print("\n%i regression(s) beyond %.0f%% at significance %s"
+              % (len(slower), args.threshold * 100, args.alpha))
+        return 1
+    print("\nNo significant regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
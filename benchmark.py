@@ -0,0 +1,135 @@
+import argparse
+import io
+import statistics
+import sys
+import tempfile
+import time
+
+import code_generator
+import workload_generator
+
+# Parser is a recursive descent one: every nested IF statement adds stack
+# frames, so deeply nested workloads need a higher recursion limit (see
+# with_recursion_limit()).
+RECURSION_LIMIT = 1000000
+
+PHASES = ["lex", "parse", "codegen", "listing"]
+
+
+def with_recursion_limit(function, *args):
+    """
+    Calls 'function' with 'args' under RECURSION_LIMIT; the previous limit
+    is restored afterwards, so importing modules of benchmarks doesn't
+    change the interpreter's state.
+    :returns result of 'function'.
+    """
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, RECURSION_LIMIT))
+    try:
+        return function(*args)
+    finally:
+        sys.setrecursionlimit(old_limit)
+
+
+def prepare(source, insert_dir):
+    """
+    Creates CodeGenerator and performs lexical analysis and parsing of
+    'source' with it.
+    """
+    code_gen = code_generator.CodeGenerator(insert_dir)
+    code_gen.parser.parser(io.StringIO(source))
+    return code_gen
+
+
+def time_phases(source, insert_dir, codegen=True):
+    """
+    Times each phase of compilation separately:
+        'lex' - Lexer.analysis;
+        'parse' - Parser.parse_tokens (Parser.parser without lexing);
+        'codegen' - CodeGenerator.generate (CodeGenerator.code_gen without
+        lexing and parsing);
+        'listing' - CodeGenerator.listing.
+    :param codegen: if False, only 'lex' and 'parse' phases are timed.
+    :returns dictionary: phase -> seconds; and number of tokens.
+    """
+    res = {}
+    code_gen = code_generator.CodeGenerator(insert_dir)
+    start = time.perf_counter()
+    tokens = code_gen.parser.lex.analysis(io.StringIO(source))
+    res["lex"] = time.perf_counter() - start
+    start = time.perf_counter()
+    code_gen.parser.parse_tokens(tokens)
+    res["parse"] = time.perf_counter() - start
+    if codegen:
+        start = time.perf_counter()
+        code_gen.generate(io.StringIO())
+        res["codegen"] = time.perf_counter() - start
+        start = time.perf_counter()
+        code_gen.listing(io.StringIO())
+        res["listing"] = time.perf_counter() - start
+    return res, len(tokens)
+
+
+def run(scenarios, scales, repeat=5):
+    """
+    Runs benchmark.
+    :param scenarios: list of workload_generator.SCENARIOS keys.
+    :param scales: list of scales (see workload_generator.generate).
+    :param repeat: number of runs for each workload; medians are reported.
+    :returns list of dictionaries with keys: 'scenario', 'n', 'tokens',
+    'bytes' and medians of PHASES (seconds; None if a phase is not run).
+    """
+    results = []
+    insert_dir = tempfile.mkdtemp(prefix="signal-bench-")
+    for scenario in scenarios:
+        codegen = workload_generator.SCENARIOS[scenario][2]
+        for n in scales:
+            source = workload_generator.generate(scenario, n, insert_dir)
+            samples = dict((x, []) for x in PHASES)
+            tokens = 0
+            for i in range(repeat):
+                times, tokens = time_phases(source, insert_dir, codegen)
+                for phase in times:
+                    samples[phase].append(times[phase])
+            res = {"scenario": scenario, "n": n, "tokens": tokens,
+                   "bytes": len(source)}
+            for phase in PHASES:
+                res[phase] = statistics.median(samples[phase]) \
+                    if samples[phase] else None
+            results.append(res)
+    return results
+
+
+def print_results(results, output=None):
+    """
+    Prints benchmark results as a table (times in milliseconds).
+    """
+    print("%-15s %8s %9s" % ("scenario", "n", "tokens") +
+          "".join("%11s" % x for x in PHASES), file=output)
+    for res in results:
+        print("%-15s %8i %9i" % (res["scenario"], res["n"], res["tokens"]) +
+              "".join("%11s" % ("-" if res[x] is None
+                                else "%.3f" % (res[x] * 1000))
+                      for x in PHASES), file=output)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Times lexer, parser, code generator and listing on "
+                    "generated SIGNAL programs.")
+    arg_parser.add_argument("-s", "--scenario", action="append",
+                            choices=sorted(workload_generator.SCENARIOS),
+                            help="scenario to run (default: all)")
+    arg_parser.add_argument("-n", "--scale", type=int, action="append",
+                            help="workload scale (default: 10, 100, 1000)")
+    arg_parser.add_argument("-r", "--repeat", type=int, default=5,
+                            help="runs per workload (default: %(default)s)")
+    args = arg_parser.parse_args(argv)
+    print_results(with_recursion_limit(
+        run, args.scenario or sorted(workload_generator.SCENARIOS),
+        args.scale or [10, 100, 1000], args.repeat))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+
+# Modules, which output of every build depends on.
+PIPELINE_MODULES = ("lexical_analyzer", "syntax_analyzer", "code_generator",
+                    "compiler")
+
+
+def file_hash(path):
+    """
+    Returns SHA-256 hex digest of file's contents or None if the file doesn't
+    exist.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    h = hashlib.sha256()
+    chunk = f.read(65536)
+    while chunk:
+        h.update(chunk)
+        chunk = f.read(65536)
+    f.close()
+    return h.hexdigest()
+
+
+def compiler_modules(options=None):
+    """
+    Returns names of compiler's modules, which output files depend on.
+    :param options: dictionary of build options (see BuildManifest.options
+    description); 'stream' selects stream_compiler, 'binary' selects
+    x86_backend.
+    """
+    options = options or {}
+    modules = list(PIPELINE_MODULES)
+    if options.get("stream"):
+        modules.append("stream_compiler")
+    if options.get("binary"):
+        modules.append("x86_backend")
+    return modules
+
+
+def compiler_hash(options=None):
+    """
+    Returns a hash of compiler's own modules, that are selected by 'options'
+    (see compiler_modules()). If compiler is changed, all of the sources are
+    treated as out of date.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for name in compiler_modules(options):
+        path = os.path.join(directory, name + ".py")
+        h.update(("%s %s\n" % (name, file_hash(path))).encode())
+    return h.hexdigest()
+
+
+class BuildManifest:
+    """
+    Build manifest for incremental compilation.
+
+    Manifest is a JSON file, which stores for every successfully compiled
+    source:
+        1) 'hash' - hash of .sig file;
+        2) 'inserts' - dictionary: keys are names of assembly insertion files,
+        that code generator has tried to open, values are their hashes (None
+        for files that were not found);
+        3) 'compiler' - hash of compiler's modules, selected by the options
+        (see compiler_hash());
+        4) 'options' - options of the build, that affect output files (see
+        self.options description);
+        5) 'com' - True if .com image has been written.
+    A source is up to date, if none of the above has changed and its .asm and
+    .lst files exist (and .com file, if it has been written and is still
+    required).
+
+    Class contents dictionaries:
+    1. options - options of the current build, that output files depend
+    on: 'binary', 'stream', 'share_inserts', 'max_errors' (see
+    compiler.compile_file() description). A source built with other
+    options is out of date.
+
+    Class contents methods:
+    1. __init__(self, path, options=None)
+    2. load(self)
+    3. save(self)
+    4. is_up_to_date(self, filename)
+    5. record(self, filename, inserts, com=False)
+    6. forget(self, filename)
+    """
+
+    def __init__(self, path, options=None):
+        """
+        :param options: dictionary of options (see self.options
+        description); missing ones are taken as their defaults.
+        """
+        self.path = path
+        self.sources = {}
+        self.options = {"binary": False, "stream": False,
+                        "share_inserts": None, "max_errors": None}
+        self.options.update(options or {})
+        self.compiler = compiler_hash(self.options)
+        self.load()
+
+    def load(self):
+        """
+        Reads manifest file. A missing or damaged manifest is treated as
+        empty one.
+        """
+        try:
+            f = open(self.path, "r")
+        except FileNotFoundError:
+            return
+        try:
+            self.sources = json.load(f)
+        except ValueError:
+            self.sources = {}
+        f.close()
+
+    def save(self):
+        """
+        Writes manifest file.
+        """
+        f = open(self.path, "w")
+        json.dump(self.sources, f, indent=1, sort_keys=True)
+        f.close()
+
+    def is_up_to_date(self, filename):
+        """
+        Returns True if 'filename' doesn't need to be recompiled.
+        :param filename: source file name without '.sig' extension.
+        """
+        entry = self.sources.get(os.path.abspath(filename))
+        if entry is None or entry["compiler"] != self.compiler or \
+                entry.get("options") != self.options:
+            return False
+        if not os.path.exists(filename + ".asm") or \
+                not os.path.exists(filename + ".lst"):
+            return False
+        if self.options["binary"] and entry.get("com") and \
+                not os.path.exists(filename + ".com"):
+            return False
+        if entry["hash"] != file_hash(filename + ".sig"):
+            return False
+        for path in entry["inserts"]:
+            if entry["inserts"][path] != file_hash(path):
+                return False
+        return True
+
+    def record(self, filename, inserts, com=False):
+        """
+        Stores hashes of successfully compiled source and of its assembly
+        insertion files, and options of the build.
+        :param filename: source file name without '.sig' extension.
+        :param inserts: list of names of assembly insertion files (see
+        CodeGenerator.insert_files description).
+        :param com: True if .com image has been written.
+        """
+        self.sources[os.path.abspath(filename)] = {
+            "hash": file_hash(filename + ".sig"),
+            "inserts": dict((os.path.abspath(x), file_hash(x))
+                            for x in inserts),
+            "compiler": self.compiler,
+            "options": dict(self.options),
+            "com": bool(com)}
+
+    def forget(self, filename):
+        """
+        Removes 'filename' from manifest, so that it is recompiled next time.
+        """
+        self.sources.pop(os.path.abspath(filename), None)
@@ -0,0 +1,464 @@
+import io
+import os
+import sys
+
+import code_generator
+import compiler
+import syntax_analyzer
+
+
+class Checker(syntax_analyzer.Parser):
+    """
+    Validation-only analysis: a recognizer, that follows the rules of Parser
+    step by step (so syntax errors are the same), but only consumes tokens:
+    no syntax tree is built. Semantic checks of CodeGenerator (errors
+    #17-#22) are made while the program is being recognized, in the same
+    order as code generator makes them; no code is generated and no listing
+    is made. Assembly insertion files are checked for existence, but not
+    read.
+
+    Semantic errors are kept only if there are no syntax errors, as code
+    generator runs only on a successfully parsed program; after the first
+    syntax error semantic checks are skipped.
+
+    Lexer runs in offsets mode (see Lexer.offsets): lines and positions are
+    only needed for error messages, so they are computed for errors only.
+
+    The rules are recognized here rather than by Parser's own methods,
+    because those build the syntax tree as they go: on 55k tokens of the
+    'statements' workload Parser takes about 52 ms, this recognizer 17 ms
+    and offsets-mode lexing 54 ms, so reusing Parser would make validation
+    about 1.5 times slower. Lexing is most of the remaining time. Both
+    recognizers must accept the same grammar: tests/test_checker.py runs
+    the differential harness (see differential module) over the checker.
+
+    Methods parse_*() return a true value if the rule has been recognized to
+    its end, or [] (see Parser.process_error) otherwise; parse_identifier()
+    and parse_unsigned() return token's code, parse_param_list() and
+    parse_id_list() return lists of codes of parameters.
+
+    Class contents lists:
+    1. semantic_errors - semantic errors in the form of
+    CodeGenerator.error_list elements.
+    2. gotos - codes of labels referred by GOTO statements of the current
+    procedure.
+    3. insert_files - see CodeGenerator.insert_files description.
+
+    Class contents sets:
+    1. procedure_names, identifiers, parameters - see CodeGenerator
+    description (codes are integers here).
+
+    Class contents dictionaries:
+    1. labels - see CodeGenerator.labels description.
+
+    Class contents methods:
+    1. __init__(self, insert_dir="")
+    2. reset(self, insert_dir="")
+    3. check(self, source_file)
+    4. parse_*(self) - recognizers of the rules.
+    5. semantic(self), semantic_error(self, n, name, stop=True),
+    procedure_begin(self, code), declare_label(self, code, first=False),
+    mark_label(self, code), refer_label(self, code), insert(self, code),
+    check_gotos(self), procedure_end(self, params), identifier(self, code) -
+    semantic checks.
+    6. error_message(self, error_case) - see CodeGenerator.error_message.
+    """
+
+    def __init__(self, insert_dir=""):
+        syntax_analyzer.Parser.__init__(self)
+        self.lex.offsets = True
+        self.insert_resolver = None
+        self.reset(insert_dir)
+
+    def reset(self, insert_dir=""):
+        syntax_analyzer.Parser.reset(self)
+        self.insert_dir = insert_dir
+        self.semantic_errors = []
+        self.stopped = False
+        self.procedure_names = set()
+        self.identifiers = set()
+        self.parameters = set()
+        self.labels = {}
+        self.gotos = []
+        self.insert_files = []
+        self.var_id = None
+
+    def check(self, source_file):
+        """
+        Checks 'source_file'.
+        :returns 0 if the program is valid, or 1 otherwise; errors are in
+        self.error_list (see CodeGenerator.error_list description).
+        """
+        self.token_list = self.lex.analysis(source_file)
+        if not self.find_lexical_errors():
+            self.max_ct = len(self.token_list) - 1
+            self.parse_programs_list()
+            if not self.error_list:
+                self.error_list = self.semantic_errors
+                return 1 if self.error_list else 0
+        # Code generator doesn't run on programs with syntax errors
+        self.insert_files = []
+        return 1
+
+    def error_message(self, error_case):
+        return code_generator.CodeGenerator.error_message(self, error_case)
+
+    def token(self):
+        """
+        Returns the code of the current token, or None at the end.
+        """
+        if self.ct > self.max_ct:
+            return None
+        return self.token_list[self.ct][0]
+
+    def parse_programs_list(self):
+        res = self.parse_program()
+        while res:
+            self.ct += 1
+            if self.token() != 401:
+                self.ct -= 1
+                break
+            if not self.parse_program():
+                return []
+        return res
+
+    def parse_program(self):
+        if self.token() != 401:
+            return self.process_error(0)
+        self.ct += 1
+        self.procedure_begin(self.parse_identifier())
+        params = self.parse_param_list()
+        if self.token() != 59:
+            return self.process_error(1)
+        self.ct += 1
+        self.parse_block()
+        if self.token() != 59:
+            return self.process_error(1)
+        self.procedure_end(params)
+        return True
+
+    def parse_block(self):
+        self.parse_label_declarations()
+        if self.token() != 402:
+            return self.process_error(2)
+        self.ct += 1
+        self.parse_stmt_list()
+        self.check_gotos()
+        if self.token() != 403:
+            return self.process_error(3)
+        self.ct += 1
+        return True
+
+    def parse_label_declarations(self):
+        if self.token() == 402:
+            return True
+        if self.token() != 404:
+            return self.process_error(4)
+        self.ct += 1
+        self.declare_label(self.parse_unsigned(), True)
+        self.parse_labels_list()
+        if self.token() != 59:
+            return self.process_error(1)
+        self.ct += 1
+        return True
+
+    def parse_labels_list(self):
+        while self.token() != 59:
+            if self.token() != 44:
+                return self.process_error(5)
+            self.ct += 1
+            self.declare_label(self.parse_unsigned())
+        return True
+
+    def parse_param_list(self):
+        if self.token() == 59:
+            return []
+        if self.token() != 40:
+            return self.process_error(6)
+        self.ct += 1
+        params = [self.parse_identifier()]
+        params.extend(self.parse_id_list())
+        if self.token() != 41:
+            return self.process_error(7)
+        self.ct += 1
+        return params
+
+    def parse_id_list(self):
+        params = []
+        while self.token() != 41:
+            if self.token() != 44:
+                return self.process_error(5)
+            self.ct += 1
+            params.append(self.parse_identifier())
+        return params
+
+    def parse_stmt_list(self):
+        while self.token() not in (403, 41):
+            start = self.ct
+            self.parse_statement()
+            if self.ct > self.max_ct:
+                return self.process_error(3)
+            if self.ct == start:
+                break
+        return True
+
+    def parse_statement(self):
+        while self.token() not in (407, 59, 406, 301, 405):
+            code = self.parse_unsigned()
+            if self.token() != 58:
+                return self.process_error(9)
+            self.ct += 1
+            self.mark_label(code)
+        token = self.token()
+        self.ct += 1
+        if token == 407:
+            # Code generator doesn't support IF statement: its condition is
+            # taken for an undeclared label
+            if self.semantic():
+                self.semantic_error(22, "")
+            self.parse_condition()
+            for keyword, error in ((408, 14), (40, 6)):
+                if self.token() != keyword:
+                    return self.process_error(error)
+                self.ct += 1
+            self.parse_stmt_list()
+            for keyword, error in ((41, 7), (409, 15), (40, 6)):
+                if self.token() != keyword:
+                    return self.process_error(error)
+                self.ct += 1
+            self.parse_stmt_list()
+            for keyword, error in ((41, 7), (59, 1)):
+                if self.token() != keyword:
+                    return self.process_error(error)
+                self.ct += 1
+        elif token == 406:
+            if self.token() != 59:
+                return self.process_error(1)
+            self.ct += 1
+        elif token == 301:
+            code = self.parse_identifier()
+            if self.token() != 302:
+                return self.process_error(8)
+            self.ct += 1
+            self.insert(code)
+        elif token == 405:
+            code = self.parse_unsigned()
+            if self.token() != 59:
+                return self.process_error(1)
+            self.ct += 1
+            self.refer_label(code)
+        return True
+
+    def parse_condition(self):
+        if self.token() != 40:
+            return self.process_error(6)
+        self.ct += 1
+        self.parse_identifier()
+        if self.token() not in (62, 60, 303, 304):
+            return self.process_error(16)
+        self.ct += 1
+        self.parse_identifier()
+        if self.token() != 41:
+            return self.process_error(7)
+        self.ct += 1
+        return True
+
+    def parse_identifier(self):
+        if self.ct > self.max_ct or not self.lex.is_identifier(self.token()):
+            return self.process_error(10)
+        self.ct += 1
+        return self.token_list[self.ct - 1][0]
+
+    def parse_unsigned(self):
+        if self.ct > self.max_ct or not self.lex.is_constant(self.token()):
+            return self.process_error(11)
+        self.ct += 1
+        return self.token_list[self.ct - 1][0]
+
+    def semantic(self):
+        """
+        Returns True if semantic checks are to be made: there are no syntax
+        errors and code generator wouldn't have stopped yet.
+        """
+        return not self.error_list and not self.stopped
+
+    def semantic_error(self, n, name, stop=True):
+        """
+        Appends semantic error #n (see CodeGenerator.process_error).
+        :param name: name of identifier or label, that caused the error.
+        :param stop: if False, checks go on, as code generator ignores the
+        error's result (the first formal parameter).
+        """
+        self.semantic_errors.append([n, name])
+        if stop:
+            self.stopped = True
+
+    def identifier(self, code, stop=True):
+        """
+        Checks identifier 'code' (see CodeGenerator.code_gen_identifier).
+        :returns True if it is correct.
+        """
+        name = self.lex.identifier_names.get(code, "")
+        if code in self.parameters:
+            self.semantic_error(18, name, stop)
+            return False
+        if code in self.identifiers:
+            self.semantic_error(21, name, stop)
+            return False
+        self.identifiers.add(code)
+        return True
+
+    def procedure_begin(self, code):
+        """
+        See CodeGenerator.procedure_begin description.
+        """
+        if not self.semantic():
+            return
+        self.labels = {}
+        self.gotos = []
+        self.parameters = set()
+        self.identifiers = self.procedure_names
+        if self.identifier(code):
+            self.identifiers = {code}
+
+    def declare_label(self, code, first=False):
+        if not self.semantic():
+            return
+        if code in self.labels and not first:
+            self.semantic_error(17, self.lex.constant_names.get(code, ""))
+            return
+        self.labels[code] = False
+
+    def mark_label(self, code):
+        if not self.semantic():
+            return
+        if code not in self.labels:
+            self.semantic_error(22, self.lex.constant_names.get(code, ""))
+            return
+        self.labels[code] = True
+
+    def refer_label(self, code):
+        if not self.semantic():
+            return
+        if code not in self.labels:
+            self.semantic_error(22, self.lex.constant_names.get(code, ""))
+            return
+        self.gotos.append(code)
+
+    def insert(self, code):
+        """
+        Checks assembly insertion statement: its file's name and existence.
+        """
+        if not self.semantic() or not self.identifier(code):
+            return
+        name = self.lex.identifier_names.get(code, "")
+        if self.insert_resolver is not None:
+            self.insert_files.append(name)
+            found = self.insert_resolver(name) is not None
+        else:
+            path = os.path.join(self.insert_dir, name + ".asm")
+            self.insert_files.append(path)
+            found = os.path.isfile(path)
+        if not found:
+            self.semantic_error(20, name)
+
+    def check_gotos(self):
+        """
+        Checks labels referred by GOTO statements of the procedure, the last
+        statement first (see CodeGenerator.code_gen_stmt_list).
+        """
+        if not self.semantic():
+            return
+        for code in reversed(self.gotos):
+            if not self.labels[code]:
+                self.semantic_error(19, self.lex.constant_names.get(code, ""))
+                return
+
+    def procedure_end(self, params):
+        """
+        Checks formal parameters (see CodeGenerator.code_gen_param_list).
+        An error in the first parameter doesn't stop code generator.
+        """
+        if not self.semantic() or not params:
+            return
+        # If the first parameter is wrong, code generator adds the previous
+        # parameter (of this or of the previous procedure) once again
+        if self.identifier(params[0], False):
+            self.var_id = params[0]
+        self.parameters.add(self.var_id)
+        for code in params[1:]:
+            if not self.identifier(code):
+                return
+            self.var_id = code
+            self.parameters.add(code)
+
+
+def check_string(source, insert_dir="", checker=None, insert_resolver=None,
+                 max_errors=None):
+    """
+    Checks SIGNAL program given as a string (see Checker description).
+    Nothing is written; assembly insertion files are only checked for
+    existence.
+    :param source, insert_dir, insert_resolver, max_errors: see
+    compiler.compile_string() description.
+    :param checker: an instance of Checker to be reused; if None, a new one
+    is created.
+    :returns dictionary with keys 'errors', 'tokens' and 'inserts' (see
+    compiler.compile_string() description).
+    """
+    if checker is None:
+        checker = Checker(insert_dir)
+    else:
+        checker.reset(insert_dir)
+    checker.insert_resolver = insert_resolver
+    checker.lex.max_errors = max_errors
+    checker.lex.merge_errors = max_errors is not None
+    checker.check(io.StringIO(source, newline=None))
+    return {"errors": compiler.error_records(checker),
+            "tokens": len(checker.token_list),
+            "inserts": checker.insert_files}
+
+
+def check_all(filenames, output=None, max_errors=None):
+    """
+    Checks every file from 'filenames' with one warm Checker and prints its
+    errors as 'FILE.sig:LINE:POSITION: message' (semantic errors have no
+    position): all of the lexical errors, or the first syntax or semantic
+    error, as listing does.
+    :param max_errors: see compiler.compile_string() description.
+    :returns exit code: 0 if all of the files are valid, 1 otherwise.
+    """
+    checker = Checker()
+    invalid = 0
+    for filename in filenames:
+        source = compiler.read_source(filename)
+        if source is None:
+            print("No such file found: %s.sig" % filename, file=output)
+            invalid += 1
+            continue
+        res = check_string(source, os.path.dirname(filename), checker,
+                           max_errors=max_errors)
+        if not res["errors"]:
+            print("%s.sig: OK" % filename, file=output)
+            continue
+        invalid += 1
+        for error in res["errors"]:
+            message = error["message"].split(" (line")[0]
+            if error["line"] is None:
+                print("%s.sig: %s" % (filename, message), file=output)
+            else:
+                print("%s.sig:%i:%i: %s" % (filename, error["line"],
+                                            error["position"], message),
+                      file=output)
+            if error["code"] not in (12, 13):
+                break
+        if checker.lex.stopped:
+            print("%s.sig: lexical analysis stopped after %i error(s)"
+                  % (filename, max_errors), file=output)
+    print("\n%i file(s) checked, %i invalid" % (len(filenames), invalid),
+          file=output)
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(check_all(compiler.collect_sources(sys.argv[1:])))
@@ -1,3 +1,6 @@
+import io
+import os
+
 import syntax_analyzer
 
 
@@ -15,10 +18,20 @@ class CodeGenerator:
     errors found, remains empty. If semantic error occurs, a list of next type
     is appended: [N, T], where N is error's number (see self.process_error
     description), T is a code of token, that caused an error.
-    4. parameters - a list of strings, that represent user's identifiers'
+    4. insert_files - a list of names of assembly insertion files, that
+    code generator has tried to open (including not found ones). Is used to
+    track dependencies of compiled program. If insert_resolver is set, it
+    contains names, that have been passed to it.
+
+    Class contents sets:
+    1. parameters - a set of strings, that represent user's identifiers'
     codes. Is used to control duplication of formal parameters.
-    5. identifiers - a list of strings, that represent codes of all user's
-    identifiers. Is used to control identifiers' re-usage.
+    2. identifiers - a set of strings, that represent codes of all user's
+    identifiers of the current procedure. Is used to control identifiers'
+    re-usage.
+    3. procedure_names - a set of strings, that represent codes of
+    procedures' names, generated so far. Is used to control uniqueness of
+    procedures' names.
 
     Class contents dictionaries:
     1. labels - keys are strings, that represent codes of labels, that are
@@ -28,6 +41,9 @@ class CodeGenerator:
     keywords_table are created by constructor. They are copies of
     Lexer.two_char_separators, Lexer.identifiers, Lexer.constants and
     Lexer.keywords appropriately.
+    6. shared_inserts - keys are contents of assembly insertion files, that
+    are emitted as subroutines (see share_inserts), values are subroutines'
+    names. Files of the same contents share one subroutine.
 
     Class contents strings:
     1. proc_id - a buffer for a code of identifier - procedure's name.
@@ -37,33 +53,104 @@ class CodeGenerator:
     contains assembler's code for insertion.
     4. id - a buffer for a code of any identifier.
     5. unsigned - a buffer for a code of unsigned integer (label).
+    6. insert_dir - a directory, where assembly insertion files are searched
+    for. Empty string means current working directory.
+    7. label_prefix - prefix of labels of the current procedure.
+    8. params_code - code of parameters of the last generated procedure.
 
     Class contains objects:
     1. parser - an instance of class Parser. Is being created by constructor.
     2. code_file - file object, where generated code is being written.
+    3. stats - None or an instance of compile_stats.CompileStats. If it is
+    set, times of all of the compilation phases and counters are collected
+    into it (see CompileStats description).
+    4. insert_resolver - None or a function, that takes a name of assembly
+    insertion file (in upper case, as lexer stores identifiers, without
+    extension) and
+    returns its contents, or None if there is no such file. If it is set,
+    insertion files are got from it instead of self.insert_dir.
+
+    Class contents integer variables:
+    1. share_inserts - None or size threshold (characters). If it is set,
+    assembly insertion files of this size or larger are emitted only once,
+    as subroutines after the procedure, and every insertion of them is
+    replaced with a call; smaller files are inserted inline as usual. Code of
+    such files mustn't depend on where it is inserted (labels, stack).
+    2. jobs - number of worker processes, that procedures of a translation
+    unit are generated in (see code_gen_unit). 1 means the current process.
 
     Class contents methods:
-    1. __init__(self)
-    2. code_gen(self, source_file, code_file)
-    3-16: methods for code generation according to each rule of given grammar.
-    17. process_error(self, n, label=None)
-    18. listing(self, output)
+    1. __init__(self, insert_dir="")
+    2. reset(self, insert_dir="")
+    3. code_gen(self, source_file, code_file)
+    4. generate(self, code_file)
+    5-18: methods for code generation according to each rule of given grammar.
+    19. process_error(self, n, label=None)
+    20. error_message(self, error_case)
+    21. listing(self, output)
+    22-24. listing_start(self, output), listing_token(self, token, output)
+    (listing_located(self, token, output) for located tokens),
+    listing_end(self, output) - parts of listing, that are used for writing
+    it token by token.
+    25. code_gen_shared_inserts(self)
+    26. read_insert(self, name)
+    27. code_gen_unit(self, procedures), generate_parallel(self,
+    procedures) - code generation of translation unit.
+    28. procedure_begin(self, tree, index), procedure_end(self, tree) - parts
+    of code generation of a procedure, that are used by streaming code
+    generator too.
     """
     syntax_tree = []
     token_list = []
     error_list = []
     labels = {}
-    parameters = []
-    identifiers = []
+    parameters = set()
+    identifiers = set()
     proc_id = ""
     var_id = ""
     asm_file_name = ""
     id = ""
     unsigned = ""
+    insert_dir = ""
     code_file = None
-
-    def __init__(self):
+    stats = None
+    share_inserts = None
+    shared_inserts = {}
+    insert_resolver = None
+    jobs = 1
+    procedure_names = set()
+    label_prefix = ""
+    params_code = ""
+
+    def __init__(self, insert_dir=""):
         self.parser = syntax_analyzer.Parser()
+        self.reset(insert_dir)
+
+    def reset(self, insert_dir=""):
+        """
+        Clears the results of previous compilation (including parser's and
+        lexer's ones), so that the same instance can compile another file.
+        :param insert_dir: see self.insert_dir description.
+        """
+        self.parser.reset()
+        self.insert_dir = insert_dir
+        self.syntax_tree = []
+        self.token_list = []
+        self.error_list = []
+        self.labels = {}
+        self.parameters = set()
+        self.identifiers = set()
+        self.insert_files = []
+        self.shared_inserts = {}
+        self.procedure_names = set()
+        self.label_prefix = ""
+        self.params_code = ""
+        self.proc_id = ""
+        self.var_id = ""
+        self.asm_file_name = ""
+        self.id = ""
+        self.unsigned = ""
+        self.code_file = None
         self.identifiers_table = self.parser.lex.identifiers
         self.constants_table = self.parser.lex.constants
         self.keywords_table = self.parser.lex.keywords
@@ -71,51 +158,180 @@ class CodeGenerator:
 
     def code_gen(self, source_file, code_file):
         """
-        Main method for code generation.
+        Main method for code generation: performs lexical and syntax analysis
+        of 'source_file' and generates code (see self.generate description).
         :param source_file: file object, SIGNAL program, that is being
         compiled.
         :param code_file: file object, .asm file, which code is written to.
         :returns 0 in case of success, or 1 if any error (lexical, syntax,
         semantic) occurs.
+        """
+        self.parser.stats = self.stats
+        self.parser.lex.stats = self.stats
+        self.parser.parser(source_file)
+        return self.generate(code_file)
+
+    def generate(self, code_file):
+        """
+        Generates code out of the results of syntax analysis, that has been
+        already performed by self.parser.
+        :param code_file: file object, .asm file, which code is written to.
+        :returns 0 in case of success, or 1 if any error (lexical, syntax,
+        semantic) occurs.
 
         Rule #1:
-            <SIGNAL-PROGRAM> -> <PROGRAM>
+            <SIGNAL-PROGRAM> -> <PROGRAM> <PROGRAMS-LIST>
         Semantic definition:
-            {[1]}
+            see self.code_gen_unit description.
         """
         self.code_file = code_file
-        self.parser.parser(source_file)
         self.syntax_tree = self.parser.syntax_tree
         self.token_list = self.parser.token_list
         self.error_list = self.parser.error_list
-        if self.syntax_tree:
-            return self.code_gen_program(self.syntax_tree[1][1])
-        return 1
+        if not self.syntax_tree:
+            return 1
+        if self.stats is None:
+            return self.code_gen_unit(self.syntax_tree[1][1::2])
+        # Imported here to keep start-up of compilation without stats fast
+        import compile_stats
+        self.code_file = compile_stats.TimedWriter(code_file, self.stats)
+        self.stats.start("codegen")
+        res = self.code_gen_unit(self.syntax_tree[1][1::2])
+        self.stats.stop("codegen")
+        self.code_file = code_file
+        return res
 
-    def code_gen_program(self, tree):
+    def code_gen_unit(self, procedures):
+        """
+        Generates code of a translation unit: a sequence of procedures.
+        Each procedure has its own labels (see self.procedure_begin
+        description); the first procedure is the main one: its parameters
+        are pushed at the program's start. If self.jobs > 1, procedures are
+        generated in parallel worker processes, and their code is merged in
+        the order of the source.
+        Semantic definition:
+            {code segment \n assume cs:code \n [procedure #1] [procedure #2]
+            ... start: \n mov ax, 0 \n [parameters of procedure #1]
+            mov ax, 4c00h \n int 21h \n code ends \n end start \n}
+        :param procedures: list of <PROGRAM> rules' trees.
+        """
+        print("code segment\nassume cs:code\n", file=self.code_file)
+        params_code = ""
+        if self.jobs > 1 and len(procedures) > 1 and \
+                self.insert_resolver is None:
+            for i, res in enumerate(self.generate_parallel(procedures)):
+                self.code_file.write(res[0])
+                self.insert_files.extend(res[2])
+                if self.stats is not None:
+                    for name in res[4]:
+                        self.stats.count(name, res[4][name])
+                if res[1]:
+                    self.error_list.extend(res[1])
+                    return 1
+                if i == 0:
+                    params_code = res[3]
+        else:
+            for i in range(len(procedures)):
+                if self.code_gen_program(procedures[i], i) != 0:
+                    return 1
+                if i == 0:
+                    params_code = self.params_code
+        print("start:\nxor ax, ax", file=self.code_file)
+        self.code_file.write(params_code)
+        print("mov ax, 4c00h\nint 21h\ncode ends\n\nend start",
+              file=self.code_file)
+        return 0
+
+    def generate_parallel(self, procedures):
+        """
+        Generates code of 'procedures' in self.jobs worker processes (see
+        generate_procedure()). Trees are sent to workers flattened (see
+        flatten_tree()): pickling a tree, that nests one level per
+        statement, would exceed the recursion limit.
+        :returns list of generate_procedure() results in the order of
+        'procedures'.
+        """
+        import concurrent.futures
+        lex = self.parser.lex
+        seen = set()
+        tasks = []
+        for i in range(len(procedures)):
+            # Only an earlier procedure of the same name matters to a worker
+            name = str(procedures[i][2][1][0])
+            tasks.append([flatten_tree(procedures[i]), i,
+                          [name] if name in seen else []])
+            seen.add(name)
+        chunk = max(1, len(tasks) // (self.jobs * 4))
+        with concurrent.futures.ProcessPoolExecutor(
+                self.jobs, initializer=start_worker,
+                initargs=(lex.identifier_names, lex.constant_names,
+                          self.insert_dir, self.share_inserts)) as pool:
+            return list(pool.map(generate_procedure, tasks,
+                                 chunksize=chunk))
+
+    def code_gen_program(self, tree, index=0):
         """
         Rule #2:
             <PROGRAM> ->
                 PROCEDURE <PROCEDURE-IDENTIFIER> <PARAMETERS-LIST>; <BLOCK>;
         Semantic definition:
-            {code segment \n assume cs:code \n [3] PROCID proc \n push ebp \n
-            [1] pop ebp \n ret \n PROCID endp \n start: \n mov ax, 0 \n [2]
-            mov ax, 4c00h \n int 21h \n code ends \n end start \n}
+            {[3] PROCID proc \n push ebp \n [1] pop ebp \n ret \n
+            PROCID endp \n}
+        Code of parameters ([2]) is kept in self.params_code (see
+        self.procedure_end description).
+        :param index: number of the procedure in translation unit.
         """
-        print("code segment\nassume cs:code\n", file=self.code_file)
-        if self.code_gen_procedure_id(tree[2]) != 0:
+        if self.procedure_begin(tree[2], index) != 0:
             return 1
-        print("@%s proc\npush ebp" % self.proc_id, file=self.code_file)
         if self.code_gen_block(tree[7]) != 0:
             return 1
-        print("pop ebp\nret\n@%s endp\n\nstart:\nxor ax, ax" % self.proc_id,
-              file=self.code_file)
-        if self.code_gen_param_list(tree[4]) != 0:
+        return self.procedure_end(tree[4])
+
+    def procedure_begin(self, tree, index):
+        """
+        Starts code generation of a procedure: clears labels and
+        identifiers of the previous one, checks the procedure's name and
+        generates the beginning of the procedure.
+        Procedures' names must be unique in translation unit; other
+        identifiers must be unique in a procedure. Labels of procedures
+        after the first one are prefixed with procedure's name: @PROCID_N.
+        :param tree: <PROCEDURE-IDENTIFIER> rule's tree.
+        :param index: number of the procedure in translation unit.
+        """
+        self.labels = {}
+        self.parameters = set()
+        # The procedure's name is checked against (and added to) the names
+        # of the previous procedures
+        self.identifiers = self.procedure_names
+        self.shared_inserts = {}
+        self.label_prefix = ""
+        if self.code_gen_procedure_id(tree) != 0:
             return 1
-        print("mov ax, 4c00h\nint 21h\ncode ends\n\nend start",
-              file=self.code_file)
+        self.identifiers = {self.proc_id}
+        if index > 0:
+            self.label_prefix = "%s_" % self.proc_id
+        print("@%s proc\npush ebp" % self.proc_id, file=self.code_file)
         return 0
 
+    def procedure_end(self, tree):
+        """
+        Finishes code generation of a procedure: generates its end and
+        shared insertions' subroutines, and code of its parameters, that is
+        kept in self.params_code (it is written at the program's start, if
+        the procedure is the main one).
+        :param tree: <PARAMETERS-LIST> rule's tree.
+        """
+        print("pop ebp\nret\n@%s endp\n" % self.proc_id, file=self.code_file)
+        self.code_gen_shared_inserts()
+        if self.stats is not None:
+            self.stats.count("labels", len(self.labels))
+        code_file = self.code_file
+        self.code_file = io.StringIO()
+        res = self.code_gen_param_list(tree)
+        self.params_code = self.code_file.getvalue()
+        self.code_file = code_file
+        return res
+
     def code_gen_block(self, tree):
         """
         Rule #3:
@@ -161,14 +377,15 @@ class CodeGenerator:
         Semantic definitions:
             {[2][1]}
             {}
+        The list is handled in a loop, not recursively.
         """
-        if tree[0] == "<EMPTY>":
-            return 0
-        self.code_gen_unsigned(tree[2])
-        if self.unsigned in self.labels.keys():
-            return self.process_error(17)
-        self.labels[self.unsigned] = False
-        return self.code_gen_labels_list(tree[4])
+        while tree[0] != "<EMPTY>":
+            self.code_gen_unsigned(tree[2])
+            if self.unsigned in self.labels:
+                return self.process_error(17)
+            self.labels[self.unsigned] = False
+            tree = tree[4]
+        return 0
 
     def code_gen_param_list(self, tree):
         """
@@ -183,7 +400,7 @@ class CodeGenerator:
         if tree[0] == "<EMPTY>":
             return 0
         self.code_gen_variable_id(tree[2])
-        self.parameters.append(self.var_id)
+        self.parameters.add(self.var_id)
         print("push ax", file=self.code_file)
         return self.code_gen_id_list(tree[4])
 
@@ -196,14 +413,15 @@ class CodeGenerator:
         Semantic definitions:
             {[2] push ax \n [1]}
             {}
+        The list is handled in a loop, not recursively.
         """
-        if tree[0] == "<EMPTY>":
-            return 0
-        if self.code_gen_variable_id(tree[2]) != 0:
-            return 1
-        self.parameters.append(self.var_id)
-        print("push ax", file=self.code_file)
-        return self.code_gen_id_list(tree[4])
+        while tree[0] != "<EMPTY>":
+            if self.code_gen_variable_id(tree[2]) != 0:
+                return 1
+            self.parameters.add(self.var_id)
+            print("push ax", file=self.code_file)
+            tree = tree[4]
+        return 0
 
     def code_gen_stmt_list(self, tree):
         """
@@ -214,16 +432,21 @@ class CodeGenerator:
         Semantic definitions:
             {[2][1]}
             {}
-        """
-        if tree[0] == "<EMPTY>":
-            return 0
-        stmt_res = self.code_gen_statement(tree[1])
-        if type(stmt_res) == int and stmt_res != 0:
-            return 1
-        if self.code_gen_stmt_list(tree[3]) != 0:
-            return 1
-        if type(stmt_res) == str and not self.labels[stmt_res]:
-            return self.process_error(19, stmt_res)
+        The list is handled in a loop, not recursively. Labels referred by
+        GOTO statements are checked after the whole list, the last statement
+        first, as the recursive definition implies.
+        """
+        gotos = []
+        while tree[0] != "<EMPTY>":
+            stmt_res = self.code_gen_statement(tree[1])
+            if type(stmt_res) == int and stmt_res != 0:
+                return 1
+            if type(stmt_res) == str:
+                gotos.append(stmt_res)
+            tree = tree[3]
+        for label in reversed(gotos):
+            if not self.labels[label]:
+                return self.process_error(19, label)
         return 0
 
     def code_gen_statement(self, tree):
@@ -241,40 +464,79 @@ class CodeGenerator:
             {pop ebp \n ret \n}
             {}
             {[1]<assembler's code from file>}
+        Labels of a statement are handled in a loop, not recursively.
         """
+        while tree[0] not in (59, 405, 406, 301):
+            self.code_gen_unsigned(tree[1])
+            if self.unsigned not in self.labels.keys():
+                return self.process_error(22)
+            print("@%s%s:" % (self.label_prefix, self.unsigned),
+                  file=self.code_file)
+            self.labels[self.unsigned] = True
+            tree = tree[4]
         if tree[0] == 59:
             return 0
         elif tree[0] == 405:
             self.code_gen_unsigned(tree[2])
             if self.unsigned not in self.labels.keys():
                 return self.process_error(22)
-            print("jmp @%s" % self.unsigned, file=self.code_file)
+            print("jmp @%s%s" % (self.label_prefix, self.unsigned),
+                  file=self.code_file)
             return self.unsigned
         elif tree[0] == 406:
             print("pop ebp\nret", file=self.code_file)
             return 0
-        elif tree[0] == 301:
+        else:
             if self.code_gen_asm_file_id(tree[2]) != 0:
                 return 1
-            try:
-                asm_file_real_name = self.__get_identifier(self.asm_file_name)
-                asm = open(asm_file_real_name+".asm")
-            except FileNotFoundError:
+            if self.stats is not None:
+                self.stats.start("inserts")
+            text = self.read_insert(self.__get_identifier(self.asm_file_name))
+            if self.stats is not None:
+                self.stats.stop("inserts")
+            if text is None:
                 return self.process_error(20)
-            ch = asm.read(1)
-            while ch != "":
-                print(ch, file=self.code_file, end="")
-                ch = asm.read(1)
-            asm.close()
-            print(file=self.code_file)
+            if self.stats is not None:
+                self.stats.count("insert_bytes", len(text))
+            if self.share_inserts is None or len(text) < self.share_inserts:
+                print(text, file=self.code_file)
+                return 0
+            if text not in self.shared_inserts:
+                self.shared_inserts[text] = "@%sinsert%i" % (
+                    self.label_prefix, len(self.shared_inserts) + 1)
+            print("call %s" % self.shared_inserts[text],
+                  file=self.code_file)
             return 0
-        else:
-            self.code_gen_unsigned(tree[1])
-            if self.unsigned not in self.labels.keys():
-                return self.process_error(22)
-            print("@%s:" % self.unsigned, file=self.code_file)
-            self.labels[self.unsigned] = True
-            return self.code_gen_statement(tree[4])
+
+    def read_insert(self, name):
+        """
+        Returns the contents of assembly insertion file 'name' (without
+        extension), or None if it is not found. The file is got from
+        self.insert_resolver, or read from self.insert_dir.
+        """
+        if self.insert_resolver is not None:
+            self.insert_files.append(name)
+            return self.insert_resolver(name)
+        asm_path = os.path.join(self.insert_dir, name + ".asm")
+        self.insert_files.append(asm_path)
+        try:
+            asm = open(asm_path)
+        except FileNotFoundError:
+            return None
+        text = asm.read()
+        asm.close()
+        return text
+
+    def code_gen_shared_inserts(self):
+        """
+        Emits assembly insertion files, that are called as subroutines (see
+        self.share_inserts description), one subroutine for every distinct
+        contents.
+        """
+        for text in self.shared_inserts:
+            name = self.shared_inserts[text]
+            print("%s proc\n%s\nret\n%s endp\n" % (name, text, name),
+                  file=self.code_file)
 
     def code_gen_variable_id(self, tree):
         """
@@ -322,7 +584,7 @@ class CodeGenerator:
             return self.process_error(18)
         if self.id in self.identifiers:
             return self.process_error(21)
-        self.identifiers.append(self.id)
+        self.identifiers.add(self.id)
         return 0
 
     def code_gen_unsigned(self, tree):
@@ -364,20 +626,18 @@ class CodeGenerator:
         return 1
 
     def __get_identifier(self, code):
-        res = ""
-        for key in self.identifiers_table.keys():
-            if self.identifiers_table[key] == int(code):
-                res = key
-                break
-        return res
+        return self.__get_name(self.parser.lex.identifier_names, code)
 
     def __get_constant(self, code):
-        res = ""
-        for key in self.constants_table.keys():
-            if self.constants_table[key] == int(code):
-                res = key
-                break
-        return res
+        return self.__get_name(self.parser.lex.constant_names, code)
+
+    @staticmethod
+    def __get_name(names, code):
+        try:
+            return names.get(int(code), "")
+        except ValueError:
+            # Not a token's code (unsupported statement)
+            return ""
 
     def __get_two_char_separator(self, code):
         res = ""
@@ -395,113 +655,242 @@ class CodeGenerator:
                 break
         return res
 
+    def error_message(self, error_case):
+        """
+        Returns the text of error message.
+        :param error_case: an element of self.error_list.
+        """
+        if error_case[0] == 17:
+            return "Twice declared label: %s" % error_case[1]
+        elif error_case[0] == 18:
+            return "Duplicating formal parameter: %s" % error_case[1]
+        elif error_case[0] == 19:
+            return "Reference to non-existing label %s in GOTO statement" \
+                   % error_case[1]
+        elif error_case[0] == 20:
+            return "File not found: %s.ASM" % error_case[1]
+        elif error_case[0] == 21:
+            return "Re-used identifier: %s" % error_case[1]
+        elif error_case[0] == 22:
+            return "Reference to undeclared label %s" % error_case[1]
+        elif error_case[0] == 0:
+            res = "\"PROCEDURE\" keyword expected"
+        elif error_case[0] == 1:
+            res = "Semicolon expected"
+        elif error_case[0] == 2:
+            res = "\"BEGIN\" keyword expected"
+        elif error_case[0] == 3:
+            res = "\"END\" keyword expected"
+        elif error_case[0] == 4:
+            res = "\"LABEL\" keyword expected"
+        elif error_case[0] == 5:
+            res = "Comma expected"
+        elif error_case[0] == 6:
+            res = "Opening parenthesis expected"
+        elif error_case[0] == 7:
+            res = "Closing parenthesis expected"
+        elif error_case[0] == 8:
+            res = "\"$)\" expected"
+        elif error_case[0] == 9:
+            res = "Colon expected"
+        elif error_case[0] == 10:
+            res = "Identifier expected"
+        elif error_case[0] == 11:
+            res = "Unsigned integer expected"
+        elif error_case[0] == 12:
+            res = "Unresolved character"
+        elif error_case[0] == 13:
+            res = "Unclosed comment"
+        elif error_case[0] == 14:
+            res = "\"THEN\" keyword expected"
+        elif error_case[0] == 15:
+            res = "\"ELSE\" keyword expected"
+        else:
+            res = "Comparison operator expected"
+        return "%s (line %i, position %i)" % (res, error_case[1] + 1,
+                                              error_case[2] + 1)
+
     def listing(self, output):
         """
         Prints source program's listing: all of the tokens and first found
         error (lexical, syntax or semantic).
         :param output: file object, .lst file, where listing is written.
         """
-        line = 0
-        pos = 0
+        if self.stats is not None:
+            self.stats.start("listing")
+        self.listing_start(output)
+        for token in self.parser.lex.located_tokens(self.token_list):
+            if not self.listing_located(token, output):
+                break
+        self.listing_end(output)
+        if self.stats is not None:
+            self.stats.stop("listing")
+
+    def listing_start(self, output):
+        """
+        Starts listing: prints the number of the first line.
+        """
+        self.listing_line = 0
+        self.listing_pos = 0
         print("1.\t| ", file=output, end="")
-        for token in self.token_list:
-            if token[0] == "E1" and token[2] > line or token[0]\
-                    != "E1" and token[1] > line:
-                line += 1
-                pos = 0
-                print("\n%d.\t| " % (line + 1), file=output, end="")
-            if token[0] == "E1":
-                while pos < token[3]:
-                    pos += 1
-                    print(" ", file=output, end="")
-                print("%s" % token[1], file=output, end="")
+
+    def listing_token(self, token, output):
+        """
+        Prints one token into listing. Tokens are to be passed in the order
+        they are produced by lexer.
+        :returns False if no more tokens are to be listed (after unclosed
+        comment), True otherwise.
+        """
+        return self.listing_located(self.parser.lex.located(token), output)
+
+    def listing_located(self, token, output):
+        """
+        Prints one token with line and position (see Lexer.located) into
+        listing (see self.listing_token).
+        """
+        line = self.listing_line
+        pos = self.listing_pos
+        if token[0] == "E1" and token[2] > line or token[0]\
+                != "E1" and token[1] > line:
+            line += 1
+            pos = 0
+            print("\n%d.\t| " % (line + 1), file=output, end="")
+        if token[0] == "E1":
+            while pos < token[3]:
+                pos += 1
+                print(" ", file=output, end="")
+            print("%s" % token[1], file=output, end="")
+            pos += len(token[1])
+        else:
+            while pos < token[2]:
+                pos += 1
+                print(" ", file=output, end="")
+            if token[0] == "E2":
+                self.listing_line = line
+                self.listing_pos = pos
+                return False
+            elif token[0] in range(0, 256):
+                print("%s" % chr(token[0]), file=output, end="")
                 pos += 1
-            else:
-                while pos < token[2]:
-                    pos += 1
-                    print(" ", file=output, end="")
-                if token[0] == "E2":
-                    break
-                elif token[0] in range(0, 256):
-                    print("%s" % chr(token[0]), file=output, end="")
-                    pos += 1
-                elif token[0] in range(301, 401):
-                    print("%s" % self.__get_two_char_separator(token[0]),
-                          file=output, end="")
-                    pos += 2
-                elif token[0] in range(401, 501):
-                    buf = self.__get_keyword(token[0])
-                    print("%s" % buf, file=output, end="")
-                    pos += len(buf)
-                elif token[0] in range(501, 1001):
-                    buf = self.__get_constant(token[0])
-                    print("%s" % buf, file=output, end="")
-                    pos += len(buf)
-                else:  # token[0] > 1000
-                    buf = self.__get_identifier(token[0])
-                    print("%s" % buf, file=output, end="")
-                    pos += len(buf)
+            elif token[0] in range(301, 401):
+                print("%s" % self.__get_two_char_separator(token[0]),
+                      file=output, end="")
+                pos += 2
+            elif token[0] in range(401, 501):
+                buf = self.__get_keyword(token[0])
+                print("%s" % buf, file=output, end="")
+                pos += len(buf)
+            elif self.parser.lex.is_constant(token[0]):
+                buf = self.__get_constant(token[0])
+                print("%s" % buf, file=output, end="")
+                pos += len(buf)
+            else:  # identifier
+                buf = self.__get_identifier(token[0])
+                print("%s" % buf, file=output, end="")
+                pos += len(buf)
+        self.listing_line = line
+        self.listing_pos = pos
+        return True
+
+    def listing_end(self, output):
+        """
+        Finishes listing: prints the first found error, if any, and tells
+        if lexical analysis has been stopped by the error budget (see
+        Lexer.max_errors).
+        """
         if self.error_list:
             print("\n\nError occurred:", file=output)
-            error_case = self.error_list[0]
-            if error_case[0] == 0:
-                print("\"PROCEDURE\" keyword expected (line %i, position %i)"
-                      % (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 1:
-                print("Semicolon expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 2:
-                print("\"BEGIN\" keyword expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 3:
-                print("\"END\" keyword expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 4:
-                print("\"LABEL\" keyword expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 5:
-                print("Comma expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 6:
-                print("Opening parenthesis expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 7:
-                print("Closing parenthesis expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 8:
-                print("\"$)\" expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 9:
-                print("Colon expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 10:
-                print("Identifier expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 11:
-                print("Unsigned integer expected (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 12:
-                print("Unresolved character (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 13:
-                print("Unclosed comment (line %i, position %i)" %
-                      (error_case[1] + 1, error_case[2] + 1), file=output)
-            elif error_case[0] == 17:
-                print("Twice declared label: %s" % error_case[1],
-                      file=output)
-            elif error_case[0] == 18:
-                print("Duplicating formal parameter: %s" % error_case[1],
-                      file=output)
-            elif error_case[0] == 19:
-                print("Reference to non-existing label %s in GOTO statement" %
-                      error_case[1], file=output)
-            elif error_case[0] == 20:
-                print("File not found: %s.ASM" % error_case[1], file=output)
-            elif error_case[0] == 21:
-                print("Re-used identifier: %s" % error_case[1], file=output)
-            elif error_case[0] == 22:
-                print("Reference to undeclared label %s"
-                      % error_case[1], file=output)
+            print(self.error_message(self.error_list[0]), file=output)
+        if self.parser.lex.stopped:
+            print("Lexical analysis stopped after %i error(s)"
+                  % self.parser.lex.max_errors, file=output)
+
+
+# Tables of a worker process, that are shared by all of its procedures (see
+# start_worker()): [Lexer.identifier_names, Lexer.constant_names,
+# CodeGenerator.insert_dir, CodeGenerator.share_inserts].
+worker_tables = []
+
+
+def start_worker(identifier_names, constant_names, insert_dir,
+                 share_inserts):
+    """
+    Initializes a worker process of CodeGenerator.generate_parallel: the
+    tables are passed once per process, not once per procedure.
+    """
+    worker_tables[:] = [identifier_names, constant_names, insert_dir,
+                        share_inserts]
+
+
+def flatten_tree(tree):
+    """
+    Converts syntax tree 'tree' into a flat list, which is its preorder
+    walk without recursion: tokens' codes and symbols' names are kept as
+    they are, a list is replaced with -1 - N, where N is the number of its
+    elements, that follow it.
+    """
+    res = [-1 - len(tree)]
+    stack = [iter(tree)]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+        elif type(node) == list:
+            res.append(-1 - len(node))
+            stack.append(iter(node))
+        else:
+            res.append(node)
+    return res
+
+
+def unflatten_tree(flat):
+    """
+    Rebuilds a syntax tree out of flatten_tree() result without recursion.
+    """
+    tree = []
+    # Lists being filled and the numbers of their missing elements
+    stack = [[tree, -1 - flat[0]]]
+    for node in flat[1:]:
+        while stack[-1][1] == 0:
+            stack.pop()
+        stack[-1][1] -= 1
+        if type(node) == int and node < 0:
+            child = []
+            stack[-1][0].append(child)
+            stack.append([child, -1 - node])
+        else:
+            stack[-1][0].append(node)
+    return tree
+
+
+def generate_procedure(task):
+    """
+    Generates code of one procedure in a worker process (see
+    CodeGenerator.generate_parallel and start_worker).
+    :param task: list [T, I, P], where T is <PROGRAM> rule's tree
+    flattened by flatten_tree(), I is number of the procedure, P is a list
+    of names of the previous procedures, that the procedure's name is
+    checked against.
+    :returns list [C, E, F, PC, N]: generated code, list of errors,
+    CodeGenerator.insert_files, code of parameters and a dictionary of
+    counters (see CompileStats.counters).
+    """
+    flat, index, names = task
+    tree = unflatten_tree(flat)
+    identifier_names, constant_names, insert_dir, share_inserts = \
+        worker_tables
+    code_gen = CodeGenerator(insert_dir)
+    code_gen.parser.lex.identifier_names = identifier_names
+    code_gen.parser.lex.constant_names = constant_names
+    code_gen.share_inserts = share_inserts
+    code_gen.procedure_names = set(names)
+    import compile_stats
+    code_gen.stats = compile_stats.CompileStats()
+    code_gen.code_file = io.StringIO()
+    code_gen.code_gen_program(tree, index)
+    return [code_gen.code_file.getvalue(), code_gen.error_list,
+            code_gen.insert_files, code_gen.params_code,
+            code_gen.stats.counters]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+import errno
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import sys
+
+import code_generator
+import compiler
+
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one client connection. A client sends requests and receives
+    responses as JSON objects, one object per line; several requests may be
+    sent through the same connection.
+
+    Request keys:
+        'source' - text of SIGNAL program, or
+        'path' - name of .sig file to be compiled (read by the server);
+        'insert_dir' - (optional) directory, where assembly insertion files
+        are searched for; by default it is the directory of 'path', or
+        server's working directory for 'source'.
+    Response keys are the same as compiler.compile_string() result keys; if
+    request is malformed or can't be processed, response contains only
+    'error' key with a message: the connection is kept open.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode("utf-8"))
+                response = self.server.process(request)
+            except ValueError as e:
+                response = {"error": "Bad request: %s" % e}
+            except Exception as e:
+                response = {"error": "Internal error: %s: %s"
+                                     % (type(e).__name__, e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class CompileServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    """
+    Compile daemon, that listens to a Unix domain socket and serves
+    concurrent clients (one thread per connection).
+
+    The server keeps a pool of warm CodeGenerator instances: compilation
+    takes an instance from the pool (waiting if all of them are busy),
+    resets it and puts it back when finished.
+
+    A socket file left by a daemon, that is not running any more, is
+    replaced; if a daemon is still listening to it, or the path is not a
+    socket, the server refuses to start.
+
+    Class contents methods:
+    1. __init__(self, socket_path, instances=4)
+    2. process(self, request)
+    3. server_close(self)
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, instances=4):
+        """
+        :raises OSError if 'socket_path' is in use (see the class
+        description).
+        """
+        if os.path.lexists(socket_path):
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise OSError(errno.EEXIST, "Not a socket", socket_path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(socket_path)
+            except ConnectionRefusedError:
+                # Left by a daemon, that has exited
+                os.remove(socket_path)
+            else:
+                raise OSError(errno.EADDRINUSE,
+                              "Compile daemon is already running",
+                              socket_path)
+            finally:
+                sock.close()
+        socketserver.UnixStreamServer.__init__(self, socket_path,
+                                               CompileRequestHandler)
+        self.socket_path = socket_path
+        self.instances = queue.Queue()
+        for i in range(instances):
+            self.instances.put(code_generator.CodeGenerator())
+
+    def process(self, request):
+        """
+        Compiles one request (see CompileRequestHandler description).
+        :returns response dictionary.
+        :raises ValueError if the request is malformed.
+        """
+        if not isinstance(request, dict):
+            raise ValueError("JSON object expected")
+        for key in ["source", "path", "insert_dir"]:
+            if key in request and not isinstance(request[key], str):
+                raise ValueError("'%s' must be a string" % key)
+        if "source" in request:
+            source = request["source"]
+            insert_dir = request.get("insert_dir", "")
+        elif "path" in request:
+            filename = request["path"]
+            if filename[-4:] != ".sig":
+                filename += ".sig"
+            try:
+                f = open(filename, "r", encoding=compiler.SOURCE_ENCODING)
+                source = f.read()
+                f.close()
+            except OSError as e:
+                return {"error": "Cannot read %s: %s" % (filename,
+                                                         e.strerror)}
+            insert_dir = request.get("insert_dir", os.path.dirname(filename))
+        else:
+            raise ValueError("'source' or 'path' expected")
+        code_gen = self.instances.get()
+        try:
+            return compiler.compile_string(source, insert_dir, code_gen)
+        finally:
+            self.instances.put(code_gen)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def request(socket_path, source=None, path=None, insert_dir=None):
+    """
+    Sends one request to compile daemon and waits for the response.
+    :param socket_path: daemon's socket.
+    :param source, path, insert_dir: see CompileRequestHandler description.
+    :returns response dictionary.
+    """
+    req = {}
+    if source is not None:
+        req["source"] = source
+    if path is not None:
+        req["path"] = path
+    if insert_dir is not None:
+        req["insert_dir"] = insert_dir
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        f = sock.makefile("rwb")
+        f.write(json.dumps(req).encode("utf-8") + b"\n")
+        f.flush()
+        response = json.loads(f.readline().decode("utf-8"))
+        f.close()
+    finally:
+        sock.close()
+    return response
+
+
+def serve(socket_path, instances=4):
+    """
+    Runs compile daemon until it is interrupted.
+    :returns exit code: 1 if the daemon can't be started.
+    """
+    try:
+        server = CompileServer(socket_path, instances)
+    except OSError as e:
+        print("Can't listen on %s: %s" % (socket_path, e.strerror),
+              file=sys.stderr)
+        return 1
+    print("Listening on %s" % socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(serve(sys.argv[1] if len(sys.argv) > 1
+                   else "signal-compiler.sock"))
@@ -0,0 +1,135 @@
+import json
+import time
+
+
+class CompileStats:
+    """
+    Per-phase timers and counters of compilation.
+
+    Phases:
+        'lex' - lexical analysis (Lexer.analysis);
+        'parse' - syntax analysis (Parser.parse_tokens);
+        'semantic' - semantic checks: time of code generation except
+        emission and insertion copying;
+        'emission' - writing generated code;
+        'inserts' - reading assembly insertion files;
+        'listing' - writing listing (CodeGenerator.listing).
+    Counters: 'files', 'tokens', 'identifiers', 'constants', 'labels',
+    'emitted_lines', 'insert_bytes'.
+
+    Class contents dictionaries:
+    1. wall - keys are phases, values are wall clock time (seconds). Code
+    generation is stored as 'codegen' phase, 'semantic' phase is computed of
+    it.
+    2. cpu - the same for process CPU time.
+    3. counters - keys are counters' names, values are their values.
+
+    Class contents methods:
+    1. __init__(self)
+    2. start(self, phase)
+    3. stop(self, phase)
+    4. add_time(self, phase, wall, cpu)
+    5. count(self, name, n=1)
+    6. merge(self, data)
+    7. as_dict(self)
+    8. report(self, output=None, as_json=False)
+    """
+    PHASES = ["lex", "parse", "semantic", "emission", "inserts", "listing"]
+    COUNTERS = ["files", "tokens", "identifiers", "constants", "labels",
+                "emitted_lines", "insert_bytes"]
+
+    def __init__(self):
+        self.wall = {}
+        self.cpu = {}
+        self.counters = {}
+        self.started = {}
+
+    def start(self, phase):
+        self.started[phase] = (time.perf_counter(), time.process_time())
+
+    def stop(self, phase):
+        wall, cpu = self.started.pop(phase)
+        self.add_time(phase, time.perf_counter() - wall,
+                      time.process_time() - cpu)
+
+    def add_time(self, phase, wall, cpu):
+        self.wall[phase] = self.wall.get(phase, 0.0) + wall
+        self.cpu[phase] = self.cpu.get(phase, 0.0) + cpu
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, data):
+        """
+        Adds figures of another compilation.
+        :param data: result of CompileStats.as_dict().
+        """
+        for phase in data["wall"]:
+            self.add_time(phase, data["wall"][phase], data["cpu"][phase])
+        for name in data["counters"]:
+            self.count(name, data["counters"][name])
+
+    def as_dict(self):
+        """
+        Returns dictionary with keys 'wall', 'cpu' and 'counters'. Phases'
+        times are exclusive: 'semantic' doesn't include 'emission' and
+        'inserts'.
+        """
+        res = {"wall": {}, "cpu": {}, "counters": {}}
+        for times, key in ((self.wall, "wall"), (self.cpu, "cpu")):
+            for phase in times:
+                res[key][phase] = times[phase]
+            if "codegen" in times:
+                res[key]["semantic"] = max(
+                    res[key].pop("codegen") - times.get("emission", 0.0) -
+                    times.get("inserts", 0.0), 0.0)
+        for name in self.COUNTERS:
+            res["counters"][name] = self.counters.get(name, 0)
+        return res
+
+    def report(self, output=None, as_json=False):
+        """
+        Prints statistics in human-readable form or as JSON.
+        """
+        data = self.as_dict()
+        if as_json:
+            print(json.dumps(data, indent=1, sort_keys=True), file=output)
+            return
+        total_wall = sum(data["wall"].values()) or 1e-9
+        print("%-10s %11s %11s %7s" % ("phase", "wall, ms", "cpu, ms", "%"),
+              file=output)
+        for phase in self.PHASES:
+            wall = data["wall"].get(phase, 0.0)
+            print("%-10s %11.3f %11.3f %6.1f%%"
+                  % (phase, wall * 1000, data["cpu"].get(phase, 0.0) * 1000,
+                     wall / total_wall * 100), file=output)
+        print("%-10s %11.3f %11.3f"
+              % ("total", sum(data["wall"].values()) * 1000,
+                 sum(data["cpu"].values()) * 1000), file=output)
+        print(file=output)
+        for name in self.COUNTERS:
+            print("%-14s %i" % (name.replace("_", " "),
+                                data["counters"][name]), file=output)
+
+
+class TimedWriter:
+    """
+    File-like wrapper, that times writing into 'file' as 'emission' phase and
+    counts emitted lines.
+    """
+
+    def __init__(self, file, stats):
+        self.file = file
+        self.stats = stats
+
+    def write(self, text):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self.file.write(text)
+        self.stats.add_time("emission", time.perf_counter() - wall,
+                            time.process_time() - cpu)
+        self.stats.count("emitted_lines", text.count("\n"))
+        return len(text)
+
+    def flush(self):
+        self.file.flush()
@@ -1,27 +1,582 @@
+import argparse
+import functools
+import io
+import os
+import sys
+import time
+
 import code_generator
 
+# Source files are read and listings are written byte-transparently, so that
+# unresolved (non-ASCII) characters are reproduced in .lst files as they are.
+SOURCE_ENCODING = "latin-1"
+
+
+def collect_sources(paths):
+    """
+    Expands command line arguments into a list of source file names without
+    '.sig' extension. Directories are searched recursively for .sig files;
+    other arguments are taken as file names, '.sig' extension may be omitted.
+    :param paths: list of file and directory names.
+    :returns list of file names in the order they were given (files found in
+    a directory are sorted).
+    """
+    res = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for root, dirs, files in os.walk(path):
+                for name in files:
+                    if name[-4:] == ".sig":
+                        found.append(os.path.join(root, name[:-4]))
+            res.extend(sorted(found))
+        elif path[-4:] == ".sig":
+            res.append(path[:-4])
+        else:
+            res.append(path)
+    return res
+
+
+def open_temp(path, binary=False, encoding=None):
+    """
+    Creates a new temporary file in the directory of 'path', that is to
+    replace 'path' (see replace_file()).
+    :returns file object, opened for writing, and temporary file's name.
+    """
+    directory, name = os.path.split(path)
+    while True:
+        temp = os.path.join(directory, ".%s.%s.tmp"
+                            % (name, os.urandom(4).hex()))
+        try:
+            fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            break
+        except FileExistsError:
+            continue
+    return os.fdopen(fd, "wb" if binary else "w", encoding=encoding), temp
+
+
+def replace_file(path, data, encoding=None):
+    """
+    Writes 'data' (string or bytes) into file 'path' atomically: data is
+    written into a temporary file, which then replaces 'path', so readers
+    never see a partially written file.
+    """
+    f, temp = open_temp(path, isinstance(data, bytes), encoding)
+    try:
+        f.write(data)
+        f.close()
+        os.replace(temp, path)
+    except BaseException:
+        f.close()
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def write_if_changed(path, text, encoding=None):
+    """
+    Writes 'text' into file 'path' (see replace_file()) unless the file
+    already has exactly the same contents.
+    :returns True if the file has been written, False otherwise.
+    """
+    try:
+        f = open(path, "r", encoding=encoding)
+        old = f.read()
+        f.close()
+        if old == text:
+            return False
+    except (OSError, ValueError):
+        pass
+    replace_file(path, text, encoding)
+    return True
+
+
+def error_records(code_gen):
+    """
+    Converts code_gen.error_list into a list of dictionaries with keys:
+        'code' - error's number (see Parser.process_error and
+        CodeGenerator.process_error descriptions);
+        'message' - error message, as it is written in listing;
+        'line', 'position' - error's position in source code (starting from
+        1), or None for semantic errors.
+    """
+    res = []
+    for x in code_gen.error_list:
+        record = {"code": x[0], "message": code_gen.error_message(x),
+                  "line": None, "position": None}
+        if x[0] < 17:
+            record["line"] = x[1] + 1
+            record["position"] = x[2] + 1
+        res.append(record)
+    return res
 
-filename = input("File name [.sig]: ")
-if filename[-4:] == ".sig":
-    filename = filename[:-4]
-try:
-    f = open(filename+".sig", "r")
-    code_gen = code_generator.CodeGenerator()
-    g = open(filename + ".asm", "w")
-    code_gen.code_gen(f, g)
+
+def compile_string(source, insert_dir="", code_gen=None, stats=None,
+                   share_inserts=None, insert_resolver=None,
+                   procedure_jobs=1, offsets=False, max_errors=None):
+    """
+    Compiles SIGNAL program given as a string. Nothing is written on disk;
+    only assembly insertion files are read, unless 'insert_resolver' is
+    given: then compilation does no disk I/O at all.
+    :param source: text of SIGNAL program.
+    :param insert_dir: directory, where assembly insertion files are searched
+    for.
+    :param insert_resolver: None or a function, that returns the contents of
+    assembly insertion file by its name, or None if there is no such file
+    (see CodeGenerator.insert_resolver), e.g. get() method of a dictionary.
+    :param code_gen: an instance of CodeGenerator to be reused; if None, a
+    new one is created.
+    :param stats: None or an instance of compile_stats.CompileStats, which
+    compilation figures are added to.
+    :param share_inserts: None or size threshold of assembly insertion files,
+    that are emitted once as subroutines (see CodeGenerator.share_inserts).
+    :param procedure_jobs: number of worker processes, that procedures of
+    a multi-procedure program are compiled in (see CodeGenerator.jobs).
+    :param offsets: if True, lexer runs in offsets mode (see Lexer.offsets):
+    tokens hold source offsets, lines and positions are computed only for
+    errors and listing. Results are the same.
+    :param max_errors: None, or lexical error budget: runs of unresolved
+    characters are merged into one error and lexical analysis stops after
+    'max_errors' errors (see Lexer.max_errors).
+    :returns dictionary with keys:
+        'asm' - generated code, or None if compilation failed;
+        'listing' - text of listing;
+        'errors' - list of errors (see error_records() description);
+        'tokens' - number of tokens in source code;
+        'inserts' - list of assembly insertion files, the program depends on
+        (names passed to 'insert_resolver', if it is given).
+    """
+    if code_gen is None:
+        code_gen = code_generator.CodeGenerator(insert_dir)
+    else:
+        code_gen.reset(insert_dir)
+    code_gen.stats = stats
+    code_gen.share_inserts = share_inserts
+    code_gen.insert_resolver = insert_resolver
+    code_gen.jobs = procedure_jobs
+    code_gen.parser.lex.offsets = offsets
+    code_gen.parser.lex.max_errors = max_errors
+    code_gen.parser.lex.merge_errors = max_errors is not None
+    if stats is not None:
+        stats.count("files")
+    g = io.StringIO()
+    code_gen.code_gen(io.StringIO(source, newline=None), g)
+    h = io.StringIO()
+    code_gen.listing(h)
+    return {"asm": None if code_gen.error_list else g.getvalue(),
+            "listing": h.getvalue(),
+            "errors": error_records(code_gen),
+            "tokens": len(code_gen.token_list),
+            "inserts": code_gen.insert_files}
+
+
+def read_source(filename):
+    """
+    Reads 'filename'.sig file.
+    :returns text of the file, or None if it doesn't exist.
+    """
+    try:
+        f = open(filename + ".sig", "r", encoding=SOURCE_ENCODING)
+    except FileNotFoundError:
+        return None
+    source = f.read()
     f.close()
-    g.close()
-    if code_gen.error_list:
-        import os
-        os.remove(filename+".asm")
+    return source
+
+
+def write_outputs(filename, compiled):
+    """
+    Writes 'filename'.asm (or removes it if compilation failed) and
+    'filename'.lst files. Files are replaced atomically; files, which
+    contents haven't changed, are not rewritten.
+    :param filename: source file name without '.sig' extension.
+    :param compiled: compile_string() result.
+    :returns True if .asm file has been written, False otherwise.
+    """
+    asm_written = False
+    if compiled["asm"] is None:
+        if os.path.exists(filename + ".asm"):
+            os.remove(filename + ".asm")
+    else:
+        asm_written = write_if_changed(filename + ".asm", compiled["asm"])
+    write_if_changed(filename + ".lst", compiled["listing"], SOURCE_ENCODING)
+    return asm_written
+
+
+def write_binary(filename, asm):
+    """
+    Writes 'filename'.com image of generated code (see x86_backend module),
+    so that no external assembler is needed. If compilation failed or the
+    code is out of the subset, that the backend supports (this may happen
+    because of assembly insertion files), .com file is removed and .asm file
+    is to be assembled by an external assembler.
+    :param asm: generated code, or None if compilation failed.
+    :returns None if the image has been written or compilation failed, or
+    the reason why the image can't be made.
+    """
+    import x86_backend
+    reason = None
+    if asm is not None:
+        try:
+            replace_file(filename + ".com", x86_backend.assemble(asm))
+            return None
+        except x86_backend.EncodingError as e:
+            reason = str(e)
+    if os.path.exists(filename + ".com"):
+        os.remove(filename + ".com")
+    return reason
+
+
+def file_result(filename, compiled=None, asm_written=False):
+    """
+    Makes the result of compile_file() out of compile_string() result.
+    :param compiled: compile_string() result, or None if source file doesn't
+    exist.
+    """
+    res = {"name": filename, "found": compiled is not None, "errors": [],
+           "tokens": 0, "inserts": [], "asm_written": asm_written}
+    if compiled is not None:
+        res["errors"] = compiled["errors"]
+        res["tokens"] = compiled["tokens"]
+        res["inserts"] = compiled["inserts"]
+    return res
+
+
+def compile_file(filename, stats=False, stream=False, binary=False,
+                 share_inserts=None, procedure_jobs=1, max_errors=None):
+    """
+    Compiles 'filename'.sig file: writes 'filename'.asm if compilation is
+    successful and 'filename'.lst listing in any case (see write_outputs()).
+    Assembly insertion files are searched for in the directory of the source
+    file.
+    :param filename: source file name without '.sig' extension.
+    :param stats: if True, compilation figures are collected (see
+    compile_stats.CompileStats description).
+    :param stream: if True, the file is compiled in streaming mode (see
+    stream_compiler module); 'stats' is ignored then.
+    :param binary: if True, 'filename'.com image is written too (see
+    write_binary()).
+    :param share_inserts, procedure_jobs, max_errors: see compile_string()
+    description; 'procedure_jobs' is ignored in streaming mode.
+    :returns dictionary with keys:
+        'name' - filename;
+        'found' - False if source file doesn't exist, True otherwise;
+        'errors', 'tokens', 'inserts' - see compile_string() description;
+        'asm_written' - False if .asm file has been left untouched;
+        'stats' - (only if 'stats' is True) CompileStats.as_dict() result;
+        'binary' - (only if 'binary' is True) True if .com image has been
+        written; 'binary_error' - the reason why it hasn't, or None.
+    """
+    if stream:
+        import stream_compiler
+        res = stream_compiler.compile_file(filename, share_inserts,
+                                           max_errors)
+        asm = None
+        if binary and res["found"] and not res["errors"]:
+            f = open(filename + ".asm", "r")
+            asm = f.read()
+            f.close()
+    else:
+        source = read_source(filename)
+        if source is None:
+            return file_result(filename)
+        collector = None
+        if stats:
+            import compile_stats
+            collector = compile_stats.CompileStats()
+        compiled = compile_string(source, os.path.dirname(filename),
+                                  stats=collector,
+                                  share_inserts=share_inserts,
+                                  procedure_jobs=procedure_jobs,
+                                  max_errors=max_errors)
+        res = file_result(filename, compiled,
+                          write_outputs(filename, compiled))
+        if stats:
+            res["stats"] = collector.as_dict()
+        asm = compiled["asm"]
+    if binary and res["found"]:
+        res["binary_error"] = write_binary(filename, asm)
+        res["binary"] = asm is not None and res["binary_error"] is None
+    return res
+
+
+def report(res, output=None):
+    """
+    Prints the result of compile_file() on the screen.
+    :param output: file object; None means standard output.
+    """
+    if not res["found"]:
+        print("No such file found: %s.sig" % res["name"], file=output)
+        return
+    if res["errors"]:
+        print("%s: some error occurred: compilation failed" % res["name"],
+              file=output)
+    elif res["asm_written"]:
+        print("%s.asm file has been generated successfully" % res["name"],
+              file=output)
+    else:
+        print("%s.asm file is unchanged" % res["name"], file=output)
+    if res.get("binary"):
+        print("%s.com image has been generated" % res["name"], file=output)
+    elif res.get("binary_error"):
+        print("%s.com image can't be generated (%s): use %s.asm"
+              % (res["name"], res["binary_error"], res["name"]), file=output)
+    print("Listing is written to %s.lst" % res["name"], file=output)
+
+
+def compile_all(filenames, jobs=1, stats=False, stream=False,
+                binary=False, share_inserts=None, procedure_jobs=1,
+                max_errors=None, output=None):
+    """
+    Compiles all of the files from 'filenames' list using 'jobs' worker
+    processes and reports results in the order of 'filenames'.
+    :param filenames: list of source file names without '.sig' extension.
+    :param jobs: number of worker processes; if 1, files are compiled in the
+    current process.
+    :param stats, stream, binary, share_inserts, procedure_jobs,
+    max_errors: see compile_file() description.
+    :param output: file object, where results are reported (see report());
+    None means standard output.
+    :returns list of compile_file() results.
+    """
+    results = []
+    if jobs == 1 or len(filenames) < 2:
+        for filename in filenames:
+            results.append(compile_file(filename, stats, stream, binary,
+                                        share_inserts, procedure_jobs,
+                                        max_errors))
+            report(results[-1], output)
+        return results
+    # Imported here to keep start-up of single-file compilation fast
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        for res in pool.map(functools.partial(compile_file, stats=stats,
+                                              stream=stream, binary=binary,
+                                              share_inserts=share_inserts,
+                                              procedure_jobs=procedure_jobs,
+                                              max_errors=max_errors),
+                            filenames):
+            results.append(res)
+            report(res, output)
+    return results
+
+
+def memory_profile_all(filenames):
+    """
+    Profiles memory usage of compilation of every file from 'filenames' (see
+    memory_profile module). Files are profiled one by one in the current
+    process, output files are not written.
+    :returns exit code: 1 if any file is not found, 0 otherwise.
+    """
+    import memory_profile
+    missing = 0
+    for filename in filenames:
+        source = read_source(filename)
+        if source is None:
+            print("No such file found: %s.sig" % filename)
+            missing += 1
+            continue
+        print("%s.sig:" % filename)
+        memory_profile.report(memory_profile.profile_source(
+            source, os.path.dirname(filename)))
+        print()
+    return 1 if missing else 0
+
+
+def interactive():
+    """
+    Asks for one file name, compiles it and waits for Enter to be pressed.
+    """
+    filename = input("File name [.sig]: ")
+    if filename[-4:] == ".sig":
+        filename = filename[:-4]
+    res = compile_file(filename)
+    if not res["found"]:
+        print("No such file found")
+    elif res["errors"]:
         print("Some error occurred: compilation failed")
+        print("Listing is written to %s.lst" % filename)
     else:
         print("%s.asm file has been generated successfully" % filename)
-    h = open(filename + ".lst", "w")
-    code_gen.listing(h)
-    h.close()
-    print("Listing is written to %s.lst" % filename)
+        print("Listing is written to %s.lst" % filename)
     input()
-except FileNotFoundError:
-    print("No such file found")
-    input()
\ No newline at end of file
+
+
+def main(argv=None):
+    """
+    Command line entry point. Without arguments works interactively;
+    otherwise compiles all of the given files and directories, or runs
+    compile daemon (see compile_server module), a worker of distributed
+    builds (see distributed module) or diagnostics server (see lsp_server
+    module), or watches the files (see watcher module).
+    :returns exit code: 0 if all of the files have been compiled
+    successfully, 1 otherwise.
+    """
+    arg_parser = argparse.ArgumentParser(
+        description="Compiles SIGNAL programs (.sig) to assembler code.")
+    arg_parser.add_argument("paths", nargs="*",
+                            help=".sig files or directories containing them")
+    arg_parser.add_argument("-j", "--jobs", type=int,
+                            default=os.cpu_count() or 1,
+                            help="number of worker processes")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="recompile only sources, whose .sig or "
+                                 "insertion files have changed")
+    arg_parser.add_argument("--manifest", default=".sigbuild.json",
+                            help="build manifest file for --incremental "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument("--serve", metavar="SOCKET",
+                            help="run compile daemon on Unix domain socket "
+                                 "SOCKET with -j warm compiler instances")
+    arg_parser.add_argument("--worker", metavar="HOST:PORT",
+                            help="run a worker of distributed builds with "
+                                 "-j processes")
+    arg_parser.add_argument("--workers", metavar="HOST:PORT,...",
+                            help="compile on workers of distributed builds "
+                                 "(see distributed module)")
+    arg_parser.add_argument("--lsp", action="store_true",
+                            help="run editor diagnostics server (JSON-RPC "
+                                 "on standard input and output)")
+    arg_parser.add_argument("--stats", nargs="?", const="text",
+                            choices=["text", "json"],
+                            help="print per-phase times and counters, as a "
+                                 "table (default) or as JSON")
+    arg_parser.add_argument("--memprofile", action="store_true",
+                            help="report peak and retained memory and top "
+                                 "allocating lines of every phase instead "
+                                 "of writing output files")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="compile statement by statement with "
+                                 "memory bounded by the largest statement")
+    arg_parser.add_argument("--binary", action="store_true",
+                            help="also write .com image of generated code, "
+                                 "so that no external assembler is needed")
+    arg_parser.add_argument("--share-inserts", type=int, metavar="SIZE",
+                            help="emit assembly insertion files of SIZE "
+                                 "characters or larger once, as subroutines, "
+                                 "and call them at every insertion")
+    arg_parser.add_argument("--procedure-jobs", type=int, default=1,
+                            metavar="N",
+                            help="generate code of procedures of a "
+                                 "multi-procedure program in N worker "
+                                 "processes")
+    arg_parser.add_argument("--check", action="store_true",
+                            help="only check the sources for lexical, "
+                                 "syntax and semantic errors; no files are "
+                                 "written")
+    arg_parser.add_argument("--max-errors", type=int, metavar="N",
+                            help="merge runs of unresolved characters into "
+                                 "one error and stop lexical analysis of a "
+                                 "file after N errors")
+    arg_parser.add_argument("--fail-fast", action="store_true",
+                            help="stop lexical analysis of a file at the "
+                                 "first error (the same as --max-errors 1)")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="compile, then recompile affected sources "
+                                 "whenever they or their insertion files "
+                                 "change")
+    arg_parser.add_argument("--poll", action="store_true",
+                            help="with --watch: poll files for changes "
+                                 "instead of using inotify")
+    args = arg_parser.parse_args(argv)
+    if args.serve:
+        import compile_server
+        return compile_server.serve(args.serve, args.jobs)
+    if args.worker:
+        import distributed
+        try:
+            address = distributed.parse_address(args.worker)
+        except ValueError:
+            arg_parser.error("bad address: %s" % args.worker)
+        return distributed.serve(address, max(1, args.jobs))
+    if args.lsp:
+        import lsp_server
+        return lsp_server.serve()
+    if not args.paths:
+        interactive()
+        return 0
+    if args.jobs < 1:
+        arg_parser.error("number of jobs must be positive")
+    if args.procedure_jobs < 1:
+        arg_parser.error("number of procedure jobs must be positive")
+    if args.share_inserts is not None and args.share_inserts < 0:
+        arg_parser.error("insertion size threshold must not be negative")
+    if args.max_errors is not None and args.max_errors < 1:
+        arg_parser.error("error budget must be positive")
+    if args.fail_fast:
+        args.max_errors = 1
+    if args.stats is not None and (args.stream or args.workers):
+        arg_parser.error("--stats can't be used with --stream or --workers: "
+                         "phases are not timed there")
+    # With JSON statistics standard output is left for the JSON object only
+    output = sys.stderr if args.stats == "json" else None
+    if args.watch:
+        import watcher
+        return watcher.watch(args.paths, args.poll, binary=args.binary,
+                             share_inserts=args.share_inserts,
+                             procedure_jobs=args.procedure_jobs,
+                             max_errors=args.max_errors)
+    filenames = collect_sources(args.paths)
+    if args.check:
+        import checker
+        return checker.check_all(filenames, max_errors=args.max_errors)
+    if args.memprofile:
+        return memory_profile_all(filenames)
+    manifest = None
+    if args.incremental:
+        import build_manifest
+        manifest = build_manifest.BuildManifest(
+            args.manifest, {"binary": args.binary, "stream": args.stream,
+                            "share_inserts": args.share_inserts,
+                            "max_errors": args.max_errors})
+        stale = [x for x in filenames if not manifest.is_up_to_date(x)]
+        if len(stale) < len(filenames):
+            print("%i file(s) are up to date" % (len(filenames) - len(stale)),
+                  file=output)
+        filenames = stale
+    start = time.perf_counter()
+    if args.workers:
+        import distributed
+        try:
+            workers = [distributed.parse_address(x)
+                       for x in args.workers.split(",") if x]
+        except ValueError:
+            arg_parser.error("bad address in %s" % args.workers)
+        results = distributed.build(filenames, workers, args.binary,
+                                    args.share_inserts, args.max_errors,
+                                    output=output)
+    else:
+        results = compile_all(filenames, args.jobs, args.stats is not None,
+                              args.stream, args.binary, args.share_inserts,
+                              args.procedure_jobs, args.max_errors, output)
+    if manifest is not None:
+        for res in results:
+            if res["found"] and not res["errors"]:
+                manifest.record(res["name"], res["inserts"],
+                                res.get("binary", False))
+            else:
+                manifest.forget(res["name"])
+        manifest.save()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    failed = len([x for x in results if not x["found"] or x["errors"]])
+    tokens = sum(x["tokens"] for x in results)
+    print("\n%i file(s) compiled, %i failed in %.3f s "
+          "(%.1f files/s, %.1f tokens/s)"
+          % (len(results), failed, elapsed, len(results) / elapsed,
+             tokens / elapsed), file=output)
+    if args.stats is not None:
+        import compile_stats
+        total = compile_stats.CompileStats()
+        for res in results:
+            if "stats" in res:
+                total.merge(res["stats"])
+        if args.stats == "json":
+            total.report(as_json=True)
+        else:
+            print()
+            total.report()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
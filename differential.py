@@ -0,0 +1,366 @@
+import argparse
+import importlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import checker
+import code_generator
+import compiler
+import stream_compiler
+import workload_generator
+
+# Parts of results, that engines are compared on, in the order they are
+# checked. An engine returns None for parts it doesn't produce (e.g. the
+# checker makes no code): such parts are not compared.
+PARTS = ["exception", "tokens", "identifiers", "constants", "errors", "asm",
+         "listing"]
+# Pieces inserted into random programs to make them malformed.
+NOISE = ["GOTO", ";", ":", ",", "1", "X", "BEGIN", "END", "LABEL",
+         "PROCEDURE", "RETURN", "IF", "THEN", "ELSE", "(", ")", "($", "$)",
+         "(*", "*)", "(* a\n b *)", "\n", "\t", "$", "#", "<", "<=", ">=",
+         "=", "00", "\xe9"]
+# Chunks, that programs are shrunk by: words and other characters with
+# their leading whitespace.
+CHUNK = re.compile(r"\s*(?:\w+|\S)|\s+")
+
+
+def pipeline_result(code_gen, source):
+    """
+    Compiles 'source' with 'code_gen' (CodeGenerator or its subclass) and
+    makes the result of an engine (see ENGINES description).
+    """
+    g = io.StringIO()
+    h = io.StringIO()
+    code_gen.code_gen(io.StringIO(source, newline=None), g)
+    code_gen.listing(h)
+    lex = code_gen.parser.lex
+    return {"tokens": [lex.located(x) for x in code_gen.token_list],
+            "identifiers": dict(lex.identifiers),
+            "constants": dict(lex.constants),
+            "errors": code_gen.error_list,
+            "asm": None if code_gen.error_list else g.getvalue(),
+            "listing": h.getvalue()}
+
+
+def reference_engine(source, insert_dir):
+    """
+    Reference pipeline: Lexer, Parser and CodeGenerator.
+    """
+    return pipeline_result(code_generator.CodeGenerator(insert_dir), source)
+
+
+def offsets_engine(source, insert_dir):
+    """
+    Reference pipeline with lexer in offsets mode (see Lexer.offsets).
+    """
+    code_gen = code_generator.CodeGenerator(insert_dir)
+    code_gen.parser.lex.offsets = True
+    return pipeline_result(code_gen, source)
+
+
+def stream_engine(source, insert_dir):
+    """
+    Streaming compilation (see stream_compiler module). Tokens are collected
+    as they are listed.
+    """
+    code_gen = stream_compiler.StreamCodeGenerator(insert_dir)
+    tokens = []
+    listing_token = code_gen.listing_token
+
+    def collect(token, output):
+        tokens.append(token)
+        return listing_token(token, output)
+
+    code_gen.listing_token = collect
+    g = io.StringIO()
+    h = io.StringIO()
+    code_gen.code_gen(io.StringIO(source, newline=None), g, h)
+    lex = code_gen.parser.lex
+    return {"tokens": tokens,
+            "identifiers": dict(lex.identifiers),
+            "constants": dict(lex.constants),
+            "errors": code_gen.error_list,
+            "asm": None if code_gen.error_list else g.getvalue(),
+            "listing": h.getvalue()}
+
+
+def checker_engine(source, insert_dir):
+    """
+    Validation-only recognizer (see checker module): no code and listing.
+    """
+    check = checker.Checker(insert_dir)
+    check.check(io.StringIO(source, newline=None))
+    lex = check.lex
+    return {"tokens": [lex.located(x) for x in check.token_list],
+            "identifiers": dict(lex.identifiers),
+            "constants": dict(lex.constants),
+            "errors": check.error_list,
+            "asm": None, "listing": None}
+
+
+# Engines: names -> functions, that compile a program given as a string
+# with assembly insertion files in a directory and return dictionaries with
+# PARTS keys: 'tokens' - token list in the form of Lexer.tokens() ones;
+# 'identifiers', 'constants' - lexer's tables; 'errors' - CodeGenerator's
+# error_list; 'asm' - generated code, or None if compilation failed;
+# 'listing' - text of listing. Other engines are given on the command line
+# as MODULE:FUNCTION.
+ENGINES = {"reference": reference_engine, "offsets": offsets_engine,
+           "stream": stream_engine, "checker": checker_engine}
+
+
+def load_engine(name):
+    """
+    Returns engine 'name': a key of ENGINES or MODULE:FUNCTION.
+    :raises ValueError if there is no such engine.
+    """
+    if name in ENGINES:
+        return ENGINES[name]
+    module, _, function = name.partition(":")
+    if not function:
+        raise ValueError("unknown engine: %s" % name)
+    try:
+        return getattr(importlib.import_module(module), function)
+    except (ImportError, AttributeError) as e:
+        raise ValueError("can't load engine %s: %s" % (name, e))
+
+
+def run_engine(engine, source, insert_dir):
+    """
+    Runs 'engine' on 'source'.
+    :returns its result (an exception is a result too: its type is kept
+    under 'exception' key) and time taken (seconds).
+    """
+    start = time.perf_counter()
+    try:
+        res = engine(source, insert_dir)
+        res["exception"] = None
+    except Exception as e:
+        res = {"exception": type(e).__name__}
+    return res, time.perf_counter() - start
+
+
+def compare(expected, actual):
+    """
+    Returns list of PARTS, that differ in two results (parts, that either
+    of engines doesn't produce, are skipped).
+    """
+    if expected["exception"] != actual["exception"]:
+        return ["exception"]
+    return [x for x in PARTS[1:] if expected.get(x) is not None and
+            actual.get(x) is not None and expected[x] != actual[x]]
+
+
+def shrink(source, fails, max_tests=2000):
+    """
+    Shrinks a failing program by delta debugging: chunks (see CHUNK, then
+    single characters) are removed while the program keeps failing.
+    :param fails: function, that returns True for failing programs.
+    :param max_tests: the largest number of calls of 'fails'.
+    :returns the smallest failing program found.
+    """
+    tests = 0
+    for pieces in [CHUNK.findall(source), None]:
+        if pieces is None:
+            pieces = list(source)
+        size = len(pieces) // 2
+        while size >= 1 and tests < max_tests:
+            removed = False
+            i = 0
+            while i < len(pieces) and tests < max_tests:
+                candidate = pieces[:i] + pieces[i + size:]
+                tests += 1
+                if candidate and fails("".join(candidate)):
+                    pieces = candidate
+                    removed = True
+                else:
+                    i += size
+            if not removed:
+                size //= 2
+        source = "".join(pieces)
+    return source
+
+
+def mutate(source, rng):
+    """
+    Makes a malformed program out of 'source': deletes, inserts or
+    duplicates a few words.
+    """
+    words = source.split(" ")
+    for i in range(rng.randrange(1, 4)):
+        j = rng.randrange(len(words))
+        op = rng.randrange(3)
+        if op == 0 and len(words) > 1:
+            del words[j]
+        elif op == 1:
+            words.insert(j, rng.choice(NOISE))
+        else:
+            words[j] = words[rng.randrange(len(words))]
+    return " ".join(words)
+
+
+def random_programs(count, insert_dir, seed=0, max_scale=20):
+    """
+    Generator of 'count' random programs: workloads of random scenarios and
+    scales (see workload_generator module), half of them made malformed.
+    :returns pairs [name, source].
+    """
+    rng = random.Random(seed)
+    scenarios = sorted(workload_generator.SCENARIOS)
+    for i in range(count):
+        scenario = rng.choice(scenarios)
+        source = workload_generator.generate(
+            scenario, rng.randint(1, max_scale), insert_dir,
+            rng.randrange(1 << 30))
+        name = "random #%i (%s)" % (i, scenario)
+        if rng.random() < 0.5:
+            source = mutate(source, rng)
+            name += ", malformed"
+        yield [name, source]
+
+
+def corpus_programs(paths):
+    """
+    Generator of the programs of the corpus: .sig files and directories (see
+    compiler.collect_sources).
+    :returns triples [name, source, insert directory].
+    """
+    for filename in compiler.collect_sources(paths):
+        source = compiler.read_source(filename)
+        if source is not None:
+            yield [filename + ".sig", source, os.path.dirname(filename)]
+
+
+class Harness:
+    """
+    Differential testing: runs the reference engine and alternative ones on
+    programs, compares their results part by part (see PARTS) and shrinks
+    every mismatching program to a minimal reproducer. Time taken by every
+    engine is summed up to report relative speed.
+
+    Class contents dictionaries:
+    1. engines - names -> engine functions (see ENGINES); the first one is
+    the reference.
+    2. times - engines' names -> total time (seconds).
+
+    Class contents lists:
+    1. mismatches - lists [program's name, engine's name, parts, reproducer].
+
+    Class contents methods:
+    1. __init__(self, engines, shrink_tests=2000)
+    2. run(self, name, source, insert_dir)
+    3. report(self, output=None)
+    """
+
+    def __init__(self, engines, shrink_tests=2000):
+        """
+        :param engines: list of engines' names (see load_engine()); the
+        first one is the reference.
+        :param shrink_tests: see shrink() description; 0 disables shrinking.
+        """
+        self.names = list(engines)
+        self.engines = dict((x, load_engine(x)) for x in self.names)
+        self.shrink_tests = shrink_tests
+        self.times = dict((x, 0.0) for x in self.names)
+        self.programs = 0
+        self.mismatches = []
+
+    def run(self, name, source, insert_dir):
+        """
+        Compares engines on one program.
+        :returns list of engines, that disagree with the reference.
+        """
+        self.programs += 1
+        reference = self.engines[self.names[0]]
+        expected, elapsed = run_engine(reference, source, insert_dir)
+        self.times[self.names[0]] += elapsed
+        res = []
+        for engine_name in self.names[1:]:
+            engine = self.engines[engine_name]
+            actual, elapsed = run_engine(engine, source, insert_dir)
+            self.times[engine_name] += elapsed
+            parts = compare(expected, actual)
+            if not parts:
+                continue
+            res.append(engine_name)
+
+            def fails(program, engine=engine, part=parts[0]):
+                return part in compare(
+                    run_engine(reference, program, insert_dir)[0],
+                    run_engine(engine, program, insert_dir)[0])
+
+            reproducer = source
+            if self.shrink_tests > 0:
+                reproducer = shrink(source, fails, self.shrink_tests)
+            self.mismatches.append([name, engine_name, parts, reproducer])
+        return res
+
+    def report(self, output=None):
+        """
+        Prints mismatches with their reproducers and engines' speed relative
+        to the reference.
+        """
+        for name, engine_name, parts, reproducer in self.mismatches:
+            print("MISMATCH %s: %s differs in %s; reproducer:\n%r\n"
+                  % (name, engine_name, ", ".join(parts), reproducer),
+                  file=output)
+        print("%i program(s), %i mismatch(es)"
+              % (self.programs, len(self.mismatches)), file=output)
+        reference = self.times[self.names[0]]
+        for engine_name in self.names:
+            elapsed = self.times[engine_name]
+            print("  %-12s %10.1f ms  %s" % (
+                engine_name, elapsed * 1000,
+                "x%.2f" % (reference / elapsed) if elapsed > 0 else "-"),
+                file=output)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Compares alternative compiler engines with the "
+                    "reference Lexer/Parser/CodeGenerator pipeline on a "
+                    "corpus and on random (including malformed) programs, "
+                    "shrinks mismatches to minimal reproducers and reports "
+                    "relative speed.")
+    arg_parser.add_argument("paths", nargs="*",
+                            help=".sig files or directories of the corpus")
+    arg_parser.add_argument("-e", "--engine", action="append",
+                            help="engine to compare with the reference: %s "
+                                 "or MODULE:FUNCTION (default: all of the "
+                                 "built-in ones)"
+                                 % ", ".join(sorted(ENGINES)))
+    arg_parser.add_argument("--reference", default="reference",
+                            help="reference engine (default: %(default)s)")
+    arg_parser.add_argument("-n", "--random", type=int, default=200,
+                            help="number of random programs "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument("--seed", type=int, default=0,
+                            help="seed of random programs "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument("--shrink-tests", type=int, default=2000,
+                            help="the largest number of runs to shrink a "
+                                 "mismatch; 0 disables shrinking "
+                                 "(default: %(default)s)")
+    args = arg_parser.parse_args(argv)
+    engines = args.engine or [x for x in sorted(ENGINES)
+                              if x != args.reference]
+    try:
+        harness = Harness([args.reference] + engines, args.shrink_tests)
+    except ValueError as e:
+        arg_parser.error(str(e))
+    for name, source, insert_dir in corpus_programs(args.paths):
+        harness.run(name, source, insert_dir)
+    insert_dir = tempfile.mkdtemp(prefix="signal-differential-")
+    for name, source in random_programs(args.random, insert_dir, args.seed):
+        harness.run(name, source, insert_dir)
+    harness.report()
+    return 1 if harness.mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
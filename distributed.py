@@ -0,0 +1,788 @@
+import argparse
+import collections
+import hashlib
+import io
+import json
+import math
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import code_generator
+import compile_server
+import compiler
+import lexical_analyzer
+
+# Protocol between the coordinator and workers: plain TCP, JSON objects, one
+# object per line (the same framing as compile_server uses), several
+# requests per connection. Texts are referred to by content hashes (see
+# content_hash()), so a worker, that already has a text, doesn't get it
+# again. Requests:
+#     {"op": "compile", "units": [UNIT...], "share_inserts": S,
+#      "max_errors": M} - compiles units, where UNIT is
+#     {"source": HASH, "inserts": {NAME: HASH or null}} (null is a missing
+#     insertion file). The response is {"results": [RESULT...]} in the order
+#     of units, RESULT is compiler.compile_string() result ('inserts' are
+#     names of insertion files), or {"missing": [HASH...]} if the worker
+#     doesn't have some texts: they are to be sent by "put", and the request
+#     is to be repeated;
+#     {"op": "put", "blobs": {HASH: TEXT}} - stores texts: {"stored": N};
+#     {"op": "stats"} - counters of the worker (see Worker.stats()).
+# A malformed request gets {"error": MESSAGE}. There is no authentication:
+# workers are to listen on a trusted network only.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7580
+# Characters of texts and results, that a worker keeps in its cache
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+# Shards per worker, if shard size is not given: several shards per worker
+# balance the load between fast and slow ones
+SHARDS_PER_WORKER = 4
+# Delay before reconnection to a failed worker (seconds; multiplied by the
+# number of its consecutive failures)
+RETRY_DELAY = 0.5
+
+# Warm CodeGenerator of a worker process (see compile_unit())
+warm_instances = []
+
+
+class WorkerError(Exception):
+    """
+    A worker has reported an error or sent a malformed response.
+    """
+
+
+def content_hash(text):
+    """
+    Returns SHA-256 hash of 'text' as a hexadecimal string.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def unit_key(unit, share_inserts=None, max_errors=None):
+    """
+    Returns the key of compilation unit 'unit' (see the protocol
+    description): equal keys mean equal results, so they are used to cache
+    results and to compile identical sources once.
+    """
+    return content_hash(json.dumps([unit["source"], unit["inserts"],
+                                    share_inserts, max_errors],
+                                   sort_keys=True))
+
+
+def parse_address(text):
+    """
+    Converts "HOST:PORT", "HOST" or ":PORT" into a pair [host, port].
+    :raises ValueError if the port is not a number.
+    """
+    host, sep, port = text.rpartition(":")
+    if not sep:
+        host, port = text, ""
+    return [host or DEFAULT_HOST, int(port) if port else DEFAULT_PORT]
+
+
+def insert_names(source, max_errors=None):
+    """
+    Returns names of assembly insertion files, that 'source' may refer to:
+    identifiers following '($'. They are the names, that CodeGenerator
+    passes to its insert_resolver (see CodeGenerator.read_insert).
+    :param max_errors: see compiler.compile_string() description: the
+    source is analysed as far as the code generator would see it.
+    """
+    if "($" not in source:
+        # Most of sources have no insertions: no need to analyse them
+        return []
+    lex = lexical_analyzer.Lexer()
+    lex.offsets = True
+    lex.max_errors = max_errors
+    lex.merge_errors = max_errors is not None
+    tokens = lex.analysis(io.StringIO(source, newline=None))
+    res = []
+    for i in range(len(tokens) - 1):
+        if tokens[i][0] == 301 and lex.is_identifier(tokens[i + 1][0]):
+            name = lex.identifier_names[tokens[i + 1][0]]
+            if name not in res:
+                res.append(name)
+    return res
+
+
+def compile_unit(source, inserts, share_inserts=None, max_errors=None,
+                 code_gen=None):
+    """
+    Compiles a unit without disk I/O.
+    :param inserts: dictionary: names of assembly insertion files -> their
+    texts (None for missing files).
+    :param code_gen: CodeGenerator to be reused; if None, the warm instance
+    of the process is used.
+    :returns compiler.compile_string() result.
+    """
+    if code_gen is None:
+        if not warm_instances:
+            warm_instances.append(code_generator.CodeGenerator())
+        code_gen = warm_instances[0]
+    res = compiler.compile_string(source, "", code_gen,
+                                  share_inserts=share_inserts,
+                                  insert_resolver=inserts.get,
+                                  max_errors=max_errors)
+    res["inserts"] = list(res["inserts"])
+    return res
+
+
+def compile_unit_task(task):
+    """
+    Calls compile_unit() with arguments from list 'task' (used by a worker's
+    process pool).
+    """
+    return compile_unit(*task)
+
+
+class ContentCache:
+    """
+    Thread-safe cache of texts and compilation results by their hashes.
+    It holds at most 'max_size' characters; the least recently used entries
+    are dropped first.
+
+    Class contents dictionaries:
+    1. entries - ordered dictionary: keys -> [value, size], the most
+    recently used ones are the last.
+
+    Class contents methods:
+    1. __init__(self, max_size=DEFAULT_CACHE_SIZE)
+    2. get(self, key)
+    3. put(self, key, value, size)
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the value of 'key', or None if it is not cached.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        """
+        Stores 'value' of 'size' characters under 'key' and drops the least
+        recently used entries, if the cache is full.
+        """
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = [value, size]
+            self.size += size
+            while self.size > self.max_size and len(self.entries) > 1:
+                self.size -= self.entries.popitem(last=False)[1][1]
+
+
+class Worker(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Compile worker of distributed builds: listens to a TCP port and compiles
+    units sent by the coordinator (see the protocol description). Texts and
+    results are cached by content hashes, so unchanged units are neither
+    sent nor compiled again between builds.
+
+    Units of a request are compiled in 'jobs' processes; with one job they
+    are compiled in the connection's thread by a warm CodeGenerator taken
+    from a pool (see CompileServer description).
+
+    Class contents methods:
+    1. __init__(self, address, jobs=1, cache_size=DEFAULT_CACHE_SIZE)
+    2. process(self, request)
+    3. compile(self, request)
+    4. stats(self)
+    5. server_close(self)
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, jobs=1, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        :param address: pair [host, port]; port 0 means any free port (see
+        self.server_address).
+        """
+        socketserver.TCPServer.__init__(self, tuple(address),
+                                        compile_server.CompileRequestHandler)
+        self.jobs = jobs
+        self.cache = ContentCache(cache_size)
+        self.compiled = 0
+        self.cached = 0
+        self.pool = None
+        if jobs > 1:
+            import concurrent.futures
+            self.pool = concurrent.futures.ProcessPoolExecutor(jobs)
+        self.instances = queue.Queue()
+        self.instances.put(code_generator.CodeGenerator())
+
+    def process(self, request):
+        """
+        Handles one request (see the protocol description).
+        :returns response dictionary.
+        :raises ValueError if the request is malformed.
+        """
+        if not isinstance(request, dict):
+            raise ValueError("JSON object expected")
+        op = request.get("op")
+        if op == "compile":
+            return self.compile(request)
+        if op == "put":
+            blobs = request.get("blobs")
+            if not isinstance(blobs, dict):
+                raise ValueError("'blobs' object expected")
+            for key in blobs:
+                if not isinstance(blobs[key], str):
+                    raise ValueError("text expected: %s" % key)
+                if content_hash(blobs[key]) != key:
+                    raise ValueError("hash mismatch: %s" % key)
+                self.cache.put(key, blobs[key], len(blobs[key]))
+            return {"stored": len(blobs)}
+        if op == "stats":
+            return self.stats()
+        raise ValueError("unknown op: %s" % op)
+
+    def compile(self, request):
+        """
+        Compiles units of "compile" request: results are taken from the
+        cache, other units are compiled, if all of their texts are cached.
+        :returns response dictionary.
+        """
+        share_inserts = request.get("share_inserts")
+        max_errors = request.get("max_errors")
+        for value in [share_inserts, max_errors]:
+            if value is not None and (type(value) != int or value < 0):
+                raise ValueError("bad option: %r" % value)
+        results = []
+        tasks = []
+        missing = []
+        try:
+            for unit in request["units"]:
+                if not isinstance(unit["source"], str) or \
+                        [x for x in unit["inserts"].values()
+                         if x is not None and not isinstance(x, str)]:
+                    raise TypeError("hash expected")
+                key = "result:" + unit_key(unit, share_inserts, max_errors)
+                res = self.cache.get(key)
+                results.append(res)
+                if res is not None:
+                    continue
+                source = self.cache.get(unit["source"])
+                if source is None:
+                    missing.append(unit["source"])
+                inserts = {}
+                for name in unit["inserts"]:
+                    blob = unit["inserts"][name]
+                    inserts[name] = None
+                    if blob is not None:
+                        inserts[name] = self.cache.get(blob)
+                        if inserts[name] is None:
+                            missing.append(blob)
+                tasks.append([len(results) - 1, key,
+                              [source, inserts, share_inserts, max_errors]])
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError("malformed unit")
+        if missing:
+            return {"missing": sorted(set(missing))}
+        if self.pool is not None and len(tasks) > 1:
+            compiled = list(self.pool.map(compile_unit_task,
+                                          [x[2] for x in tasks]))
+        else:
+            compiled = []
+            code_gen = self.instances.get()
+            try:
+                for task in tasks:
+                    compiled.append(compile_unit(*task[2],
+                                                 code_gen=code_gen))
+            finally:
+                self.instances.put(code_gen)
+        for task, res in zip(tasks, compiled):
+            results[task[0]] = res
+            self.cache.put(task[1], res, len(res["asm"] or "") +
+                           len(res["listing"]))
+        with self.cache.lock:
+            self.compiled += len(tasks)
+            self.cached += len(results) - len(tasks)
+        return {"results": results}
+
+    def stats(self):
+        """
+        Returns dictionary of counters: 'compiled' and 'cached' units,
+        cache 'entries', 'size' (characters), 'hits' and 'misses'.
+        """
+        with self.cache.lock:
+            return {"compiled": self.compiled, "cached": self.cached,
+                    "entries": len(self.cache.entries),
+                    "size": self.cache.size, "hits": self.cache.hits,
+                    "misses": self.cache.misses}
+
+    def server_close(self):
+        socketserver.TCPServer.server_close(self)
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class Connection:
+    """
+    Client connection to a worker.
+
+    Class contents methods:
+    1. __init__(self, address, timeout=None)
+    2. call(self, request)
+    3. close(self)
+    """
+
+    def __init__(self, address, timeout=None):
+        """
+        :param address: pair [host, port].
+        :param timeout: seconds to wait for connection and responses; None
+        means waiting forever.
+        """
+        self.sock = socket.create_connection(tuple(address), timeout)
+        self.file = self.sock.makefile("rwb")
+
+    def call(self, request):
+        """
+        Sends 'request' and waits for the response.
+        :returns response dictionary.
+        :raises OSError if the connection fails, WorkerError if the worker
+        reports an error or the response is malformed.
+        """
+        self.file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("connection closed by worker")
+        try:
+            response = json.loads(line.decode("utf-8"))
+        except ValueError as e:
+            raise WorkerError("malformed response: %s" % e)
+        if not isinstance(response, dict):
+            raise WorkerError("malformed response")
+        if "error" in response:
+            raise WorkerError(response["error"])
+        return response
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            self.sock.close()
+
+
+class Coordinator:
+    """
+    Coordinator of distributed builds: reads sources and assembly insertion
+    files they refer to, makes compilation units of them, splits units into
+    shards and sends shards to workers, one thread per worker.
+
+    Every unit has a home worker chosen by rendezvous hashing of its key
+    and workers' addresses, so between builds a unit goes to the same
+    worker, which has its texts and result cached, and adding or removing a
+    worker moves only a part of units. A worker takes shards of its own
+    first; when they are over, it takes shards of the worker, that has the
+    most of them left, so fast workers compile more.
+
+    Identical units (equal texts of the source and insertion files, see
+    unit_key()) are compiled once. Texts are sent only to workers, that
+    don't have them yet (see the protocol description).
+
+    If a worker fails (connection error, timeout or error response), its
+    shard is given to another worker, and the worker is reconnected after a
+    delay; after 'retries' consecutive failures it is dropped. A shard,
+    that has failed more than 'retries' times, and shards left when all of
+    the workers are dropped are compiled locally, so a build always
+    completes.
+
+    Class contents dictionaries:
+    1. units - unit keys -> units (see the protocol description).
+    2. blobs - hashes -> texts of sources and insertion files.
+    3. counters - 'shards', 'retries', 'local' (units compiled locally),
+    'blobs' and 'characters' (texts sent), 'duplicates' (sources sharing a
+    unit with another one).
+
+    Class contents lists:
+    1. workers - pairs [host, port].
+    2. shards - lists of shards waiting for every worker (in the order of
+    self.workers); a shard is a list [unit keys, failures].
+
+    Class contents methods:
+    1. __init__(self, workers, shard_size=None, retries=2, timeout=60.0,
+    share_inserts=None, max_errors=None, output=None)
+    2. prepare(self, filenames)
+    3. run(self, filenames)
+    4. home(self, key)
+    5. next_shard(self, index)
+    6. work(self, index)
+    7. send_shard(self, connection, keys)
+    8. compile_locally(self, keys)
+    """
+
+    def __init__(self, workers, shard_size=None, retries=2, timeout=60.0,
+                 share_inserts=None, max_errors=None, output=None):
+        """
+        :param workers: list of pairs [host, port].
+        :param shard_size: units per shard; if None, units are split into
+        SHARDS_PER_WORKER shards per worker.
+        :param retries: consecutive failures, after which a worker is
+        dropped, and failures of a shard, after which it is compiled
+        locally.
+        :param timeout: seconds to wait for a worker's response.
+        :param share_inserts, max_errors: see compiler.compile_string()
+        description.
+        :param output: file object, where failures of workers are reported.
+        """
+        self.workers = [list(x) for x in workers]
+        self.shard_size = shard_size
+        self.retries = retries
+        self.timeout = timeout
+        self.share_inserts = share_inserts
+        self.max_errors = max_errors
+        self.output = output
+        self.units = {}
+        self.blobs = {}
+        self.results = {}
+        self.shards = []
+        self.outstanding = 0
+        self.lock = threading.Condition()
+        self.counters = dict((x, 0) for x in ["shards", "retries", "local",
+                                                "blobs", "characters",
+                                                "duplicates"])
+
+    def prepare(self, filenames):
+        """
+        Reads 'filenames' (without '.sig' extension) and their insertion
+        files (from the source's directory, as compiler.compile_file()
+        does) and makes units of them.
+        :returns dictionary: file names -> unit keys (None for sources, that
+        don't exist).
+        """
+        res = {}
+        inserts = {}
+        for filename in filenames:
+            source = compiler.read_source(filename)
+            if source is None:
+                res[filename] = None
+                continue
+            unit = {"source": content_hash(source), "inserts": {}}
+            self.blobs[unit["source"]] = source
+            for name in insert_names(source, self.max_errors):
+                path = os.path.join(os.path.dirname(filename), name + ".asm")
+                if path not in inserts:
+                    inserts[path] = None
+                    try:
+                        f = open(path)
+                    except FileNotFoundError:
+                        f = None
+                    if f is not None:
+                        text = f.read()
+                        f.close()
+                        inserts[path] = content_hash(text)
+                        self.blobs[inserts[path]] = text
+                unit["inserts"][name] = inserts[path]
+            key = unit_key(unit, self.share_inserts, self.max_errors)
+            if key in self.units:
+                self.counters["duplicates"] += 1
+            self.units[key] = unit
+            res[filename] = key
+        return res
+
+    def run(self, filenames):
+        """
+        Compiles 'filenames' on the workers.
+        :returns dictionary: file names -> compiler.compile_string() results
+        (None for sources, that don't exist); 'inserts' are paths of
+        insertion files, as compiler.compile_file() reports them.
+        """
+        keys = self.prepare(filenames)
+        size = self.shard_size or max(1, math.ceil(
+            len(self.units) / (max(1, len(self.workers)) *
+                               SHARDS_PER_WORKER)))
+        pending = [[] for x in self.workers] or [[]]
+        for key in sorted(self.units):
+            pending[self.home(key)].append(key)
+        self.shards = [[[x[i:i + size], 0] for i in range(0, len(x), size)]
+                       for x in pending]
+        self.outstanding = sum(len(x) for x in self.shards)
+        self.counters["shards"] = self.outstanding
+        threads = [threading.Thread(target=self.work, args=(i,), daemon=True)
+                   for i in range(len(self.workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # No workers left
+        for shards in self.shards:
+            for shard in shards:
+                self.compile_locally(shard[0])
+        self.shards = []
+        res = {}
+        for filename in filenames:
+            if keys[filename] is None:
+                res[filename] = None
+                continue
+            compiled = dict(self.results[keys[filename]])
+            compiled["inserts"] = [
+                os.path.join(os.path.dirname(filename), x + ".asm")
+                for x in compiled["inserts"]]
+            res[filename] = compiled
+        return res
+
+    def home(self, key):
+        """
+        Returns the index of the home worker of unit 'key' (see the class
+        description).
+        """
+        if len(self.workers) < 2:
+            return 0
+        weights = [content_hash("%s %s:%i" % (key, x[0], x[1]))
+                   for x in self.workers]
+        return weights.index(max(weights))
+
+    def next_shard(self, index):
+        """
+        Returns the next shard for worker 'index' (see the class
+        description), waiting while shards being compiled by other workers
+        may be given back; None if no shards are left.
+        """
+        with self.lock:
+            while True:
+                if self.shards[index]:
+                    return self.shards[index].pop(0)
+                others = [x for x in self.shards if x]
+                if others:
+                    return max(others, key=len).pop()
+                if self.outstanding == 0:
+                    return None
+                self.lock.wait()
+
+    def work(self, index):
+        """
+        Sends shards to worker 'index' until no shards are left or the
+        worker is dropped (see the class description).
+        """
+        address = self.workers[index]
+        failures = 0
+        connection = None
+        while True:
+            shard = self.next_shard(index)
+            if shard is None:
+                break
+            try:
+                if connection is None:
+                    connection = Connection(address, self.timeout)
+                results = self.send_shard(connection, shard[0])
+            except (OSError, WorkerError) as e:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                failures += 1
+                shard[1] += 1
+                dropped = failures > self.retries
+                with self.lock:
+                    self.counters["retries"] += 1
+                    print("Worker %s:%i failed (%s)%s" % (
+                        address[0], address[1], e,
+                        ": dropped" if dropped else ""), file=self.output)
+                    if shard[1] > self.retries:
+                        self.outstanding -= 1
+                    else:
+                        self.shards[index].append(shard)
+                    self.lock.notify_all()
+                if shard[1] > self.retries:
+                    self.compile_locally(shard[0])
+                if dropped:
+                    break
+                time.sleep(RETRY_DELAY * failures)
+                continue
+            failures = 0
+            with self.lock:
+                self.results.update(zip(shard[0], results))
+                self.outstanding -= 1
+                self.lock.notify_all()
+        if connection is not None:
+            connection.close()
+
+    def send_shard(self, connection, keys):
+        """
+        Compiles units 'keys' on a worker, sending texts it is missing.
+        :returns list of results in the order of 'keys'.
+        :raises OSError, WorkerError if the worker fails.
+        """
+        request = {"op": "compile", "units": [self.units[x] for x in keys],
+                   "share_inserts": self.share_inserts,
+                   "max_errors": self.max_errors}
+        for attempt in range(3):
+            response = connection.call(request)
+            if "missing" not in response:
+                break
+            if attempt == 2:
+                raise WorkerError("texts are dropped from the cache of the "
+                                  "worker: the cache is too small")
+            try:
+                blobs = dict((x, self.blobs[x]) for x in response["missing"])
+            except (KeyError, TypeError):
+                raise WorkerError("unknown text requested")
+            connection.call({"op": "put", "blobs": blobs})
+            with self.lock:
+                self.counters["blobs"] += len(blobs)
+                self.counters["characters"] += sum(len(x) for x in
+                                                   blobs.values())
+        results = response.get("results")
+        if not isinstance(results, list) or len(results) != len(keys):
+            raise WorkerError("malformed response")
+        return results
+
+    def compile_locally(self, keys):
+        """
+        Compiles units 'keys' in this process.
+        """
+        for key in keys:
+            unit = self.units[key]
+            inserts = dict((x, None if y is None else self.blobs[y])
+                           for x, y in unit["inserts"].items())
+            res = compile_unit(self.blobs[unit["source"]], inserts,
+                               self.share_inserts, self.max_errors)
+            with self.lock:
+                self.results[key] = res
+                self.counters["local"] += 1
+
+
+def build(filenames, workers, binary=False, share_inserts=None,
+          max_errors=None, shard_size=None, retries=2, timeout=60.0,
+          output=None):
+    """
+    Compiles 'filenames' on 'workers' (see Coordinator description), writes
+    output files and reports results, as compiler.compile_all() does.
+    :param workers: list of pairs [host, port].
+    :param binary, share_inserts, max_errors: see compiler.compile_file()
+    description.
+    :param shard_size, retries, timeout: see Coordinator description.
+    :returns list of compiler.compile_file() results.
+    """
+    coordinator = Coordinator(workers, shard_size, retries, timeout,
+                              share_inserts, max_errors, output)
+    compiled = coordinator.run(filenames)
+    results = []
+    for filename in filenames:
+        if compiled[filename] is None:
+            res = compiler.file_result(filename)
+        else:
+            res = compiler.file_result(
+                filename, compiled[filename],
+                compiler.write_outputs(filename, compiled[filename]))
+            if binary:
+                res["binary_error"] = compiler.write_binary(
+                    filename, compiled[filename]["asm"])
+                res["binary"] = compiled[filename]["asm"] is not None and \
+                    res["binary_error"] is None
+        results.append(res)
+        compiler.report(res, output)
+    counters = coordinator.counters
+    print("%i unit(s) in %i shard(s) on %i worker(s): %i duplicate(s), "
+          "%i retried shard(s), %i unit(s) compiled locally, %i text(s) "
+          "sent (%i characters)"
+          % (len(coordinator.units), counters["shards"], len(workers),
+             counters["duplicates"], counters["retries"], counters["local"],
+             counters["blobs"], counters["characters"]), file=output)
+    return results
+
+
+def serve(address, jobs=1, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Runs a worker until it is interrupted.
+    :param address: pair [host, port].
+    """
+    worker = Worker(address, jobs, cache_size)
+    print("Worker is listening on %s:%i" % worker.server_address[:2])
+    sys.stdout.flush()
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.server_close()
+    return 0
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Distributed compilation: workers compile shards of a "
+                    "source tree sent by a coordinator over TCP.")
+    commands = arg_parser.add_subparsers(dest="command")
+    worker_parser = commands.add_parser("worker", help="run a worker")
+    worker_parser.add_argument("--listen", default="%s:%i" % (DEFAULT_HOST,
+                                                              DEFAULT_PORT),
+                               metavar="HOST:PORT",
+                               help="address to listen to; port 0 means any "
+                                    "free port (default: %(default)s)")
+    worker_parser.add_argument("-j", "--jobs", type=int, default=1,
+                               help="number of worker processes "
+                                    "(default: %(default)s)")
+    worker_parser.add_argument("--cache-size", type=int, default=256,
+                               metavar="MB",
+                               help="size of the cache of texts and results "
+                                    "(default: %(default)s)")
+    build_parser = commands.add_parser("build",
+                                       help="compile sources on workers")
+    build_parser.add_argument("paths", nargs="+",
+                              help=".sig files or directories")
+    build_parser.add_argument("-w", "--workers", required=True,
+                              metavar="HOST:PORT,...",
+                              help="comma separated addresses of workers")
+    build_parser.add_argument("--shard-size", type=int, metavar="N",
+                              help="units per shard (default: %i shards "
+                                   "per worker)" % SHARDS_PER_WORKER)
+    build_parser.add_argument("--retries", type=int, default=2,
+                              help="failures, after which a worker is "
+                                   "dropped (default: %(default)s)")
+    build_parser.add_argument("--timeout", type=float, default=60.0,
+                              help="seconds to wait for a worker "
+                                   "(default: %(default)s)")
+    build_parser.add_argument("--binary", action="store_true",
+                              help="also write .com images")
+    build_parser.add_argument("--share-inserts", type=int, metavar="SIZE",
+                              help="see compiler.py --share-inserts")
+    build_parser.add_argument("--max-errors", type=int, metavar="N",
+                              help="see compiler.py --max-errors")
+    args = arg_parser.parse_args(argv)
+    if args.command == "worker":
+        try:
+            address = parse_address(args.listen)
+        except ValueError:
+            arg_parser.error("bad address: %s" % args.listen)
+        if args.jobs < 1:
+            arg_parser.error("number of jobs must be positive")
+        return serve(address, args.jobs, args.cache_size * 1024 * 1024)
+    if args.command != "build":
+        arg_parser.error("a command expected: worker or build")
+    try:
+        workers = [parse_address(x) for x in args.workers.split(",") if x]
+    except ValueError:
+        arg_parser.error("bad address in %s" % args.workers)
+    if args.shard_size is not None and args.shard_size < 1:
+        arg_parser.error("shard size must be positive")
+    results = build(compiler.collect_sources(args.paths), workers,
+                    args.binary, args.share_inserts, args.max_errors,
+                    args.shard_size, args.retries, args.timeout)
+    return 1 if [x for x in results if not x["found"] or x["errors"]] \
+        else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,52 @@
+import array
+import bisect
+import re
+
+
+def attributes_table():
+    """
+    Returns a bytes object of 256 characters' attributes: element #i is the
+    attribute of character with code i (see Lexer description).
+    """
+    res = bytearray(256)
+    for i in range(0, 256):
+        if i in (8, 9, 10, 13, 32):
+            # \b, \t, \n, return, space
+            res[i] = 0
+        elif 65 <= i <= 90 or 97 <= i <= 122:
+            # A..Z, a..z
+            res[i] = 1
+        elif 48 <= i <= 57:
+            # 0..9
+            res[i] = 2
+        elif i in (41, 44, 58, 59, 61):
+            # ) , : ; =
+            res[i] = 3
+        elif i in (36, 40, 60, 62):
+            # $ ( < >
+            res[i] = 4
+        else:
+            res[i] = 5
+    return bytes(res)
+
+
+# Characters' attributes are computed once, when the module is imported.
+ATTRIBUTES_TABLE = attributes_table()
+
+# Runs of characters of the same kind, used by Lexer.offset_tokens()
+SPACES = re.compile("[\b\t\n\r ]+")
+WORD = re.compile("[A-Za-z][A-Za-z0-9]*")
+NUMBER = re.compile("[0-9]+")
+
+
 class Lexer:
     """
     Class for lexical analysis
 
     Class contents dictionaries (tables):
     1. 'attributes' dictionary: keys are 255 ASCII characters, values are their
-    attributes:
+    attributes (the dictionary is built once from ATTRIBUTES_TABLE and is
+    shared by all instances):
         0 - whitespaces;
         1 - small and capital latin letters;
         2 - digits;
@@ -21,7 +63,11 @@ class Lexer:
     5. 'identifiers' dictionary: keys are user's identifiers appearing in
     analysed program code, values are their codes.
     Initially dictionary is empty, it is filled during lexical analysis.
-    6. 'token_list' is a list of tokens. During lexical analysis is filled
+    6. 'constant_names' and 'identifier_names' dictionaries are reverse
+    tables of 'constants' and 'identifiers': keys are codes, values are
+    constants and identifiers. They tell the kind of a token of a user-defined
+    code (see is_constant() and is_identifier()).
+    7. 'token_list' is a list of tokens. During lexical analysis is filled
     with elements of three types:
         1) [N, L, P] - a token with code N, standing in line L of source code
         starting from position P;
@@ -29,50 +75,104 @@ class Lexer:
         in line L, position P;
         3) ['E2', L, P] - lexical error #2: unclosed comment starting at
         line L, position P.
+    8. 'stats' is None or an instance of compile_stats.CompileStats, which
+    lexical analysis time and tables' sizes are added to.
+    9. 'next_constant' and 'next_identifier' are the codes, that the next new
+    constant and identifier get.
+    10. 'offsets' tells the mode of lexical analysis. If it is True,
+    analysis() keeps no line and position bookkeeping: tokens hold a source
+    offset instead of line and position (see offset_tokens()):
+        1) [N, O] - a token with code N, starting at offset O;
+        2) ['E1', S, O] - unresolved character S at offset O;
+        3) ['E2', O] - unclosed comment starting at offset O.
+    Line and position are computed on demand (see position(), located()
+    and located_tokens()), so error messages and listings are the same in
+    both modes.
+    11. 'newlines' is None, or an array of offsets of newline characters,
+    that lexer counts as lines' ends (newlines inside comments are not
+    counted). In offsets mode it is built from 'text' and 'comments' (the
+    source and spans [start, end) of its comments, kept by
+    offset_tokens()) when a position is needed for the first time (see
+    line_index()), so analysis, that finds no errors and makes no listing,
+    never builds it.
+    12. Error budget, that keeps garbage or binary input from producing
+    millions of error tokens:
+        1) 'merge_errors' - if True, a run of adjacent unresolved characters
+        is one error: ['E1', S, L, P], where S is the whole run;
+        2) 'max_errors' - None, or the number of lexical errors, after which
+        analysis stops (1 means fail-fast);
+        3) 'stopped' is set to True if analysis has stopped because of
+        'max_errors' before the end of the file.
+
+    Codes of tokens:
+        0..255 - one-char separators (character's code);
+        301..304 - two-char separators;
+        401..409 - keywords;
+        501..1000 - the first 500 constants;
+        1001 and greater - identifiers and the rest of constants. Codes are
+        given in order of the first appearance, so the code space is not
+        limited; the kind of such a token is told by is_constant() and
+        is_identifier(), not by the code's range.
 
     Class contents methods:
     1. __init__(self)
-    2. attributes_initial(self)
-    3. analysis(self, file)
-    4. table_print(self, table, table_name, output=None)
-    5. listing(self, only_errors=True, output=None)
+    2. reset(self)
+    3. attributes_initial(self)
+    4. analysis(self, file)
+    5. tokens(self, file)
+    6. offset_tokens(self, text)
+    7. line_index(self), position(self, offset), located(self, token),
+    located_tokens(self, tokens)
+    8. new_constant(self, token), new_identifier(self, token)
+    9. is_constant(self, code), is_identifier(self, code)
+    10. table_print(self, table, table_name, output=None)
+    11. listing(self, only_errors=True, output=None)
     """
-    attributes = {}
+    attributes = dict((chr(i), ATTRIBUTES_TABLE[i]) for i in range(256))
     two_char_separators = {'($': 301, '$)': 302, '>=': 303, '<=': 304}
     keywords = {'PROCEDURE': 401, 'BEGIN': 402, 'END': 403,
                 'LABEL': 404, 'GOTO': 405, 'RETURN': 406,
                 'IF': 407, 'THEN': 408, 'ELSE': 409}
     constants = {}
     identifiers = {}
+    constant_names = {}
+    identifier_names = {}
+    next_constant = 501
+    next_identifier = 1001
     token_list = []
+    stats = None
+    offsets = False
+    merge_errors = False
+    max_errors = None
+    stopped = False
 
     def __init__(self):
-        self.attributes = self.attributes_initial()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears tables, that are filled during lexical analysis, so that the
+        same instance can analyse another file.
+        """
+        self.constants = {}
+        self.identifiers = {}
+        self.constant_names = {}
+        self.identifier_names = {}
+        self.next_constant = 501
+        self.next_identifier = 1001
+        self.token_list = []
+        self.text = ""
+        self.comments = []
+        self.newlines = None
+        self.stopped = False
 
     def attributes_initial(self):
         """
-        Fills self.attributes dictionary.
+        Fills self.attributes dictionary from ATTRIBUTES_TABLE.
         Returns self.attributes.
         """
-        self.attributes = {}
-        for i in range(0, 256):
-            if i in [8, 9, 10, 13, 32]:
-                # \b, \t, \n, return, space
-                self.attributes[chr(i)] = 0
-            elif i in range(65, 91) or i in range(97, 123):
-                # A..Z, a..z
-                self.attributes[chr(i)] = 1
-            elif i in range(48, 58):
-                # 0..9
-                self.attributes[chr(i)] = 2
-            elif i in [41, 44, 58, 59, 61]:
-                # ) , : ; =
-                self.attributes[chr(i)] = 3
-            elif i in [36, 40, 60, 62]:
-                # $ ( < >
-                self.attributes[chr(i)] = 4
-            else:
-                self.attributes[chr(i)] = 5
+        self.attributes = dict((chr(i), ATTRIBUTES_TABLE[i])
+                               for i in range(256))
         return self.attributes
 
     def analysis(self, file):
@@ -80,14 +180,46 @@ class Lexer:
         Performs lexical analysis on 'file'.
         Returns self.token_list.
         """
-        self.token_list, token, line_count, pos_count = [], '', 0, 0
+        if self.stats is not None:
+            self.stats.start("lex")
+        if self.offsets:
+            self.token_list = list(self.offset_tokens(file.read()))
+        else:
+            self.token_list = list(self.tokens(file))
+        if self.stats is not None:
+            self.stats.stop("lex")
+            self.stats.count("tokens", len(self.token_list))
+            self.stats.count("identifiers", len(self.identifiers))
+            self.stats.count("constants", len(self.constants))
+        return self.token_list
+
+    def tokens(self, file):
+        """
+        Generator, that performs lexical analysis on 'file' and yields tokens
+        one by one as they are read (see self.token_list description).
+        self.identifiers and self.constants tables are filled, but
+        self.token_list is left untouched.
+        """
+        token, line_count, pos_count = '', 0, 0
+        errors = 0
         ch = file.read(1)
         while ch != "":
+            if self.max_errors is not None and errors >= self.max_errors:
+                self.stopped = True
+                return
             if ch not in self.attributes.keys() or self.attributes[ch] == 5:
                 # Wrong character, not form ASCII: error #1
-                self.token_list.append(['E1', ch, line_count, pos_count])
+                token, start = ch, pos_count
                 ch = file.read(1)
                 pos_count += 1
+                while self.merge_errors and ch != "" and \
+                        self.attributes.get(ch, 5) == 5:
+                    token += ch
+                    ch = file.read(1)
+                    pos_count += 1
+                yield ['E1', token, line_count, start]
+                errors += 1
+                token = ''
             elif self.attributes[ch] == 0:
                 # Spaces, tabs, newlines etc.
                 if ch == "\n":
@@ -103,19 +235,13 @@ class Lexer:
                     ch = file.read(1)
                     pos_count += 1
                 if token in self.keywords.keys():
-                    self.token_list.append([self.keywords[token], line_count,
-                                            pos_count - len(token)])
+                    yield [self.keywords[token], line_count,
+                           pos_count - len(token)]
                 else:
-                    if not self.identifiers.keys():
-                        self.identifiers[token] = 1001
-                    elif token in self.identifiers.keys():
-                        pass
-                    else:
-                        self.identifiers[token] = max(self.identifiers.
-                                                      values()) + 1
-                    self.token_list.append([self.identifiers[token],
-                                            line_count,
-                                            pos_count - len(token)])
+                    if token not in self.identifiers:
+                        self.new_identifier(token)
+                    yield [self.identifiers[token], line_count,
+                           pos_count - len(token)]
                 token = ''
             elif self.attributes[ch] == 2:
                 # Numeric constants
@@ -123,18 +249,14 @@ class Lexer:
                     token += ch
                     ch = file.read(1)
                     pos_count += 1
-                if not self.constants.keys():
-                    self.constants[token] = 501
-                if token in self.constants.keys():
-                    pass
-                else:
-                    self.constants[token] = max(self.constants.values()) + 1
-                self.token_list.append([self.constants[token], line_count,
-                                        pos_count - len(token)])
+                if token not in self.constants:
+                    self.new_constant(token)
+                yield [self.constants[token], line_count,
+                       pos_count - len(token)]
                 token = ''
             elif self.attributes[ch] == 3:
                 # One-char delimiters: ',' ';' ':' ')'
-                self.token_list.append([ord(ch), line_count, pos_count])
+                yield [ord(ch), line_count, pos_count]
                 ch = file.read(1)
                 pos_count += 1
             elif self.attributes[ch] == 4:
@@ -145,8 +267,8 @@ class Lexer:
                     pos_count += 1
                     if ch == '$':
                         # File insertion begins
-                        self.token_list.append([self.two_char_separators["($"],
-                                                line_count, pos_count-1])
+                        yield [self.two_char_separators["($"],
+                               line_count, pos_count-1]
                         ch = file.read(1)
                         pos_count += 1
                     elif ch == '*':
@@ -158,8 +280,7 @@ class Lexer:
                         comm_beg_pos = pos_count - 2
                         while not (end_comment and ch == ')'):
                             if ch == "":
-                                self.token_list.append(['E2', comm_beg_line,
-                                                        comm_beg_pos])
+                                yield ['E2', comm_beg_line, comm_beg_pos]
                                 break
                             elif ch == '*':
                                 end_comment = True
@@ -171,45 +292,222 @@ class Lexer:
                         pos_count += 1
                     else:
                         # Just '(' character
-                        self.token_list.append([ord('('), line_count,
-                                                pos_count-1])
+                        yield [ord('('), line_count, pos_count-1]
                 elif ch == '>':
                     # '>=' or '>'
                     ch = file.read(1)
                     pos_count += 1
                     if ch == '=':
-                        self.token_list.append([self.two_char_separators[">="],
-                                                line_count, pos_count - 1])
+                        yield [self.two_char_separators[">="],
+                               line_count, pos_count - 1]
                         ch = file.read(1)
                         pos_count += 1
                     else:
-                        self.token_list.append([ord('>'), line_count,
-                                                pos_count-1])
+                        yield [ord('>'), line_count, pos_count-1]
                 elif ch == '<':
                     # '<=' or '<'
                     ch = file.read(1)
                     pos_count += 1
                     if ch == '=':
-                        self.token_list.append([self.two_char_separators["<="],
-                                                line_count, pos_count - 1])
+                        yield [self.two_char_separators["<="],
+                               line_count, pos_count - 1]
                         ch = file.read(1)
                         pos_count += 1
                     else:
-                        self.token_list.append([ord('<'), line_count,
-                                                pos_count - 1])
+                        yield [ord('<'), line_count, pos_count - 1]
                 elif ch == '$':
                     # File insertion ends
                     ch = file.read(1)
                     pos_count += 1
                     if ch == ')':
-                        self.token_list.append([self.two_char_separators["$)"],
-                                                line_count, pos_count-1])
+                        yield [self.two_char_separators["$)"],
+                               line_count, pos_count-1]
                         ch = file.read(1)
                         pos_count += 1
                     else:
-                        self.token_list.append(['E1', '$', line_count,
-                                                pos_count-1])
-        return self.token_list
+                        yield ['E1', '$', line_count, pos_count-1]
+                        errors += 1
+
+    def offset_tokens(self, text):
+        """
+        Generator, that performs lexical analysis on string 'text' in offsets
+        mode (see self.offsets description) and yields tokens one by one.
+        Tokens are the same as the ones of self.tokens(), but hold offsets
+        in 'text' instead of lines and positions. 'text' and spans of its
+        comments are kept for self.line_index().
+        """
+        self.text = text
+        self.comments = []
+        self.newlines = None
+        i, end = 0, len(text)
+        errors = 0
+        attributes = self.attributes
+        while i < end:
+            if self.max_errors is not None and errors >= self.max_errors:
+                self.stopped = True
+                return
+            ch = text[i]
+            kind = attributes.get(ch, 5)
+            if kind == 0:
+                # Spaces, tabs, newlines etc.
+                i = SPACES.match(text, i).end()
+            elif kind == 1:
+                # Identifiers and reserved words
+                j = WORD.match(text, i).end()
+                token = text[i:j].upper()
+                code = self.keywords.get(token)
+                if code is None:
+                    code = self.identifiers.get(token)
+                    if code is None:
+                        code = self.new_identifier(token)
+                yield [code, i]
+                i = j
+            elif kind == 2:
+                # Numeric constants
+                j = NUMBER.match(text, i).end()
+                token = text[i:j]
+                code = self.constants.get(token)
+                if code is None:
+                    code = self.new_constant(token)
+                yield [code, i]
+                i = j
+            elif kind == 3:
+                # One-char delimiters: ',' ';' ':' ')'
+                yield [ord(ch), i]
+                i += 1
+            elif kind == 4:
+                pair = text[i:i + 2]
+                if pair == "(*":
+                    # (*Comment*): its newlines are not counted
+                    j = text.find("*)", i + 2)
+                    if j < 0:
+                        self.comments.append([i, end])
+                        yield ['E2', i]
+                        return
+                    self.comments.append([i, j + 2])
+                    i = j + 2
+                elif pair in self.two_char_separators:
+                    yield [self.two_char_separators[pair], i]
+                    i += 2
+                elif ch == '$':
+                    yield ['E1', '$', i]
+                    errors += 1
+                    i += 1
+                else:
+                    # '(', '<' or '>'
+                    yield [ord(ch), i]
+                    i += 1
+            else:
+                # Wrong character, not form ASCII: error #1
+                j = i + 1
+                while self.merge_errors and j < end and \
+                        attributes.get(text[j], 5) == 5:
+                    j += 1
+                yield ['E1', text[i:j], i]
+                errors += 1
+                i = j
+
+    def line_index(self):
+        """
+        Returns self.newlines, building it on the first call after
+        self.offset_tokens(): offsets of all of the newlines of self.text,
+        except the ones inside comments.
+        """
+        if self.newlines is None:
+            self.newlines = array.array("q")
+            start = 0
+            end = len(self.text)
+            for comment_start, comment_end in self.comments + [[end, end]]:
+                k = self.text.find("\n", start, comment_start)
+                while k >= 0:
+                    self.newlines.append(k)
+                    k = self.text.find("\n", k + 1, comment_start)
+                start = comment_end
+        return self.newlines
+
+    def position(self, offset):
+        """
+        Returns [line, position] of 'offset' (offsets mode), as self.tokens()
+        counts them: line is the number of counted newlines before 'offset',
+        position is counted from the last of them. Binary search in
+        self.line_index() is used.
+        """
+        newlines = self.line_index()
+        line = bisect.bisect_left(newlines, offset)
+        if line == 0:
+            return [0, offset]
+        return [line, offset - newlines[line - 1] - 1]
+
+    def located(self, token):
+        """
+        Returns 'token' in the form of self.tokens() ones: with line and
+        position instead of offset. In line mode 'token' is returned as it
+        is.
+        """
+        if not self.offsets:
+            return token
+        if token[0] == 'E1':
+            return ['E1', token[1]] + self.position(token[2])
+        return [token[0]] + self.position(token[1])
+
+    def located_tokens(self, tokens):
+        """
+        Generator of located() 'tokens', that are given in the order of
+        their offsets (e.g. self.token_list): lines are found by a single
+        pass over the newlines instead of a binary search for every token.
+        """
+        if not self.offsets:
+            yield from tokens
+            return
+        newlines = self.line_index()
+        line, count, line_start = 0, len(newlines), 0
+        for token in tokens:
+            # Offset is the last item of tokens of every kind
+            offset = token[-1]
+            while line < count and newlines[line] < offset:
+                line_start = newlines[line] + 1
+                line += 1
+            if len(token) == 2:
+                yield [token[0], line, offset - line_start]
+            else:
+                yield token[:-1] + [line, offset - line_start]
+
+    def new_constant(self, token):
+        """
+        Adds 'token' to self.constants table and returns its code. When codes
+        501..1000 are used up, constants get codes of identifiers' range.
+        """
+        if self.next_constant <= 1000:
+            code = self.next_constant
+            self.next_constant += 1
+        else:
+            code = self.next_identifier
+            self.next_identifier += 1
+        self.constants[token] = code
+        self.constant_names[code] = token
+        return code
+
+    def new_identifier(self, token):
+        """
+        Adds 'token' to self.identifiers table and returns its code.
+        """
+        code = self.next_identifier
+        self.next_identifier += 1
+        self.identifiers[token] = code
+        self.identifier_names[code] = token
+        return code
+
+    def is_constant(self, code):
+        """
+        Returns True if 'code' is a code of a numeric constant.
+        """
+        return code in self.constant_names
+
+    def is_identifier(self, code):
+        """
+        Returns True if 'code' is a code of a user's identifier.
+        """
+        return code in self.identifier_names
 
     @staticmethod
     def table_print(table, table_name, output=None):
@@ -235,25 +533,18 @@ class Lexer:
                          output)
         self.table_print(self.identifiers, "Identifiers", output)
         self.table_print(self.constants, "Constants", output)
-        for x in self.token_list:
+        for x in self.located_tokens(self.token_list):
             if x[0] == 'E1':
                 print("%s (line %i, position %i)"
                       % (x[1], x[2]+1, x[3]+1), file=output)
             elif x[0] == 'E2':
                 pass
-            elif x[0] in range(0, 256):
+            elif 0 <= x[0] < 256:
                 print("%s (line %i, position %i)"
                       % (chr(x[0]), x[1]+1, x[2]+1), file=output)
-            elif x[0] in range(301, 401):
-                print("#%s (line %i, position %i)"
-                      % (x[0], x[1] + 1, x[2] + 1), file=output)
-            elif x[0] in range(401, 501):
-                print("#%s (line %i, position %i)"
-                      % (x[0], x[1] + 1, x[2] + 1), file=output)
-            elif x[0] in range(501, 1001):
-                print("#%s (line %i, position %i)"
-                      % (x[0], x[1] + 1, x[2] + 1), file=output)
-            elif x[0] >= 1001:
+            elif x[0] in range(301, 501) or self.is_constant(x[0]) or \
+                    self.is_identifier(x[0]):
+                # Separators, keywords, constants and identifiers
                 print("#%s (line %i, position %i)"
                       % (x[0], x[1] + 1, x[2] + 1), file=output)
             else:
@@ -0,0 +1,471 @@
+import bisect
+import io
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import code_generator
+
+# Language Server Protocol's constants
+SEVERITY_ERROR = 1
+TEXT_DOCUMENT_SYNC_FULL = 1
+METHOD_NOT_FOUND = -32601
+INVALID_REQUEST = -32600
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+PARSE_ERROR = -32700
+MESSAGE_ERROR = 1
+
+
+def read_message(stream):
+    """
+    Reads one JSON-RPC message with 'Content-Length' header from binary
+    'stream'.
+    :returns decoded message, or None at the end of the stream.
+    :raises ValueError if the message is malformed.
+    """
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is None:
+                continue
+            break
+        name, _, value = line.decode("ascii").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+
+def write_message(stream, message):
+    """
+    Writes one JSON-RPC message with 'Content-Length' header into binary
+    'stream'.
+    """
+    body = json.dumps(message).encode("utf-8")
+    stream.write(b"Content-Length: %i\r\n\r\n" % len(body) + body)
+    stream.flush()
+
+
+class NullWriter:
+    """
+    File-like object, that discards generated code.
+    """
+
+    @staticmethod
+    def write(text):
+        return len(text)
+
+    @staticmethod
+    def flush():
+        pass
+
+
+class DiagnosticsServer:
+    """
+    Editor diagnostics server: a subset of Language Server Protocol over
+    JSON-RPC with 'Content-Length' framing.
+
+    Documents are kept in memory. On every change a document is re-checked:
+    lexer, parser and code generator's semantic checks are run by a warm
+    CodeGenerator, generated code is discarded, listing is not made and no
+    files are written (only assembly insertion files are read, as they are
+    checked for existence). Errors are published as
+    'textDocument/publishDiagnostics' notifications with ranges. Rapid edits
+    are debounced: a document is checked 'delay' seconds after its last
+    change.
+
+    A request with malformed parameters gets an error response, a malformed
+    notification is dropped (and logged with 'window/logMessage'); an
+    exception while handling a message or checking a document never stops
+    the server.
+
+    Supported messages: initialize, initialized, shutdown, exit,
+    textDocument/didOpen, textDocument/didChange (full text),
+    textDocument/didSave, textDocument/didClose.
+
+    Class contents dictionaries:
+    1. documents - keys are documents' URIs, values are their texts.
+    2. timers - keys are URIs, values are threading.Timer objects of
+    scheduled checks.
+
+    Class contents methods:
+    1. __init__(self, input, output, delay=0.05)
+    2. serve(self)
+    3. handle(self, message)
+    4. dispatch(self, method, params)
+    5. send(self, message), log(self, text, level=4)
+    6. schedule(self, uri)
+    7. check(self, uri)
+    8. diagnostics(self, text, insert_dir="")
+    """
+
+    def __init__(self, input, output, delay=0.05):
+        """
+        :param input, output: binary streams.
+        :param delay: debounce delay (seconds); if 0, documents are checked
+        at once.
+        """
+        self.input = input
+        self.output = output
+        self.delay = delay
+        self.documents = {}
+        self.timers = {}
+        self.code_gen = code_generator.CodeGenerator()
+        self.lock = threading.Lock()
+        self.output_lock = threading.Lock()
+        self.shutdown = False
+
+    def serve(self):
+        """
+        Handles messages until 'exit' notification or the end of input.
+        :returns exit code: 0 if 'shutdown' request has been received before
+        exit, 1 otherwise.
+        """
+        while True:
+            try:
+                message = read_message(self.input)
+            except ValueError as e:
+                self.send({"jsonrpc": "2.0", "id": None, "error": {
+                    "code": PARSE_ERROR, "message": str(e)}})
+                continue
+            if message is None or message.get("method") == "exit":
+                break
+            self.handle(message)
+        for timer in list(self.timers.values()):
+            timer.cancel()
+        return 0 if self.shutdown else 1
+
+    def handle(self, message):
+        """
+        Handles one request or notification (see the class description).
+        """
+        if not isinstance(message, dict):
+            self.send({"jsonrpc": "2.0", "id": None, "error": {
+                "code": INVALID_REQUEST, "message": "JSON object expected"}})
+            return
+        method = message.get("method")
+        params = message.get("params") or {}
+        error = None
+        try:
+            if not isinstance(params, dict):
+                raise ValueError("'params' must be an object")
+            result = self.dispatch(method, params)
+        except (KeyError, TypeError, ValueError) as e:
+            error = [INVALID_PARAMS, "Invalid parameters of %s: %s"
+                     % (method, e if type(e) != KeyError
+                        else "%s expected" % e)]
+        except Exception as e:
+            error = [INTERNAL_ERROR, "Internal error in %s: %s: %s"
+                     % (method, type(e).__name__, e)]
+        if error is None and result is METHOD_NOT_FOUND:
+            if "id" not in message or method == "initialized":
+                return
+            error = [METHOD_NOT_FOUND, "Unsupported method: %s" % method]
+        if "id" not in message:
+            if error is not None:
+                self.log(error[1], MESSAGE_ERROR)
+        elif error is not None:
+            self.send({"jsonrpc": "2.0", "id": message["id"], "error": {
+                "code": error[0], "message": error[1]}})
+        else:
+            self.send({"jsonrpc": "2.0", "id": message["id"],
+                       "result": result})
+
+    def dispatch(self, method, params):
+        """
+        Performs 'method' with 'params'.
+        :returns result of a request, or METHOD_NOT_FOUND if the method is
+        not supported.
+        :raises KeyError, TypeError, ValueError if 'params' are malformed.
+        """
+        result = None
+        if method == "initialize":
+            result = {"capabilities": {
+                "textDocumentSync": {"openClose": True, "save": True,
+                                     "change": TEXT_DOCUMENT_SYNC_FULL}},
+                "serverInfo": {"name": "signal-diagnostics"}}
+        elif method == "shutdown":
+            self.shutdown = True
+        elif method == "textDocument/didOpen":
+            uri = document_uri(params)
+            self.documents[uri] = text_param(params["textDocument"])
+            self.check(uri)
+        elif method == "textDocument/didChange":
+            uri = document_uri(params)
+            changes = params.get("contentChanges") or []
+            if not isinstance(changes, list):
+                raise TypeError("'contentChanges' must be an array")
+            if changes:
+                self.documents[uri] = text_param(changes[-1])
+            self.schedule(uri)
+        elif method == "textDocument/didSave":
+            uri = document_uri(params)
+            if "text" in params:
+                self.documents[uri] = text_param(params)
+            self.schedule(uri)
+        elif method == "textDocument/didClose":
+            uri = document_uri(params)
+            timer = self.timers.pop(uri, None)
+            if timer is not None:
+                timer.cancel()
+            self.documents.pop(uri, None)
+            self.send({"jsonrpc": "2.0",
+                       "method": "textDocument/publishDiagnostics",
+                       "params": {"uri": uri, "diagnostics": []}})
+        else:
+            return METHOD_NOT_FOUND
+        return result
+
+    def send(self, message):
+        with self.output_lock:
+            write_message(self.output, message)
+
+    def log(self, text, level=4):
+        """
+        Sends 'window/logMessage' notification: 'level' is its type (1 -
+        error, 4 - log).
+        """
+        self.send({"jsonrpc": "2.0", "method": "window/logMessage",
+                   "params": {"type": level, "message": text}})
+
+    def schedule(self, uri):
+        """
+        Schedules check of document 'uri' in self.delay seconds, cancelling
+        the previously scheduled one.
+        """
+        timer = self.timers.pop(uri, None)
+        if timer is not None:
+            timer.cancel()
+        if self.delay <= 0:
+            self.check(uri)
+            return
+        timer = threading.Timer(self.delay, self.check, [uri])
+        timer.daemon = True
+        self.timers[uri] = timer
+        timer.start()
+
+    def check(self, uri):
+        """
+        Checks document 'uri' and publishes its diagnostics.
+        """
+        with self.lock:
+            if uri not in self.documents:
+                return
+            insert_dir = ""
+            parts = urllib.parse.urlparse(uri)
+            if parts.scheme == "file":
+                insert_dir = os.path.dirname(
+                    urllib.request.url2pathname(parts.path))
+            start = time.perf_counter()
+            try:
+                diagnostics = self.diagnostics(self.documents[uri],
+                                               insert_dir)
+            except RecursionError:
+                diagnostics = [file_diagnostic(
+                    "Program is too deeply nested to be checked")]
+            except Exception as e:
+                # A check runs in a timer's thread: an exception would stop
+                # diagnostics of the document silently
+                diagnostics = [file_diagnostic(
+                    "Internal error of the checker: %s: %s"
+                    % (type(e).__name__, e))]
+                # The warm instance may be left in any state
+                self.code_gen = code_generator.CodeGenerator()
+            elapsed = time.perf_counter() - start
+        self.send({"jsonrpc": "2.0",
+                   "method": "textDocument/publishDiagnostics",
+                   "params": {"uri": uri, "diagnostics": diagnostics}})
+        self.log("%s checked in %.2f ms" % (uri, elapsed * 1000))
+
+    def diagnostics(self, text, insert_dir=""):
+        """
+        Checks SIGNAL program 'text'.
+        :returns list of LSP Diagnostic objects: one for every lexical
+        error, or the first syntax error, or the first semantic error.
+        """
+        code_gen = self.code_gen
+        code_gen.reset(insert_dir)
+        code_gen.code_gen(io.StringIO(text, newline=None), NullWriter())
+        positions = SourcePositions(text)
+        res = []
+        for error in code_gen.error_list:
+            if error[0] < 17:
+                start = positions.position(error[1], error[2])
+                length = token_length(code_gen, error[1], error[2])
+            else:
+                start, length = semantic_error_position(code_gen, error,
+                                                        positions)
+            res.append({
+                "range": {"start": {"line": start[0],
+                                    "character": start[1]},
+                          "end": {"line": start[0],
+                                  "character": start[1] + length}},
+                "severity": SEVERITY_ERROR,
+                "code": error[0],
+                "source": "signal",
+                "message": code_gen.error_message(error).split(" (line")[0]})
+            if error[0] not in (12, 13):
+                # Only the first syntax or semantic error is reliable
+                break
+        return res
+
+
+def document_uri(params):
+    """
+    Returns 'params.textDocument.uri' of a notification.
+    :raises KeyError, TypeError if it is missing or is not a string.
+    """
+    uri = params["textDocument"]["uri"]
+    if not isinstance(uri, str):
+        raise TypeError("'uri' must be a string")
+    return uri
+
+
+def text_param(params):
+    """
+    Returns 'params.text' of a notification.
+    :raises KeyError, TypeError if it is missing or is not a string.
+    """
+    if not isinstance(params["text"], str):
+        raise TypeError("'text' must be a string")
+    return params["text"]
+
+
+def file_diagnostic(message):
+    """
+    Returns LSP Diagnostic object with 'message' at the start of a file.
+    """
+    return {"range": {"start": {"line": 0, "character": 0},
+                      "end": {"line": 0, "character": 0}},
+            "severity": SEVERITY_ERROR, "source": "signal",
+            "message": message}
+
+
+class SourcePositions:
+    """
+    Converts positions of tokens, as lexer counts them, into real positions
+    in the text. Lexer doesn't count newlines inside comments: positions of
+    tokens after a multi-line comment are counted from the last newline
+    outside comments.
+
+    Class contents lists:
+    1. counted - offsets of lines' beginnings, as lexer counts lines.
+    2. lines - offsets of real lines' beginnings.
+    """
+
+    def __init__(self, text):
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        self.lines = [0]
+        self.counted = [0]
+        i = 0
+        while i < len(text):
+            if text.startswith("(*", i):
+                end = text.find("*)", i + 2)
+                end = len(text) if end < 0 else end + 2
+                for j in range(i, end):
+                    if text[j] == "\n":
+                        self.lines.append(j + 1)
+                i = end
+                continue
+            if text[i] == "\n":
+                self.lines.append(i + 1)
+                self.counted.append(i + 1)
+            i += 1
+
+    def position(self, line, pos):
+        """
+        Returns real [line, character] (0-based) of a token, that lexer has
+        placed at 'line', 'pos'.
+        """
+        if line >= len(self.counted):
+            return [line, pos]
+        offset = self.counted[line] + pos
+        real = bisect.bisect_right(self.lines, offset) - 1
+        return [real, offset - self.lines[real]]
+
+
+def token_length(code_gen, line, pos):
+    """
+    Returns length of the token at 'line', 'pos' (as lexer counts them), or 1
+    if there is no such token.
+    """
+    lex = code_gen.parser.lex
+    for token in code_gen.token_list:
+        if token[0] == "E1":
+            continue
+        if token[0] == "E2":
+            if token[1:] == [line, pos]:
+                return 2
+            continue
+        if token[1:] == [line, pos]:
+            if token[0] < 256:
+                return 1
+            if token[0] < 401:
+                return 2
+            if token[0] < 501:
+                for key in lex.keywords:
+                    if lex.keywords[key] == token[0]:
+                        return len(key)
+            if lex.is_constant(token[0]):
+                return len(lex.constant_names[token[0]])
+            return len(lex.identifier_names.get(token[0], " "))
+    return 1
+
+
+def semantic_error_position(code_gen, error, positions):
+    """
+    Finds the token, that has caused semantic error (see
+    CodeGenerator.process_error description): the second occurrence of a
+    twice declared label, duplicating parameter or re-used identifier; the
+    label of GOTO statement; the name of assembly insertion file; the first
+    occurrence of an undeclared label.
+    :returns [line, character] of the token and its length.
+    """
+    lex = code_gen.parser.lex
+    if error[0] in (18, 20, 21):
+        code = lex.identifiers.get(error[1])
+    else:
+        code = lex.constants.get(error[1])
+    occurrences = []
+    previous = None
+    for token in code_gen.token_list:
+        if token[0] == code:
+            occurrences.append([token, previous])
+        previous = token[0]
+    found = None
+    if error[0] in (17, 18, 21) and len(occurrences) > 1:
+        found = occurrences[1][0]
+    elif error[0] in (19, 20):
+        for token, previous in occurrences:
+            if previous == (405 if error[0] == 19 else 301):
+                found = token
+                break
+    if found is None and occurrences:
+        found = occurrences[0][0]
+    if found is None:
+        return [0, 0], 1
+    return positions.position(found[1], found[2]), len(str(error[1]))
+
+
+def serve(delay=0.05):
+    """
+    Runs diagnostics server on standard input and output.
+    :returns exit code.
+    """
+    return DiagnosticsServer(sys.stdin.buffer, sys.stdout.buffer,
+                             delay).serve()
+
+
+if __name__ == "__main__":
+    sys.exit(serve())
@@ -0,0 +1,119 @@
+import fnmatch
+import io
+import linecache
+import os
+import re
+import sys
+import tracemalloc
+
+import code_generator
+
+PHASES = ["lex", "parse", "codegen", "listing"]
+
+
+def sre_compile_pattern():
+    """
+    Returns file name pattern of the regular expression compiler: modules
+    of 're' package, or sre_*.py modules of older Pythons.
+    """
+    if os.path.basename(re.__file__) == "__init__.py":
+        return os.path.join(os.path.dirname(re.__file__), "*")
+    return os.path.join(os.path.dirname(re.__file__), "sre_*")
+
+
+def profile_source(source, insert_dir="", top=5, frames=1):
+    """
+    Compiles 'source' phase by phase under tracemalloc. Results of every
+    phase are kept alive until the end, as they are in normal compilation,
+    so retained memory of a phase is the size of structures it has built.
+    :param source: text of SIGNAL program.
+    :param insert_dir: directory, where assembly insertion files are searched
+    for.
+    :param top: number of top allocating lines reported for each phase.
+    :param frames: number of stack frames stored for each allocation.
+    :returns list of dictionaries with keys:
+        'phase' - phase name (see PHASES);
+        'peak' - peak traced memory during the phase above the memory traced
+        at its beginning (bytes);
+        'retained' - net memory retained after the phase (bytes);
+        'top' - list of [file name, line number, size, count] of lines,
+        which have allocated most of the retained memory.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(frames)
+    # Allocations of the profiler itself: tracemalloc filters match file
+    # names with fnmatch, which compiles and caches regular expressions
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+               tracemalloc.Filter(False, __file__),
+               tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+               tracemalloc.Filter(False, fnmatch.__file__),
+               tracemalloc.Filter(False, sre_compile_pattern())]
+    # Warm-up snapshot: caches, that taking and filtering snapshots fill,
+    # are not charged to the first phase
+    tracemalloc.take_snapshot().filter_traces(filters)
+    code_gen = code_generator.CodeGenerator(insert_dir)
+    code_file = io.StringIO()
+    listing_file = io.StringIO()
+    steps = [
+        lambda: code_gen.parser.lex.analysis(io.StringIO(source)),
+        lambda: code_gen.parser.parse_tokens(code_gen.parser.lex.token_list),
+        lambda: code_gen.generate(code_file),
+        lambda: code_gen.listing(listing_file)]
+    results = []
+    try:
+        for phase, step in zip(PHASES, steps):
+            before = tracemalloc.take_snapshot().filter_traces(filters)
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            step()
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(filters)
+            res = {"phase": phase, "peak": peak - start,
+                   "retained": current - start, "top": []}
+            for stat in after.compare_to(before, "lineno"):
+                if len(res["top"]) >= top:
+                    break
+                if stat.size_diff <= 0:
+                    continue
+                frame = stat.traceback[0]
+                res["top"].append([frame.filename, frame.lineno,
+                                   stat.size_diff, stat.count_diff])
+            results.append(res)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return results
+
+
+def kib(size):
+    return "%.1f KiB" % (size / 1024)
+
+
+def report(results, output=None):
+    """
+    Prints profile_source() result.
+    """
+    print("%-9s %14s %14s" % ("phase", "peak", "retained"), file=output)
+    for res in results:
+        print("%-9s %14s %14s" % (res["phase"], kib(res["peak"]),
+                                  kib(res["retained"])), file=output)
+    for res in results:
+        if not res["top"]:
+            continue
+        print("\nTop allocations of phase '%s':" % res["phase"], file=output)
+        for filename, lineno, size, count in res["top"]:
+            print("  %s:%i: %s in %i block(s)"
+                  % (os.path.basename(filename), lineno, kib(size), count),
+                  file=output)
+            line = linecache.getline(filename, lineno).strip()
+            if line:
+                print("      %s" % line, file=output)
+
+
+if __name__ == "__main__":
+    # Usage: memory_profile.py FILE.sig
+    f = open(sys.argv[1], "r", encoding="latin-1")
+    text = f.read()
+    f.close()
+    report(profile_source(text, os.path.dirname(sys.argv[1])))
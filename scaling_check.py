@@ -0,0 +1,146 @@
+import argparse
+import io
+import math
+import sys
+import tempfile
+
+import benchmark
+import lexical_analyzer
+import workload_generator
+
+# Growth exponent of n log n on 10^3..10^6 tokens is about 1.1; quadratic
+# paths give 2. Phases, that grow faster than n^LIMIT, fail the check.
+DEFAULT_LIMIT = 1.3
+DEFAULT_SIZES = [1000, 10000, 100000]
+# Comments produce no tokens: their size is counted as one token per
+# CHARS_PER_TOKEN characters.
+CHARS_PER_TOKEN = 5
+# Phases, that are faster than this on the largest workload (seconds), are
+# dominated by constant costs and timer noise: they are not checked.
+MIN_TIME = 0.002
+
+
+def program_size(source):
+    """
+    Returns size of 'source' in tokens (see CHARS_PER_TOKEN).
+    """
+    tokens = len(lexical_analyzer.Lexer().analysis(io.StringIO(source)))
+    return max(tokens, len(source) // CHARS_PER_TOKEN)
+
+
+def scale_for(scenario, size, insert_dir):
+    """
+    Returns workload scale (see workload_generator.generate), that gives a
+    program of about 'size' tokens.
+    """
+    source = workload_generator.generate(scenario, 100, insert_dir)
+    return max(1, round(size * 100 / max(program_size(source), 1)))
+
+
+def fit_exponent(points):
+    """
+    Fits time = c * n^k by least squares on logarithms.
+    :param points: list of [n, time].
+    :returns k, or None if there are less than two usable points.
+    """
+    points = [[math.log(n), math.log(t)] for n, t in points
+              if n > 0 and t > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, y in points) / len(points)
+    mean_y = sum(y for x, y in points) / len(points)
+    dx = sum((x - mean_x) ** 2 for x, y in points)
+    if dx == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / dx
+
+
+def measure(scenario, sizes, insert_dir, repeat=3):
+    """
+    Times the phases of compilation (see benchmark.time_phases) of the
+    scenario's programs of growing sizes.
+    :param sizes: list of programs' sizes (see program_size()).
+    :returns list of [size, times], where times is a dictionary: phase ->
+    the best time of 'repeat' runs (seconds).
+    """
+    codegen = workload_generator.SCENARIOS[scenario][2]
+    res = []
+    for size in sizes:
+        source = workload_generator.generate(
+            scenario, scale_for(scenario, size, insert_dir), insert_dir)
+        best = {}
+        for i in range(repeat):
+            times = benchmark.time_phases(source, insert_dir, codegen)[0]
+            for phase in times:
+                best[phase] = min(best.get(phase, times[phase]),
+                                  times[phase])
+        res.append([program_size(source), best])
+    return res
+
+
+def check(scenarios, sizes, limit=DEFAULT_LIMIT, repeat=3, output=None):
+    """
+    Measures every scenario and fits the growth exponent of every phase.
+    Prints a table: scenario, phase, times on every size and the exponent.
+    :returns list of [scenario, phase, exponent] of the phases, that grow
+    faster than n^limit.
+    """
+    insert_dir = tempfile.mkdtemp(prefix="signal-scaling-")
+    failed = []
+    for scenario in scenarios:
+        results = measure(scenario, sizes, insert_dir, repeat)
+        print("%s (%s tokens):" % (scenario, ", ".join(
+            str(size) for size, times in results)), file=output)
+        for phase in benchmark.PHASES:
+            points = [[size, times[phase]] for size, times in results
+                      if phase in times]
+            if not points:
+                continue
+            exponent = fit_exponent(points)
+            if exponent is None or points[-1][1] < MIN_TIME:
+                verdict = "too fast"
+            elif exponent > limit:
+                verdict = "FAIL"
+                failed.append([scenario, phase, exponent])
+            else:
+                verdict = "ok"
+            print("  %-8s %s  k=%s  %s" % (
+                phase, " ".join("%10.3f" % (t * 1000) for n, t in points),
+                "-" if exponent is None else "%.2f" % exponent, verdict),
+                file=output)
+    return failed
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Compiles generated SIGNAL programs of growing sizes, "
+                    "fits the growth of every phase's time and fails if "
+                    "any phase grows faster than about n log n.")
+    arg_parser.add_argument("-s", "--scenario", action="append",
+                            choices=sorted(workload_generator.SCENARIOS),
+                            help="scenario to check (default: all)")
+    arg_parser.add_argument("-t", "--tokens", type=int, action="append",
+                            help="program size in tokens (default: %s)"
+                                 % ", ".join(str(x) for x in DEFAULT_SIZES))
+    arg_parser.add_argument("-l", "--limit", type=float,
+                            default=DEFAULT_LIMIT,
+                            help="largest allowed growth exponent "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument("-r", "--repeat", type=int, default=3,
+                            help="runs per workload; the best time is used "
+                                 "(default: %(default)s)")
+    args = arg_parser.parse_args(argv)
+    failed = benchmark.with_recursion_limit(
+        check, args.scenario or sorted(workload_generator.SCENARIOS),
+        sorted(args.tokens or DEFAULT_SIZES), args.limit, args.repeat)
+    if failed:
+        print("\nPhases growing faster than n^%.2f:" % args.limit)
+        for scenario, phase, exponent in failed:
+            print("  %s: %s (k=%.2f)" % (scenario, phase, exponent))
+        return 1
+    print("\nAll phases grow no faster than n^%.2f" % args.limit)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+import argparse
+import json
+import os
+import sys
+
+import x86_backend
+
+# Value of the return address, that is pushed before a procedure is called
+# by Simulator.run(entry=...): returning to it stops the simulation.
+RETURN_ADDRESS = -1
+
+
+class SimulationError(Exception):
+    """
+    Is raised when the simulated program executes an instruction, that can't
+    be simulated, or breaks the stack.
+    """
+
+
+class Simulator:
+    """
+    Simulator of the x86 instruction subset, that CodeGenerator produces and
+    x86_backend.Assembler encodes (see Assembler description), so that cost
+    of generated code can be measured without DOS.
+
+    Instructions are executed from their text, not from machine code: every
+    instruction is counted as one step. Registers (8-, 16- and 32-bit views
+    of ax, cx, dx, bx, bp, si, di) and flags CF, ZF, SF, OF, PF are
+    simulated; memory is not. 'sp' and 'esp' registers can't be used as
+    operands: the stack is simulated as a list of pushed values.
+
+    'int 21h' is supported for functions 4Ch (exit with code AL) and 02h
+    (write character DL); 'int 20h' exits. 'ret' with empty stack (the way a
+    .COM program may return to DOS) also exits.
+
+    Class contents lists:
+    1. instructions - instructions of the program (see
+    Assembler.parse_line description), labels are not included.
+    2. registers - values of registers (32 bits) by their numbers.
+    3. stack - pushed values: lists [V, S], where V is value, S is its size
+    in bytes.
+
+    Class contents dictionaries:
+    1. labels - keys are labels' names (lowercase), values are indexes of
+    instructions they mark.
+    2. flags - keys are flags' names, values are True or False.
+
+    Class contents methods:
+    1. __init__(self, text)
+    2. run(self, entry=None, limit=1000000)
+    3. step(self, instruction)
+    4. get(self, instruction, operand), put(self, instruction, operand,
+    value) - read and write registers.
+    5. arithmetic(self, mnemonic, a, b, bits)
+    6. condition(self, cc)
+    7. push(self, value, size), pop(self, instruction)
+    8. interrupt(self, instruction, number)
+    """
+
+    def __init__(self, text):
+        """
+        :param text: assembler's code.
+        :raises x86_backend.EncodingError if the code is out of the subset.
+        """
+        assembler = x86_backend.Assembler()
+        self.instructions = []
+        self.labels = {}
+        for number, line in enumerate(text.split("\n"), 1):
+            for instruction in assembler.parse_line(number, line):
+                if instruction[2] == ":":
+                    self.labels[instruction[3]] = len(self.instructions)
+                else:
+                    # Checks, that the instruction is in the subset
+                    assembler.encode(instruction, None)
+                    self.instructions.append(instruction)
+        for instruction in self.instructions:
+            if instruction[2] in ("jmp", "call") or \
+                    instruction[2] in x86_backend.CONDITIONS:
+                assembler.labels = self.labels
+                assembler.target(instruction, instruction[3])
+        self.entry = assembler.entry
+        self.assembler = assembler
+        self.registers = [0] * 8
+        self.flags = {}
+        self.stack = []
+        self.depth = 0
+        self.counters = {}
+        self.output = []
+        self.exit_code = None
+        self.ip = 0
+
+    def run(self, entry=None, limit=1000000):
+        """
+        Executes the program.
+        :param entry: name of a label (procedure), execution starts from; it
+        is called as a subroutine: simulation stops when it returns. If None,
+        the program is executed from its entry point ('end' directive), or
+        from the first instruction if there is no entry point.
+        :param limit: maximum number of instructions to execute.
+        :returns dictionary with keys:
+            'status' - "exit" (int 21h/4Ch, int 20h or ret with empty stack),
+            "return" (the entry procedure returned), "end" (execution ran past
+            the last instruction) or "limit" (instruction limit is reached);
+            'exit_code' - AL at exit, or None;
+            'instructions' - number of executed instructions;
+            'jumps' - number of jumps taken (jmp and conditional jumps);
+            'calls' - number of executed calls;
+            'max_stack' - maximum stack depth (bytes);
+            'output' - characters written with int 21h/02h;
+            'registers' - final values of 16-bit registers.
+        :raises SimulationError.
+        """
+        self.registers = [0] * 8
+        self.flags = {"cf": False, "zf": False, "sf": False, "of": False,
+                      "pf": False}
+        self.stack = []
+        self.depth = 0
+        self.counters = {"instructions": 0, "jumps": 0, "calls": 0,
+                         "max_stack": 0}
+        self.output = []
+        self.exit_code = None
+        start = entry or self.entry
+        if start is not None and start.lower() not in self.labels:
+            raise SimulationError("entry point '%s' is not found" % start)
+        if entry is not None:
+            self.push(RETURN_ADDRESS, 2)
+        self.ip = 0 if start is None else self.labels[start.lower()]
+        status = None
+        while status is None:
+            if self.ip >= len(self.instructions):
+                status = "end"
+            elif self.counters["instructions"] >= limit:
+                status = "limit"
+            else:
+                instruction = self.instructions[self.ip]
+                self.ip += 1
+                self.counters["instructions"] += 1
+                status = self.step(instruction)
+        res = {"status": status, "exit_code": self.exit_code,
+               "output": "".join(self.output), "registers": {}}
+        res.update(self.counters)
+        for name in x86_backend.REGISTERS_16:
+            if name != "sp":
+                res["registers"][name] = \
+                    self.registers[x86_backend.REGISTERS_16[name]] & 0xFFFF
+        return res
+
+    def step(self, instruction):
+        """
+        Executes one instruction.
+        :returns None, or status of the finished program (see self.run).
+        """
+        mnemonic = instruction[2]
+        operands = instruction[3:]
+        if mnemonic == "nop":
+            pass
+        elif mnemonic == "ret":
+            if not self.stack:
+                return "exit"
+            address = self.pop(instruction)
+            if address == RETURN_ADDRESS:
+                return "return"
+            self.ip = address
+        elif mnemonic == "push":
+            size = 4 if operands[0] in x86_backend.REGISTERS_32 else 2
+            self.push(self.get(instruction, operands[0]), size)
+        elif mnemonic == "pop":
+            self.put(instruction, operands[0], self.pop(instruction))
+        elif mnemonic == "jmp":
+            self.counters["jumps"] += 1
+            self.ip = self.labels[operands[0]]
+        elif mnemonic in x86_backend.CONDITIONS:
+            if self.condition(x86_backend.CONDITIONS[mnemonic]):
+                self.counters["jumps"] += 1
+                self.ip = self.labels[operands[0]]
+        elif mnemonic == "call":
+            self.counters["calls"] += 1
+            self.push(self.ip, 2)
+            self.ip = self.labels[operands[0]]
+        elif mnemonic == "int":
+            return self.interrupt(instruction, self.assembler.number(
+                instruction, operands[0], 8))
+        elif mnemonic in ("inc", "dec"):
+            cf = self.flags["cf"]
+            self.put(instruction, operands[0], self.arithmetic(
+                "add" if mnemonic == "inc" else "sub",
+                self.get(instruction, operands[0]), 1, 16))
+            self.flags["cf"] = cf
+        else:
+            bits = 8 if operands[0] in x86_backend.REGISTERS_8 else 16
+            if operands[1] in x86_backend.REGISTERS_8 or \
+                    operands[1] in x86_backend.REGISTERS_16:
+                value = self.get(instruction, operands[1])
+            else:
+                value = self.assembler.number(instruction, operands[1], bits)
+            if mnemonic == "mov":
+                self.put(instruction, operands[0], value)
+                return None
+            res = self.arithmetic(mnemonic, self.get(instruction,
+                                                     operands[0]),
+                                  value, bits)
+            if mnemonic != "cmp":
+                self.put(instruction, operands[0], res)
+        return None
+
+    def get(self, instruction, operand):
+        """
+        Returns value of register 'operand'.
+        """
+        if operand in ("sp", "esp"):
+            raise SimulationError("line %i: stack pointer can't be used: "
+                                  "'%s'" % (instruction[0], instruction[1]))
+        if operand in x86_backend.REGISTERS_32:
+            return self.registers[x86_backend.REGISTERS_32[operand]]
+        if operand in x86_backend.REGISTERS_16:
+            return self.registers[x86_backend.REGISTERS_16[operand]] & 0xFFFF
+        n = x86_backend.REGISTERS_8[operand]
+        return self.registers[n % 4] >> (8 if n >= 4 else 0) & 0xFF
+
+    def put(self, instruction, operand, value):
+        """
+        Writes 'value' into register 'operand'.
+        """
+        if operand in ("sp", "esp"):
+            raise SimulationError("line %i: stack pointer can't be used: "
+                                  "'%s'" % (instruction[0], instruction[1]))
+        if operand in x86_backend.REGISTERS_32:
+            n = x86_backend.REGISTERS_32[operand]
+            self.registers[n] = value & 0xFFFFFFFF
+        elif operand in x86_backend.REGISTERS_16:
+            n = x86_backend.REGISTERS_16[operand]
+            self.registers[n] = self.registers[n] & 0xFFFF0000 | \
+                value & 0xFFFF
+        else:
+            n = x86_backend.REGISTERS_8[operand]
+            shift = 8 if n >= 4 else 0
+            self.registers[n % 4] = self.registers[n % 4] & \
+                ~(0xFF << shift) | (value & 0xFF) << shift
+
+    def arithmetic(self, mnemonic, a, b, bits):
+        """
+        Computes result of arithmetic instruction and sets flags.
+        """
+        mask = (1 << bits) - 1
+        sign = 1 << (bits - 1)
+        carry = 1 if self.flags["cf"] else 0
+        if mnemonic in ("add", "adc"):
+            res = a + b + (carry if mnemonic == "adc" else 0)
+            self.flags["cf"] = res > mask
+            self.flags["of"] = bool((a ^ res) & (b ^ res) & sign)
+        elif mnemonic in ("sub", "sbb", "cmp"):
+            borrow = carry if mnemonic == "sbb" else 0
+            res = a - b - borrow
+            self.flags["cf"] = res < 0
+            self.flags["of"] = bool((a ^ b) & (a ^ res) & sign)
+        else:
+            if mnemonic == "and":
+                res = a & b
+            elif mnemonic == "or":
+                res = a | b
+            else:
+                res = a ^ b
+            self.flags["cf"] = False
+            self.flags["of"] = False
+        res &= mask
+        self.flags["zf"] = res == 0
+        self.flags["sf"] = bool(res & sign)
+        self.flags["pf"] = bin(res & 0xFF).count("1") % 2 == 0
+        return res
+
+    def condition(self, cc):
+        """
+        Returns True if condition 'cc' (see x86_backend.CONDITIONS) holds.
+        """
+        f = self.flags
+        res = [f["of"], f["cf"], f["zf"], f["cf"] or f["zf"], f["sf"],
+               f["pf"], f["sf"] != f["of"],
+               f["zf"] or f["sf"] != f["of"]][cc >> 1]
+        return res != bool(cc & 1)
+
+    def push(self, value, size):
+        self.stack.append([value, size])
+        self.depth += size
+        if self.depth > self.counters["max_stack"]:
+            self.counters["max_stack"] = self.depth
+
+    def pop(self, instruction):
+        if not self.stack:
+            raise SimulationError("line %i: stack underflow: '%s'"
+                                  % (instruction[0], instruction[1]))
+        value, size = self.stack.pop()
+        self.depth -= size
+        return value
+
+    def interrupt(self, instruction, number):
+        """
+        Executes 'int' instruction.
+        :returns None, or "exit" if the program exits.
+        """
+        ah = self.get(instruction, "ah")
+        if number == 0x20 or number == 0x21 and ah == 0x4C:
+            if number == 0x21:
+                self.exit_code = self.get(instruction, "al")
+            return "exit"
+        if number == 0x21 and ah == 0x02:
+            self.output.append(chr(self.get(instruction, "dl")))
+            return None
+        raise SimulationError("line %i: unsupported interrupt function "
+                              "(AH=%02Xh): '%s'"
+                              % (instruction[0], ah, instruction[1]))
+
+
+def run(text, entry=None, limit=1000000):
+    """
+    Executes assembler's code 'text' (see Simulator.run description).
+    """
+    return Simulator(text).run(entry, limit)
+
+
+def report(res, output=None):
+    """
+    Prints Simulator.run() result.
+    """
+    print("status         %s" % res["status"], file=output)
+    if res["exit_code"] is not None:
+        print("exit code      %i" % res["exit_code"], file=output)
+    for name in ("instructions", "jumps", "calls"):
+        print("%-14s %i" % (name, res[name]), file=output)
+    print("max stack      %i bytes" % res["max_stack"], file=output)
+    if res["output"]:
+        print("output         %r" % res["output"], file=output)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Executes generated code and counts executed "
+                    "instructions, jumps taken and maximum stack depth.")
+    arg_parser.add_argument("file",
+                            help=".asm file, or .sig file to be compiled")
+    arg_parser.add_argument("-e", "--entry",
+                            help="label of a procedure to be called instead "
+                                 "of running the program from 'start'")
+    arg_parser.add_argument("-l", "--limit", type=int, default=1000000,
+                            help="maximum number of instructions "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument("--json", action="store_true",
+                            help="print result as JSON")
+    args = arg_parser.parse_args(argv)
+    if args.file[-4:] == ".sig":
+        import compiler
+        source = compiler.read_source(args.file[:-4])
+        if source is None:
+            print("No such file found: %s" % args.file)
+            return 1
+        compiled = compiler.compile_string(source,
+                                           os.path.dirname(args.file))
+        if compiled["asm"] is None:
+            print("%s: compilation failed" % args.file)
+            return 1
+        text = compiled["asm"]
+    else:
+        f = open(args.file, "r")
+        text = f.read()
+        f.close()
+    try:
+        res = run(text, args.entry, args.limit)
+    except (x86_backend.EncodingError, SimulationError) as e:
+        print("%s: %s" % (args.file, e))
+        return 1
+    if args.json:
+        print(json.dumps(res, indent=1, sort_keys=True))
+    else:
+        report(res)
+    return 0 if res["status"] in ("exit", "return") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Default start-up budget (seconds) for medians of measured values. If any
+# of them is exceeded, the benchmark exits with code 1. Absolute times depend
+# on the machine: budgets are set with --import-budget and
+# --first-token-budget.
+IMPORT_BUDGET = 0.030
+FIRST_TOKEN_BUDGET = 0.001
+
+# This program is run in a fresh interpreter for every measurement. Only
+# time module is imported before the import is timed: modules, that the
+# compiler imports (e.g. re), must not be cached by the probe itself.
+PROBE = """
+import time
+start = time.perf_counter()
+import code_generator
+imported = time.perf_counter()
+import io
+code_gen = code_generator.CodeGenerator()
+code_gen.parser.lex.analysis(io.StringIO("PROCEDURE"))
+first_token = time.perf_counter()
+import json
+print(json.dumps({"import": imported - start,
+                  "first_token": first_token - imported}))
+"""
+
+
+def measure(runs=11):
+    """
+    Runs PROBE 'runs' times and measures:
+        'import' - time to import code_generator -> syntax_analyzer ->
+        lexical_analyzer chain;
+        'first_token' - time to create CodeGenerator and get the first token;
+        'process' - wall time of the whole interpreter process.
+    :returns dictionary of medians (seconds).
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = {"import": [], "first_token": [], "process": []}
+    # The first run compiles modules' bytecode, so it is not counted. The
+    # bytecode must be cached: otherwise every import compiles the sources.
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    subprocess.run([sys.executable, "-c", PROBE], cwd=here, check=True,
+                   stdout=subprocess.DEVNULL, env=env)
+    for i in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=here,
+                             env=env, check=True,
+                             stdout=subprocess.PIPE).stdout
+        samples["process"].append(time.perf_counter() - start)
+        res = json.loads(out.decode())
+        samples["import"].append(res["import"])
+        samples["first_token"].append(res["first_token"])
+    return dict((x, statistics.median(samples[x])) for x in samples)
+
+
+def main(argv=None):
+    """
+    Prints start-up figures and checks them against the budget.
+    :returns exit code: 0 if start-up fits the budget, 1 otherwise.
+    """
+    arg_parser = argparse.ArgumentParser(
+        description="Measures import time and time to the first token in "
+                    "fresh interpreters and fails if they exceed the "
+                    "budget.")
+    arg_parser.add_argument("--import-budget", type=float,
+                            default=IMPORT_BUDGET * 1000, metavar="MS",
+                            help="budget of import time (default: "
+                                 "%(default)s ms)")
+    arg_parser.add_argument("--first-token-budget", type=float,
+                            default=FIRST_TOKEN_BUDGET * 1000, metavar="MS",
+                            help="budget of time to the first token "
+                                 "(default: %(default)s ms)")
+    arg_parser.add_argument("-r", "--runs", type=int, default=11,
+                            help="measured runs; medians are checked "
+                                 "(default: %(default)s)")
+    args = arg_parser.parse_args(argv)
+    if args.runs < 1:
+        arg_parser.error("--runs must be positive")
+    res = measure(args.runs)
+    failed = False
+    for name, budget in (("import", args.import_budget / 1000),
+                         ("first_token", args.first_token_budget / 1000),
+                         ("process", None)):
+        if budget is None:
+            print("%-12s %8.2f ms" % (name, res[name] * 1000))
+        elif res[name] > budget:
+            failed = True
+            print("%-12s %8.2f ms  OVER BUDGET (%.2f ms)"
+                  % (name, res[name] * 1000, budget * 1000))
+        else:
+            print("%-12s %8.2f ms  (budget %.2f ms)"
+                  % (name, res[name] * 1000, budget * 1000))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import collections
+import functools
+import os
+import sys
+
+import code_generator
+import compiler
+import syntax_analyzer
+
+
+class TokenWindow:
+    """
+    Sequence-like view of a token stream, that is used by StreamParser
+    instead of a token list. Tokens are pulled from lexer on demand, and
+    tokens, that parser doesn't need any more, are dropped (see trim()), so
+    only a small part of the token stream is kept in memory.
+
+    Lexical errors ('E1' and 'E2' tokens) are not passed to parser: they are
+    collected into 'lexical_errors' list in the form of Parser.error_list
+    elements. Every token, including erroneous ones, is passed to 'on_token'
+    callback as soon as it is read.
+
+    Class contents methods:
+    1. __init__(self, tokens, on_token=None)
+    2. pull(self)
+    3. available(self, i)
+    4. __getitem__(self, i)
+    5. trim(self, i)
+    6. drain(self)
+    """
+
+    def __init__(self, tokens, on_token=None):
+        self.tokens = tokens
+        self.on_token = on_token
+        self.buffer = collections.deque()
+        self.base = 0
+        self.count = 0
+        self.exhausted = False
+        self.lexical_errors = []
+
+    def pull(self):
+        """
+        Reads the next token from the stream.
+        :returns False if the stream is exhausted, True otherwise.
+        """
+        token = next(self.tokens, None)
+        if token is None:
+            self.exhausted = True
+            return False
+        self.count += 1
+        if self.on_token is not None:
+            self.on_token(token)
+        if token[0] == "E1":
+            self.lexical_errors.append([12, token[2], token[3]])
+        elif token[0] == "E2":
+            self.lexical_errors.append([13, token[1], token[2]])
+        else:
+            self.buffer.append(token)
+        return True
+
+    def available(self, i):
+        """
+        Returns True if there is a token with index 'i' in the stream.
+        """
+        while not self.exhausted and self.base + len(self.buffer) <= i:
+            self.pull()
+        return i < self.base + len(self.buffer)
+
+    def __getitem__(self, i):
+        if i < self.base or not self.available(i):
+            raise IndexError("token #%i is not available" % i)
+        return self.buffer[i - self.base]
+
+    def trim(self, i):
+        """
+        Drops tokens with indexes less than 'i'.
+        """
+        while self.buffer and self.base < i:
+            self.buffer.popleft()
+            self.base += 1
+
+    def drain(self):
+        """
+        Reads the rest of the stream.
+        """
+        while self.pull():
+            pass
+        self.buffer.clear()
+
+
+class StreamParser(syntax_analyzer.Parser):
+    """
+    Parser, that reads tokens from a TokenWindow and passes statements of
+    the procedure's block to code generator one by one, as soon as each of
+    them is parsed, instead of building the whole syntax tree.
+
+    All of the rules are parsed by Parser's methods, so errors are the same.
+    'max_ct' is a property here: it tells Parser's methods whether the
+    current token exists, without knowing the length of the stream.
+
+    Class contents methods:
+    1. __init__(self, code_gen)
+    2. parse_stream(self, tokens, on_token=None)
+    3. emitting(self)
+    4. parse_procedure_id(self), parse_param_list(self) - remember the
+    subtrees for code generator.
+    5. parse_block(self) - parses statements one by one.
+    """
+
+    def __init__(self, code_gen):
+        self.code_gen = code_gen
+        self.proc_tree = []
+        self.params_tree = []
+        syntax_analyzer.Parser.__init__(self)
+
+    @property
+    def max_ct(self):
+        if self.token_list.available(self.ct):
+            return self.ct
+        return self.ct - 1
+
+    @max_ct.setter
+    def max_ct(self, value):
+        pass
+
+    def reset(self):
+        syntax_analyzer.Parser.reset(self)
+        self.proc_tree = []
+        self.params_tree = []
+
+    def parse_stream(self, tokens, on_token=None):
+        """
+        Parses a stream of tokens.
+        If any lexical error occurs, self.error_list contains lexical errors
+        only, as it does after Parser.parser().
+        :param tokens: iterator of tokens (see Lexer.tokens).
+        :param on_token: see TokenWindow description.
+        """
+        self.token_list = TokenWindow(tokens, on_token)
+        self.ct = 0
+        self.parse_programs_list()
+        self.token_list.drain()
+        if self.token_list.lexical_errors:
+            self.error_list = self.token_list.lexical_errors
+
+    def emitting(self):
+        """
+        Returns True if parsed statements are to be passed to code generator:
+        no errors have been found yet.
+        """
+        return not self.error_list and not self.token_list.lexical_errors
+
+    def parse_procedure_id(self):
+        self.proc_tree = syntax_analyzer.Parser.parse_procedure_id(self)
+        return self.proc_tree
+
+    def parse_param_list(self):
+        self.params_tree = syntax_analyzer.Parser.parse_param_list(self)
+        return self.params_tree
+
+    def parse_block(self):
+        """
+        Parses the rule #3:
+        <BLOCK> -> <DECLARATIONS> BEGIN <STATEMENTS-LIST> END
+        Statements are not kept in the tree: each of them is passed to
+        code generator and dropped.
+        """
+        res = self.parse_declarations()
+        if self.ct > self.max_ct or self.token_list[self.ct][0] != 402:
+            return self.process_error(2)
+        if self.emitting():
+            self.code_gen.stream_begin(self.proc_tree, res)
+        res.append(402)
+        self.ct += 1
+        while self.ct > self.max_ct or \
+                self.token_list[self.ct][0] not in (403, 41):
+            self.token_list.trim(self.ct - 1)
+            start = self.ct
+            stmt = self.parse_statement()
+            if self.ct > self.max_ct:
+                self.process_error(3)
+                break
+            if self.ct == start:
+                # Parser.parse_stmt_list would try the same token again
+                break
+            if self.emitting():
+                self.code_gen.stream_statement(stmt)
+        if self.ct > self.max_ct or self.token_list[self.ct][0] != 403:
+            return self.process_error(3)
+        res.extend(["<STATEMENTS-LIST>", ["<EMPTY>"], 403])
+        self.ct += 1
+        if self.emitting():
+            self.code_gen.stream_procedure_end(self.params_tree)
+        return ["<BLOCK>", res]
+
+
+class StreamCodeGenerator(code_generator.CodeGenerator):
+    """
+    Code generator for streaming compilation: tokens are read from the
+    source file one by one, each statement is compiled and written as soon
+    as it is parsed, listing is written token by token. Memory usage is
+    bounded by the largest statement (plus identifiers' and labels' tables)
+    instead of the whole program.
+
+    Checks of labels referred by GOTO statements (error #19) are deferred
+    until the end of the procedure. Results (generated code, listing and
+    errors) are the same as the ones of CodeGenerator.
+
+    Class contents lists:
+    1. gotos - codes of labels referred by GOTO statements of the current
+    procedure.
+
+    Class contents methods:
+    1. __init__(self, insert_dir="")
+    2. reset(self, insert_dir="")
+    3. code_gen(self, source_file, code_file, listing_file=None)
+    4. stream_begin(self, proc_tree, declarations)
+    5. stream_statement(self, tree)
+    6. stream_procedure_end(self, params_tree)
+    7. stream_end(self)
+    """
+
+    def __init__(self, insert_dir=""):
+        self.parser = StreamParser(self)
+        self.reset(insert_dir)
+
+    def reset(self, insert_dir=""):
+        code_generator.CodeGenerator.reset(self, insert_dir)
+        self.gotos = []
+        self.failed = False
+        self.tokens_count = 0
+        self.procedures = 0
+        self.main_params_code = ""
+
+    def code_gen(self, source_file, code_file, listing_file=None):
+        """
+        Compiles 'source_file'.
+        :param source_file: file object, SIGNAL program, that is being
+        compiled.
+        :param code_file: file object, .asm file, which code is written to.
+        If compilation fails, it contains a part of code.
+        :param listing_file: file object, .lst file, which listing is written
+        to; if None, listing is not written.
+        :returns 0 in case of success, or 1 if any error occurs.
+        """
+        self.code_file = code_file
+        self.error_list = []
+        on_token = None
+        if listing_file is not None:
+            self.listing_start(listing_file)
+            on_token = functools.partial(self.listing_token,
+                                         output=listing_file)
+        self.parser.parse_stream(self.parser.lex.tokens(source_file),
+                                 on_token)
+        self.tokens_count = self.parser.token_list.count
+        if self.parser.error_list:
+            self.error_list = self.parser.error_list
+            res = 1
+        else:
+            res = self.stream_end()
+        if listing_file is not None:
+            self.listing_end(listing_file)
+        return res
+
+    def stream_begin(self, proc_tree, declarations):
+        """
+        Generates the beginning of a procedure up to the first statement (and
+        the beginning of the program before the first procedure).
+        :param proc_tree: result of Parser.parse_procedure_id().
+        :param declarations: result of Parser.parse_declarations().
+        """
+        if self.failed:
+            return
+        if self.procedures == 0:
+            print("code segment\nassume cs:code\n", file=self.code_file)
+        if self.procedure_begin(proc_tree[1], self.procedures) != 0:
+            self.failed = True
+            return
+        self.procedures += 1
+        self.gotos = []
+        if self.code_gen_declarations(declarations[1]) != 0:
+            self.failed = True
+
+    def stream_statement(self, tree):
+        """
+        Generates code for one statement.
+        :param tree: result of Parser.parse_statement().
+        """
+        if self.failed:
+            return
+        res = self.code_gen_statement(tree[1])
+        if type(res) == int and res != 0:
+            self.failed = True
+        elif type(res) == str:
+            self.gotos.append(res)
+
+    def stream_procedure_end(self, params_tree):
+        """
+        Checks labels referred by GOTO statements of the procedure and
+        generates its end.
+        :param params_tree: result of Parser.parse_param_list().
+        """
+        if self.failed:
+            return
+        for label in reversed(self.gotos):
+            if not self.labels[label]:
+                self.process_error(19, label)
+                self.failed = True
+                return
+        if self.procedure_end(params_tree[1]) != 0:
+            self.failed = True
+        elif self.procedures == 1:
+            self.main_params_code = self.params_code
+
+    def stream_end(self):
+        """
+        Generates the end of the program.
+        :returns 0 in case of success, or 1 if any semantic error occurs.
+        """
+        if self.failed or self.procedures == 0:
+            return 1
+        print("start:\nxor ax, ax", file=self.code_file)
+        self.code_file.write(self.main_params_code)
+        print("mov ax, 4c00h\nint 21h\ncode ends\n\nend start",
+              file=self.code_file)
+        return 0
+
+
+def compile_file(filename, share_inserts=None, max_errors=None):
+    """
+    Compiles 'filename'.sig file in streaming mode: .asm and .lst files are
+    written into temporary files while the source is being read, and replace
+    the old ones when compilation is finished; .asm file is removed if
+    compilation fails.
+    :param filename: source file name without '.sig' extension.
+    :param share_inserts: see CodeGenerator.share_inserts description.
+    :param max_errors: see compiler.compile_string() description.
+    :returns the same dictionary as compiler.compile_file() does.
+    """
+    try:
+        f = open(filename + ".sig", "r", encoding=compiler.SOURCE_ENCODING)
+    except FileNotFoundError:
+        return compiler.file_result(filename)
+    code_gen = StreamCodeGenerator(os.path.dirname(filename))
+    code_gen.share_inserts = share_inserts
+    code_gen.parser.lex.max_errors = max_errors
+    code_gen.parser.lex.merge_errors = max_errors is not None
+    g, asm_temp = compiler.open_temp(filename + ".asm")
+    h, lst_temp = compiler.open_temp(filename + ".lst",
+                                     encoding=compiler.SOURCE_ENCODING)
+    try:
+        code_gen.code_gen(f, g, h)
+    except BaseException:
+        f.close()
+        g.close()
+        h.close()
+        os.remove(asm_temp)
+        os.remove(lst_temp)
+        raise
+    f.close()
+    g.close()
+    h.close()
+    os.replace(lst_temp, filename + ".lst")
+    if code_gen.error_list:
+        os.remove(asm_temp)
+        if os.path.exists(filename + ".asm"):
+            os.remove(filename + ".asm")
+    else:
+        os.replace(asm_temp, filename + ".asm")
+    return compiler.file_result(filename, {
+        "errors": compiler.error_records(code_gen),
+        "tokens": code_gen.tokens_count,
+        "inserts": code_gen.insert_files}, not code_gen.error_list)
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:]:
+        compiler.report(compile_file(name[:-4] if name[-4:] == ".sig"
+                                     else name))
@@ -28,45 +28,101 @@ class Parser:
 
     Class contents objects:
     1. lex - an instance of class Lexer. Is being created by constructor.
+    2. stats - None or an instance of compile_stats.CompileStats, which
+    syntax analysis time is added to.
 
     Class contents methods:
     1. __init__(self)
-    2. parser(self, file)
-    3-17: methods to parse each rule of given grammar.
-    18. process_error(self, n)
-    19. find_lexical_errors(self)
-    20. listing(self, output=None, only_first_error=True)
-    21. pretty_print(self, tree, n=0, output=None)
+    2. reset(self)
+    3. parser(self, file)
+    4. parse_tokens(self, token_list)
+    5-19: methods to parse each rule of given grammar (including
+    parse_programs_list(self) for translation units of several procedures).
+    20. nested_list(name, separator, items)
+    21. process_error(self, n)
+    22. find_lexical_errors(self)
+    23. listing(self, output=None, only_first_error=True)
+    24. pretty_print(self, tree, n=0, output=None)
     """
     token_list = []
     syntax_tree = []
     error_list = []
     ct = 0
     max_ct = 0
+    stats = None
 
     def __init__(self):
         self.lex = lexical_analyzer.Lexer()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the results of previous analysis (including lexer's tables), so
+        that the same instance can analyse another file.
+        """
+        self.lex.reset()
+        self.token_list = []
+        self.syntax_tree = []
+        self.error_list = []
+        self.ct = 0
+        self.max_ct = 0
 
     def parser(self, file):
         """
         Main method for syntax analysis.
+        Performs lexical analysis on 'file' and parses its result (see
+        self.parse_tokens description).
+
+        :param file: file, analysis is performed on.
+        """
+        return self.parse_tokens(self.lex.analysis(file))
+
+    def parse_tokens(self, token_list):
+        """
         Parses the rule #1:
         <SIGNAL-PROGRAM> -> <PROGRAM>
 
-        At first calls lexical analysis and searches for lexical errors in
-        self.token_list using self.find_lexical_errors(). If any is found,
-        returns []; otherwise starts syntax analysis. If any syntax error is
-        found, returns []; otherwise returns self.syntax_tree.
+        At first searches for lexical errors in 'token_list' using
+        self.find_lexical_errors(). If any is found, returns []; otherwise
+        starts syntax analysis. If any syntax error is found, returns [];
+        otherwise returns self.syntax_tree.
 
-        :param file: file, analysis is performed on.
+        :param token_list: list of tokens made by self.lex.
+        """
+        if self.stats is not None:
+            self.stats.start("parse")
+        self.token_list = token_list
+        res = []
+        if not self.find_lexical_errors():
+            self.max_ct = len(self.token_list) - 1
+            res = self.parse_programs_list()
+            if not self.error_list:
+                self.syntax_tree = ["<SIGNAL-PROGRAM>", res]
+        if self.stats is not None:
+            self.stats.stop("parse")
+        return res
+
+    def parse_programs_list(self):
+        """
+        Parses a translation unit: a sequence of procedures.
+        <SIGNAL-PROGRAM> -> <PROGRAM> <PROGRAMS-LIST>
+        <PROGRAMS-LIST> -> <PROGRAM> <PROGRAMS-LIST> | <EMPTY>
+        Every procedure after the first one begins with PROCEDURE keyword;
+        tokens after the last procedure are ignored, as they have always
+        been. Returns the list: ["<PROGRAM>", [...], "<PROGRAM>", [...], ...]
+        (one pair for every procedure), or [] if any error occurs.
         """
-        self.token_list = self.lex.analysis(file)
-        if self.find_lexical_errors():
-            return []
-        self.max_ct = len(self.token_list) - 1
         res = self.parse_program()
-        if not self.error_list:
-            self.syntax_tree = ["<SIGNAL-PROGRAM>", res]
+        while res:
+            # parse_program() stops at the last semicolon
+            self.ct += 1
+            if self.ct > self.max_ct or self.token_list[self.ct][0] != 401:
+                self.ct -= 1
+                break
+            program = self.parse_program()
+            if not program:
+                return []
+            res.extend(program)
         return res
 
     def parse_program(self):
@@ -142,16 +198,16 @@ class Parser:
         <LABELS-LIST> ->
             , <UNSIGNED-INTEGER> <LABELS-LIST>; |
             <EMPTY>
+        The list is parsed in a loop, so the number of labels isn't limited
+        by recursion depth.
         """
-        if self.ct <= self.max_ct and self.token_list[self.ct][0] == 59:
-            return ["<LABELS-LIST>", ["<EMPTY>"]]
-        if self.ct > self.max_ct or self.token_list[self.ct][0] != 44:
-            return self.process_error(5)
-        res = list([44])
-        self.ct += 1
-        res.extend(self.parse_unsigned())
-        res.extend(self.parse_labels_list())
-        return ["<LABELS-LIST>", res]
+        items = []
+        while self.ct > self.max_ct or self.token_list[self.ct][0] != 59:
+            if self.ct > self.max_ct or self.token_list[self.ct][0] != 44:
+                return self.process_error(5)
+            self.ct += 1
+            items.append(self.parse_unsigned())
+        return self.nested_list("<LABELS-LIST>", 44, items)
 
     def parse_param_list(self):
         """
@@ -180,16 +236,15 @@ class Parser:
         <IDENTIFIERS-LIST> ->
             , <VARIABLE-IDENTIFIER> <IDENTIFIERS-LIST> |
             <EMPTY>
+        The list is parsed in a loop (see self.parse_labels_list).
         """
-        if self.ct <= self.max_ct and self.token_list[self.ct][0] == 41:
-            return ["<IDENTIFIERS-LIST>", ["<EMPTY>"]]
-        if self.ct > self.max_ct or self.token_list[self.ct][0] != 44:
-            return self.process_error(5)
-        res = list([44])
-        self.ct += 1
-        res.extend(self.parse_variable_id())
-        res.extend(self.parse_id_list())
-        return ["<IDENTIFIERS-LIST>", res]
+        items = []
+        while self.ct > self.max_ct or self.token_list[self.ct][0] != 41:
+            if self.ct > self.max_ct or self.token_list[self.ct][0] != 44:
+                return self.process_error(5)
+            self.ct += 1
+            items.append(self.parse_variable_id())
+        return self.nested_list("<IDENTIFIERS-LIST>", 44, items)
 
     def parse_stmt_list(self):
         """
@@ -197,16 +252,21 @@ class Parser:
         <STATEMENTS-LIST> ->
             <STATEMENT> <STATEMENTS-LIST> |
             <EMPTY>
-        """
-        if self.ct <= self.max_ct and self.token_list[self.ct][0] == 403:
-            return ["<STATEMENTS-LIST>", ["<EMPTY>"]]
-        if self.ct <= self.max_ct and self.token_list[self.ct][0] == 41:
-            return ["<STATEMENTS-LIST>", ["<EMPTY>"]]
-        res = self.parse_statement()
-        if self.ct > self.max_ct:
-            return self.process_error(3)
-        res.extend(self.parse_stmt_list())
-        return ["<STATEMENTS-LIST>", res]
+        The list is parsed in a loop (see self.parse_labels_list). If a
+        statement can't be parsed and no token is consumed, parsing of the
+        list stops.
+        """
+        items = []
+        while self.ct > self.max_ct or \
+                self.token_list[self.ct][0] not in (403, 41):
+            start = self.ct
+            items.append(self.parse_statement())
+            if self.ct > self.max_ct:
+                return self.process_error(3)
+            if self.ct == start:
+                # The same token would be tried again and again
+                break
+        return self.nested_list("<STATEMENTS-LIST>", None, items)
 
     def parse_statement(self):
         """
@@ -219,8 +279,19 @@ class Parser:
             ($ <ASSEMBLY-INSERT-FILE-IDENTIFIER> $) |
             IF <CONDITION> THEN (<STATEMENT-LIST>)
             ELSE (<STATEMENT-LIST>);
+        Labels of a statement are parsed in a loop, so the length of a
+        chain of labels isn't limited by recursion depth.
         """
-        if self.ct <= self.max_ct and self.token_list[self.ct][0] == 407:
+        prefixes = []
+        while self.ct > self.max_ct or \
+                self.token_list[self.ct][0] not in (407, 59, 406, 301, 405):
+            res = self.parse_unsigned()
+            if self.ct > self.max_ct or self.token_list[self.ct][0] != 58:
+                return self.process_error(9)
+            res.append(58)
+            self.ct += 1
+            prefixes.append(res)
+        if self.token_list[self.ct][0] == 407:
             res = list([407])
             self.ct += 1
             res.extend(self.parse_condition())
@@ -254,17 +325,17 @@ class Parser:
                 return self.process_error(1)
             res.append(59)
             self.ct += 1
-        elif self.ct <= self.max_ct and self.token_list[self.ct][0] == 59:
+        elif self.token_list[self.ct][0] == 59:
             res = list([59])
             self.ct += 1
-        elif self.ct <= self.max_ct and self.token_list[self.ct][0] == 406:
+        elif self.token_list[self.ct][0] == 406:
             res = list([406])
             self.ct += 1
             if self.ct > self.max_ct or self.token_list[self.ct][0] != 59:
                 return self.process_error(1)
             res.append(59)
             self.ct += 1
-        elif self.ct <= self.max_ct and self.token_list[self.ct][0] == 301:
+        elif self.token_list[self.ct][0] == 301:
             res = list([301])
             self.ct += 1
             res.extend(self.parse_asm_file_id())
@@ -272,7 +343,7 @@ class Parser:
                 return self.process_error(8)
             res.append(302)
             self.ct += 1
-        elif self.ct <= self.max_ct and self.token_list[self.ct][0] == 405:
+        else:
             res = list([405])
             self.ct += 1
             res.extend(self.parse_unsigned())
@@ -280,14 +351,10 @@ class Parser:
                 return self.process_error(1)
             res.append(59)
             self.ct += 1
-        else:
-            res = self.parse_unsigned()
-            if self.ct > self.max_ct or self.token_list[self.ct][0] != 58:
-                return self.process_error(9)
-            res.append(58)
-            self.ct += 1
-            res.extend(self.parse_statement())
-        return ["<STATEMENT>", res]
+        res = ["<STATEMENT>", res]
+        for prefix in reversed(prefixes):
+            res = ["<STATEMENT>", prefix + res]
+        return res
 
     def parse_condition(self):
         """
@@ -340,7 +407,8 @@ class Parser:
         Parses identifier or calls error #10 (see self.process_error
         description).
         """
-        if self.ct > self.max_ct or self.token_list[self.ct][0] <= 1000:
+        if self.ct > self.max_ct or \
+                not self.lex.is_identifier(self.token_list[self.ct][0]):
             return self.process_error(10)
         res = [self.token_list[self.ct][0]]
         self.ct += 1
@@ -351,13 +419,32 @@ class Parser:
         Parses unsigned integer or calls error #11 (see self.process_error
         description).
         """
-        if self.ct > self.max_ct or self.token_list[self.ct][0]\
-                not in range(500, 1001):
+        if self.ct > self.max_ct or \
+                not self.lex.is_constant(self.token_list[self.ct][0]):
             return self.process_error(11)
         res = [self.token_list[self.ct][0]]
         self.ct += 1
         return ["<UNSIGNED-INTEGER>", res]
 
+    @staticmethod
+    def nested_list(name, separator, items):
+        """
+        Builds the tree of a list rule (<LABELS-LIST>, <IDENTIFIERS-LIST>,
+        <STATEMENTS-LIST>) of the same shape, as the recursive parsing would
+        build:
+            [name, [separator, <item #1>, name, [separator, <item #2>, ...
+            name, ["<EMPTY>"]]]]
+        :param separator: code of separator token, or None if items are not
+        separated.
+        :param items: list of parsed items; every item is a pair of
+        non-terminal symbol's name and its list.
+        """
+        head = [] if separator is None else [separator]
+        res = ["<EMPTY>"]
+        for item in reversed(items):
+            res = head + item + [name, res]
+        return [name, res]
+
     def process_error(self, n):
         """
         Appends to self.error_list a list of next type: [N, L, P], where N is
@@ -383,12 +470,15 @@ class Parser:
         :param n: error's number
         :return: []
         """
-        try:
-            self.error_list.append([n, self.token_list[self.ct][1],
-                                    self.token_list[self.ct][2]])
-        except IndexError:
-            self.error_list.append([n, self.token_list[self.ct - 1][1],
-                                    self.token_list[self.ct - 1][2]])
+        if self.ct <= self.max_ct:
+            token = self.lex.located(self.token_list[self.ct])
+            self.error_list.append([n, token[1], token[2]])
+        elif self.ct > 0:
+            token = self.lex.located(self.token_list[self.ct - 1])
+            self.error_list.append([n, token[1], token[2]])
+        else:
+            # Empty program
+            self.error_list.append([n, 0, 0])
         return []
 
     def find_lexical_errors(self):
@@ -402,9 +492,11 @@ class Parser:
         for x in self.token_list:
             if type(x[0]) == str and x[0] == "E1":
                 res = True
+                x = self.lex.located(x)
                 self.error_list.append([12, x[2], x[3]])
             elif type(x[0]) == str and x[0] == "E2":
                 res = True
+                x = self.lex.located(x)
                 self.error_list.append([13, x[1], x[2]])
         return res
 
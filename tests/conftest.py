@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Temporary working directory: some of the tools write files into '.'.
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def procedures_source(count, statements, body="RETURN;"):
+    """
+    Returns a program of 'count' procedures of 'statements' statements.
+    """
+    return "".join("PROCEDURE P%i;\nBEGIN\n%s\nEND;\n"
+                   % (i, "\n".join([body] * statements))
+                   for i in range(count))
@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+import async_compiler
+import compiler
+from conftest import ROOT, procedures_source
+
+SAMPLES = ["lexerror", "synterror", "semantic"]
+
+
+def sources():
+    res = [procedures_source(3, 5), procedures_source(20, 50),
+           "PROCEDURE P;\nBEGIN\nRETURN;\n($ INS $);\nEND;\n"]
+    for name in SAMPLES:
+        res.append(compiler.read_source(os.path.join(ROOT, name)))
+    return res
+
+
+def test_concurrent_results_match_compile_string():
+    async def compile_all(texts):
+        with async_compiler.make_executor("thread", 4) as executor:
+            return await asyncio.gather(*[
+                async_compiler.compile_source(x, ROOT, executor)
+                for x in texts])
+    texts = sources()
+    results = asyncio.run(compile_all(texts))
+    for text, res in zip(texts, results):
+        assert res == compiler.compile_string(text, ROOT)
+    assert any(res["errors"] for res in results)
+    assert any(res["asm"] is not None for res in results)
+
+
+def test_compile_many_yields_every_file(workdir):
+    names = []
+    for i, text in enumerate(sources()):
+        names.append("prog%i" % i)
+        f = open(names[-1] + ".sig", "w")
+        f.write(text)
+        f.close()
+    names.append("missing")
+
+    async def collect():
+        return [res async for res in async_compiler.compile_many(
+            names, max_concurrency=2, write=False)]
+    results = dict((res["name"], res) for res in asyncio.run(collect()))
+    assert sorted(results) == sorted(names)
+    assert not results["missing"]["found"]
+    for name in names[:-1]:
+        expected = compiler.compile_string(compiler.read_source(name))
+        assert results[name]["asm"] == expected["asm"]
+        assert results[name]["listing"] == expected["listing"]
+        assert results[name]["errors"] == expected["errors"]
+    assert not os.path.exists("prog0.asm")
@@ -0,0 +1,91 @@
+import math
+
+import pytest
+
+import bench_history
+
+SAMPLES = [100.0, 103.0, 98.0, 101.0, 99.0, 102.0, 97.0]
+
+
+def result(samples):
+    return {"unit": "tokens/s", "median": sorted(samples)[len(samples) // 2],
+            "samples": list(samples), "normalized": list(samples)}
+
+
+def run(**results):
+    return dict((key.replace("_", ":"), result(results[key]))
+                for key in results)
+
+
+def verdicts(base, new, **kwargs):
+    return dict((row[0], row[6])
+                for row in bench_history.compare(base, new, **kwargs))
+
+
+def test_u_distribution_counts_every_ordering():
+    assert bench_history.u_distribution(2, 2) == [1, 1, 2, 1, 1]
+    for m, n in ((3, 4), (7, 7), (5, 1)):
+        counts = bench_history.u_distribution(m, n)
+        assert len(counts) == m * n + 1
+        assert sum(counts) == math.comb(m + n, m)
+        assert counts == counts[::-1]
+
+
+def test_mann_whitney():
+    slower = [x * 0.8 for x in SAMPLES]
+    # Every old sample exceeds every new one: the least likely ordering
+    assert bench_history.mann_whitney(SAMPLES, slower) == \
+        pytest.approx(1 / math.comb(14, 7))
+    assert bench_history.mann_whitney(slower, SAMPLES) == 1.0
+    assert bench_history.mann_whitney(SAMPLES, SAMPLES) > 0.4
+    assert bench_history.mann_whitney(SAMPLES, []) == 1.0
+    # Large samples use the normal approximation
+    large = SAMPLES * 10
+    assert bench_history.mann_whitney(large, [x * 0.8 for x in large]) < \
+        1e-6
+    assert bench_history.mann_whitney(large, list(large)) > 0.4
+
+
+def test_identical_runs_have_no_regressions():
+    base = run(statements_lex=SAMPLES, statements_parse=SAMPLES)
+    new = run(statements_lex=SAMPLES, statements_parse=SAMPLES)
+    assert verdicts(base, new) == {"statements:lex": "ok",
+                                   "statements:parse": "ok"}
+
+
+def test_shifted_run_is_flagged():
+    base = run(statements_lex=SAMPLES, statements_parse=SAMPLES,
+               procedures_lex=SAMPLES)
+    new = run(statements_lex=[x * 0.7 for x in SAMPLES],
+              statements_parse=[x * 1.3 for x in SAMPLES],
+              procedures_lex=[x * 0.97 for x in SAMPLES])
+    assert verdicts(base, new) == {"statements:lex": "SLOWER",
+                                   "statements:parse": "faster",
+                                   "procedures:lex": "ok"}
+    # A slowdown below the threshold is ignored even if it is significant
+    assert verdicts(base, new, threshold=0.5)["statements:lex"] == "ok"
+
+
+def test_noisy_slowdown_is_not_significant():
+    base = run(statements_lex=[100.0, 60.0, 140.0])
+    new = run(statements_lex=[80.0, 150.0, 50.0])
+    assert verdicts(base, new) == {"statements:lex": "ok"}
+
+
+def test_history_round_trip(workdir):
+    history = bench_history.BenchHistory("history.json")
+    history.record(run(statements_lex=SAMPLES), 10, 7, "abc123")
+    history.record(run(statements_lex=[x * 0.7 for x in SAMPLES]), 10, 7,
+                   "def456")
+    history.save()
+    history = bench_history.BenchHistory("history.json")
+    assert history.find("abc")["commit"] == "abc123"
+    assert history.find("-1")["commit"] == "def456"
+    with pytest.raises(ValueError):
+        history.find("5")
+    with pytest.raises(ValueError):
+        history.find("fff")
+    assert bench_history.main(["--history", "history.json", "compare",
+                               "0", "1"]) == 1
+    assert bench_history.main(["--history", "history.json", "compare",
+                               "0", "0"]) == 0
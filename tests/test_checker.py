@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+import checker
+import compiler
+import differential
+import workload_generator
+from conftest import ROOT
+
+
+def test_checker_agrees_on_samples():
+    harness = differential.Harness(["reference", "checker"], shrink_tests=0)
+    for name, source, insert_dir in differential.corpus_programs([ROOT]):
+        harness.run(name, source, insert_dir)
+    assert harness.programs >= 3
+    assert harness.mismatches == []
+
+
+def test_checker_agrees_on_random_programs(tmp_path):
+    harness = differential.Harness(["reference", "checker"], shrink_tests=0)
+    for name, source in differential.random_programs(60, str(tmp_path)):
+        harness.run(name, source, str(tmp_path))
+    assert harness.mismatches == []
+
+
+@pytest.mark.parametrize("scenario", sorted(workload_generator.SCENARIOS))
+def test_checker_agrees_with_reference(scenario, tmp_path):
+    # Checker duplicates Parser's grammar: every scenario, well-formed and
+    # mutated, must give the same tokens, tables and errors.
+    insert_dir = str(tmp_path)
+    harness = differential.Harness(["reference", "checker"], shrink_tests=0)
+    rng = random.Random(scenario)
+    for i in range(8):
+        source = workload_generator.generate(scenario, rng.randint(1, 15),
+                                             insert_dir, i)
+        harness.run("%s #%i" % (scenario, i), source, insert_dir)
+        for j in range(3):
+            harness.run("%s #%i, malformed" % (scenario, i),
+                        differential.mutate(source, rng), insert_dir)
+    assert harness.mismatches == []
+
+
+@pytest.mark.parametrize("source, codes", [
+    ("PROCEDURE P;\nLABEL 1, 1;\nBEGIN\nEND;\n", [17]),
+    ("PROCEDURE P(A, A);\nBEGIN\nEND;\n", [18]),
+    ("PROCEDURE P;\nLABEL 1;\nBEGIN\nGOTO 1;\nEND;\n", [19]),
+    ("PROCEDURE P;\nBEGIN\n($ NONE $)\nEND;\n", [20]),
+    ("PROCEDURE P;\nBEGIN\nGOTO 2;\nEND;\n", [22]),
+    ("PROCEDURE P;\nBEGIN\nGOTO 2\nEND;\n", [1]),
+])
+def test_check_string_reports_compilation_errors(source, codes, tmp_path):
+    res = checker.check_string(source, str(tmp_path))
+    assert [x["code"] for x in res["errors"]] == codes
+    assert res["errors"] == \
+        compiler.compile_string(source, str(tmp_path))["errors"]
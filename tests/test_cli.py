@@ -0,0 +1,55 @@
+import json
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import compiler
+from conftest import ROOT
+
+
+def copy_samples(*names):
+    for name in names:
+        shutil.copy("%s/%s.sig" % (ROOT, name), name + ".sig")
+
+
+def test_stats_json_is_the_only_standard_output(workdir, capsys):
+    copy_samples("synterror")
+    f = open("good.sig", "w")
+    f.write("PROCEDURE P;\nBEGIN\nRETURN;\nEND;\n")
+    f.close()
+    assert compiler.main(["-j", "1", "--stats", "json", "good.sig",
+                          "synterror.sig"]) == 1
+    out, err = capsys.readouterr()
+    data = json.loads(out)
+    assert data["counters"]["files"] == 2
+    assert "2 file(s) compiled, 1 failed" in err
+
+
+def test_compilation_without_stats_does_not_import_them():
+    code = "import sys, code_generator, compiler; " \
+        "print('compile_stats' in sys.modules, 'json' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                         stdout=subprocess.PIPE).stdout
+    assert out.split() == [b"False", b"False"]
+
+
+def test_stats_with_stream_is_rejected(workdir, capsys):
+    copy_samples("synterror")
+    with pytest.raises(SystemExit) as e:
+        compiler.main(["--stats", "--stream", "synterror.sig"])
+    assert e.value.code == 2
+
+
+def test_batch_exit_codes(workdir, capsys):
+    copy_samples("synterror", "lexerror")
+    f = open("good.sig", "w")
+    f.write("PROCEDURE P;\nBEGIN\nRETURN;\nEND;\n")
+    f.close()
+    assert compiler.main(["good.sig"]) == 0
+    assert compiler.main(["-j", "2", "good.sig", "good.sig"]) == 0
+    assert compiler.main(["good.sig", "synterror.sig"]) == 1
+    assert compiler.main(["-j", "2", "lexerror.sig", "good.sig"]) == 1
+    assert compiler.main(["good.sig", "missing.sig"]) == 1
+    assert "No such file found" in capsys.readouterr()[0]
@@ -0,0 +1,72 @@
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+import compile_server
+
+PROGRAM = "PROCEDURE P;\nBEGIN\nRETURN;\nEND;\n"
+
+
+@pytest.fixture
+def server(workdir):
+    server = compile_server.CompileServer("daemon.sock", 1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def exchange(path, requests):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    f = sock.makefile("rwb")
+    res = []
+    for request in requests:
+        f.write(request.encode("utf-8") + b"\n")
+        f.flush()
+        res.append(json.loads(f.readline().decode("utf-8")))
+    f.close()
+    sock.close()
+    return res
+
+
+def test_compiles_source(server):
+    res = compile_server.request("daemon.sock", source=PROGRAM)
+    assert res["asm"] is not None and res["errors"] == []
+
+
+def test_malformed_requests_get_errors(server):
+    responses = exchange("daemon.sock", [
+        '{"source": 5}', '{"source": "", "insert_dir": []}', '{"path": 1}',
+        '[1]', 'not json', '{}', json.dumps({"source": PROGRAM})])
+    for response in responses[:-1]:
+        assert list(response) == ["error"]
+    # The connection is still served
+    assert responses[-1]["asm"] is not None
+
+
+def test_running_daemon_is_not_replaced(server):
+    with pytest.raises(OSError):
+        compile_server.CompileServer("daemon.sock", 1)
+    assert compile_server.request("daemon.sock", source=PROGRAM)["asm"]
+
+
+def test_stale_socket_is_replaced(workdir):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind("stale.sock")
+    sock.close()
+    server = compile_server.CompileServer("stale.sock", 1)
+    server.server_close()
+    assert not os.path.exists("stale.sock")
+
+
+def test_other_files_are_not_removed(workdir):
+    f = open("file.sock", "w")
+    f.close()
+    with pytest.raises(OSError):
+        compile_server.CompileServer("file.sock", 1)
+    assert os.path.exists("file.sock")
@@ -0,0 +1,15 @@
+import differential
+
+
+def test_compare_reports_differing_parts():
+    source = "PROCEDURE P;\nBEGIN\nRETURN;\nEND;\n"
+    expected = differential.run_engine(differential.reference_engine,
+                                       source, "")[0]
+    actual = dict(expected, asm="", listing=None)
+    assert differential.compare(expected, actual) == ["asm"]
+
+
+def test_shrink_keeps_the_failure():
+    source = "PROCEDURE P;\nBEGIN\nGOTO 1;\nRETURN;\nEND;\n"
+    res = differential.shrink(source, lambda x: "GOTO" in x)
+    assert res.strip() == "GOTO"
@@ -0,0 +1,91 @@
+import io
+import os
+import threading
+
+import pytest
+
+import compiler
+import distributed
+
+PROGRAM = "PROCEDURE P;\nBEGIN\nRETURN;\n($ INS $);\nEND;\n"
+
+
+@pytest.fixture
+def worker():
+    worker = distributed.Worker(["127.0.0.1", 0])
+    thread = threading.Thread(target=worker.serve_forever, daemon=True)
+    thread.start()
+    yield list(worker.server_address[:2])
+    worker.shutdown()
+    worker.server_close()
+
+
+def write(path, text):
+    f = open(path, "w")
+    f.write(text)
+    f.close()
+
+
+def read(path):
+    f = open(path)
+    text = f.read()
+    f.close()
+    return text
+
+
+def test_malformed_requests_get_errors(worker):
+    connection = distributed.Connection(worker, 10)
+    good = "x"
+    for request in [{"op": "put", "blobs": {"a": 5}},
+                    {"op": "put", "blobs": {"a": "x"}},
+                    {"op": "compile", "units": [{"source": 5,
+                                                 "inserts": {}}]},
+                    {"op": "compile", "units": [], "max_errors": "1"},
+                    {"op": "unknown"}, [1]]:
+        with pytest.raises(distributed.WorkerError):
+            connection.call(request)
+    key = distributed.content_hash(good)
+    assert connection.call({"op": "put", "blobs": {key: good}}) == \
+        {"stored": 1}
+    connection.close()
+
+
+def test_build_matches_local_compilation(workdir, worker):
+    os.mkdir("local")
+    os.mkdir("remote")
+    for directory in ["local", "remote"]:
+        write(directory + "/prog.sig", PROGRAM)
+        write(directory + "/bad.sig", PROGRAM.replace("BEGIN", ""))
+        write(directory + "/INS.asm", "nop")
+    local = compiler.collect_sources(["local"])
+    for filename in local:
+        compiler.compile_file(filename)
+    remote = compiler.collect_sources(["remote"])
+    results = distributed.build(remote, [worker], output=io.StringIO())
+    assert [bool(x["errors"]) for x in results] == [True, False]
+    for name in ["prog.asm", "prog.lst", "bad.lst"]:
+        assert read("remote/" + name) == read("local/" + name)
+    assert not os.path.exists("remote/bad.asm")
+
+
+def test_unchanged_units_are_not_sent_again(workdir, worker):
+    write("prog.sig", PROGRAM)
+    write("INS.asm", "nop")
+    for texts in [2, 0]:
+        coordinator = distributed.Coordinator([worker])
+        coordinator.run(["prog"])
+        assert coordinator.counters["blobs"] == texts
+
+
+def test_failed_workers_fall_back_to_local_compilation(workdir,
+                                                       monkeypatch):
+    monkeypatch.setattr(distributed, "RETRY_DELAY", 0)
+    write("prog.sig", PROGRAM)
+    write("INS.asm", "nop")
+    # Nothing listens to port 1
+    coordinator = distributed.Coordinator([["127.0.0.1", 1]], retries=1,
+                                          output=io.StringIO())
+    res = coordinator.run(["prog"])
+    assert res["prog"]["asm"] == compiler.compile_string(
+        PROGRAM, ".")["asm"]
+    assert coordinator.counters["local"] == 1
@@ -0,0 +1,48 @@
+import pytest
+
+import checker
+import compiler
+import stream_compiler
+
+BAD = "PROCEDURE P;\nBEGIN\n# # # ## #\nRETURN;\nEND;\n"
+
+
+@pytest.mark.parametrize("max_errors, positions", [
+    (None, [1, 3, 5, 7, 8, 10]),
+    (1, [1]),
+    (2, [1, 3]),
+    # Runs of unresolved characters are merged under a budget
+    (10, [1, 3, 5, 7, 10]),
+])
+def test_error_budget(max_errors, positions):
+    res = compiler.compile_string(BAD, max_errors=max_errors)
+    assert [x["position"] for x in res["errors"]] == positions
+    assert set(x["code"] for x in res["errors"]) == {12}
+    stopped = "Lexical analysis stopped after %s error(s)" % max_errors
+    assert (stopped in res["listing"]) == (len(positions) == max_errors)
+    assert checker.check_string(BAD, max_errors=max_errors)["errors"] == \
+        res["errors"]
+
+
+def test_error_budget_in_stream_mode(workdir):
+    f = open("bad.sig", "w")
+    f.write(BAD)
+    f.close()
+    res = stream_compiler.compile_file("bad", max_errors=2)
+    assert len(res["errors"]) == 2
+    f = open("bad.lst")
+    listing = f.read()
+    f.close()
+    assert "Lexical analysis stopped after 2 error(s)" in listing
+
+
+def test_fail_fast_stops_at_the_first_error(workdir):
+    f = open("bad.sig", "w")
+    f.write(BAD)
+    f.close()
+    assert compiler.main(["--fail-fast", "bad.sig"]) == 1
+    f = open("bad.lst")
+    listing = f.read()
+    f.close()
+    assert "Lexical analysis stopped after 1 error(s)" in listing
+    assert "RETURN" not in listing
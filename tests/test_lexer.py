@@ -0,0 +1,27 @@
+import io
+
+import lexical_analyzer
+
+SOURCE = "PROCEDURE P;\n(* a\ncomment *) BEGIN\n  # GOTO\n\n1; END;\n(* b\n"
+
+
+def analysis(source, offsets):
+    lex = lexical_analyzer.Lexer()
+    lex.offsets = offsets
+    return lex, lex.analysis(io.StringIO(source))
+
+
+def test_offsets_mode_locates_tokens_as_line_mode():
+    lex, tokens = analysis(SOURCE, True)
+    expected = analysis(SOURCE, False)[1]
+    assert [lex.located(x) for x in tokens] == expected
+    assert list(lex.located_tokens(tokens)) == expected
+    # Newlines inside comments are not counted
+    assert list(lex.newlines) == [12, 34, 43, 44, 52]
+
+
+def test_newline_index_is_built_on_demand():
+    lex, tokens = analysis(SOURCE, True)
+    assert lex.newlines is None
+    assert lex.position(tokens[-1][-1])[0] == 5
+    assert lex.newlines is not None
@@ -0,0 +1,103 @@
+import io
+
+import lsp_server
+
+GOOD = "PROCEDURE P;\nBEGIN\nRETURN;\nEND;\n"
+
+
+def run(messages, delay=0):
+    data = io.BytesIO()
+    for message in messages:
+        lsp_server.write_message(data, message)
+    output = io.BytesIO()
+    server = lsp_server.DiagnosticsServer(io.BytesIO(data.getvalue()),
+                                          output, delay)
+    code = server.serve()
+    output.seek(0)
+    res = []
+    while True:
+        message = lsp_server.read_message(output)
+        if message is None:
+            return code, res, server
+        res.append(message)
+
+
+def notification(method, params):
+    return {"jsonrpc": "2.0", "method": method, "params": params}
+
+
+def published(responses):
+    return [x["params"] for x in responses
+            if x.get("method") == "textDocument/publishDiagnostics"]
+
+
+def test_diagnostics_are_published():
+    code, responses, server = run([
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}},
+        notification("textDocument/didOpen", {"textDocument": {
+            "uri": "untitled:a", "text": GOOD.replace("BEGIN", "")}}),
+        {"jsonrpc": "2.0", "id": 2, "method": "shutdown"},
+        {"jsonrpc": "2.0", "method": "exit"}])
+    assert code == 0
+    diagnostics = published(responses)[0]["diagnostics"]
+    assert diagnostics[0]["code"] == 4
+
+
+def test_malformed_messages_do_not_stop_the_server():
+    code, responses, server = run([
+        notification("textDocument/didOpen", {}),
+        notification("textDocument/didOpen", {"textDocument": "x"}),
+        notification("textDocument/didOpen",
+                     {"textDocument": {"uri": "untitled:a", "text": 5}}),
+        notification("textDocument/didChange",
+                     {"textDocument": {"uri": "untitled:a"},
+                      "contentChanges": [{}]}),
+        notification("textDocument/didClose", []),
+        {"jsonrpc": "2.0", "id": 1, "method": "textDocument/didSave",
+         "params": {"textDocument": {}}},
+        {"jsonrpc": "2.0", "id": 2, "method": "unknown"},
+        notification("textDocument/didOpen", {"textDocument": {
+            "uri": "untitled:b", "text": GOOD}})])
+    errors = dict((x["id"], x["error"]["code"]) for x in responses
+                  if "error" in x)
+    assert errors == {1: lsp_server.INVALID_PARAMS,
+                      2: lsp_server.METHOD_NOT_FOUND}
+    assert published(responses) == [{"uri": "untitled:b",
+                                     "diagnostics": []}]
+
+
+def test_check_errors_are_published(monkeypatch):
+    def fail(self, text, insert_dir=""):
+        raise AttributeError("broken")
+
+    monkeypatch.setattr(lsp_server.DiagnosticsServer, "diagnostics", fail)
+    code, responses, server = run([
+        notification("textDocument/didOpen", {"textDocument": {
+            "uri": "untitled:a", "text": GOOD}})])
+    message = published(responses)[0]["diagnostics"][0]["message"]
+    assert "AttributeError: broken" in message
+
+
+def test_debounced_check_survives_errors(monkeypatch):
+    calls = []
+
+    def fail_once(self, text, insert_dir=""):
+        calls.append(text)
+        if len(calls) == 1:
+            raise ValueError("broken")
+        return []
+
+    monkeypatch.setattr(lsp_server.DiagnosticsServer, "diagnostics",
+                        fail_once)
+    output = io.BytesIO()
+    server = lsp_server.DiagnosticsServer(io.BytesIO(), output, 0.01)
+    server.documents["untitled:a"] = GOOD
+    for i in range(2):
+        server.schedule("untitled:a")
+        server.timers["untitled:a"].join()
+    output.seek(0)
+    messages = [lsp_server.read_message(output) for i in range(4)]
+    diagnostics = [x["diagnostics"] for x in published(messages)]
+    assert len(diagnostics) == 2
+    assert "ValueError: broken" in diagnostics[0][0]["message"]
+    assert diagnostics[1] == []
@@ -0,0 +1,107 @@
+import os
+
+import compiler
+
+PROGRAM = "PROCEDURE P;\nBEGIN\nRETURN;\n($ INS $);\nEND;\n"
+
+
+def build(*args):
+    return compiler.main(["--incremental", "-j", "1", "prog.sig"] +
+                         list(args))
+
+
+def up_to_date(capsys):
+    return "1 file(s) are up to date" in capsys.readouterr().out
+
+
+def write(path, text):
+    f = open(path, "w")
+    f.write(text)
+    f.close()
+
+
+def test_unchanged_source_is_up_to_date(workdir, capsys):
+    write("prog.sig", PROGRAM)
+    write("INS.asm", "nop")
+    assert build() == 0
+    assert not up_to_date(capsys)
+    assert build() == 0
+    assert up_to_date(capsys)
+
+
+def test_changed_source_or_insert_is_stale(workdir, capsys):
+    write("prog.sig", PROGRAM)
+    write("INS.asm", "nop")
+    build()
+    write("INS.asm", "nop\nnop")
+    build()
+    assert not up_to_date(capsys)
+    write("prog.sig", PROGRAM + "\n")
+    build()
+    assert not up_to_date(capsys)
+    os.remove("prog.lst")
+    build()
+    assert not up_to_date(capsys)
+
+
+def test_binary_option_is_compared(workdir, capsys):
+    write("prog.sig", PROGRAM.replace("($ INS $);\n", ""))
+    build()
+    capsys.readouterr()
+    build("--binary")
+    assert not up_to_date(capsys)
+    assert os.path.exists("prog.com")
+    build("--binary")
+    assert up_to_date(capsys)
+    os.remove("prog.com")
+    build("--binary")
+    assert not up_to_date(capsys)
+    assert os.path.exists("prog.com")
+
+
+def test_max_errors_and_stream_options_are_compared(workdir, capsys):
+    write("prog.sig", PROGRAM)
+    write("INS.asm", "nop")
+    build()
+    capsys.readouterr()
+    build("--max-errors", "3")
+    assert not up_to_date(capsys)
+    build("--max-errors", "3", "--stream")
+    assert not up_to_date(capsys)
+    build("--max-errors", "3", "--stream")
+    assert up_to_date(capsys)
+
+
+def test_share_inserts_option_is_compared(workdir, capsys):
+    write("prog.sig", PROGRAM)
+    write("INS.asm", "nop")
+    build()
+    capsys.readouterr()
+    build("--share-inserts", "1")
+    assert not up_to_date(capsys)
+    f = open("prog.asm")
+    assert "call @insert1" in f.read()
+    f.close()
+    build("--share-inserts", "1")
+    assert up_to_date(capsys)
+
+
+def test_compiler_hash_covers_selected_modules(monkeypatch):
+    import build_manifest
+    assert build_manifest.compiler_modules() == [
+        "lexical_analyzer", "syntax_analyzer", "code_generator", "compiler"]
+    assert "stream_compiler" in \
+        build_manifest.compiler_modules({"stream": True})
+    assert "x86_backend" in build_manifest.compiler_modules({"binary": True})
+    plain = build_manifest.compiler_hash()
+    binary = build_manifest.compiler_hash({"binary": True})
+    assert plain != binary
+    file_hash = build_manifest.file_hash
+
+    def changed(path):
+        if path.endswith("x86_backend.py"):
+            return "changed"
+        return file_hash(path)
+    monkeypatch.setattr(build_manifest, "file_hash", changed)
+    assert build_manifest.compiler_hash() == plain
+    assert build_manifest.compiler_hash({"binary": True}) != binary
@@ -0,0 +1,16 @@
+import os
+
+import memory_profile
+from conftest import procedures_source
+
+
+def test_top_allocations_are_the_compilers_own():
+    results = memory_profile.profile_source(procedures_source(20, 10),
+                                            top=20)
+    assert [x["phase"] for x in results] == memory_profile.PHASES
+    for res in results:
+        assert res["retained"] >= 0
+        for filename, lineno, size, count in res["top"]:
+            name = os.path.basename(filename)
+            assert name in ("lexical_analyzer.py", "syntax_analyzer.py",
+                            "code_generator.py"), (res["phase"], name)
@@ -0,0 +1,17 @@
+import differential
+from conftest import ROOT
+
+
+def test_offsets_engine_agrees_on_samples():
+    harness = differential.Harness(["reference", "offsets"], shrink_tests=0)
+    for name, source, insert_dir in differential.corpus_programs([ROOT]):
+        harness.run(name, source, insert_dir)
+    assert harness.programs >= 3
+    assert harness.mismatches == []
+
+
+def test_offsets_engine_agrees_on_random_programs(tmp_path):
+    harness = differential.Harness(["reference", "offsets"], shrink_tests=0)
+    for name, source in differential.random_programs(60, str(tmp_path)):
+        harness.run(name, source, str(tmp_path))
+    assert harness.mismatches == []
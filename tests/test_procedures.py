@@ -0,0 +1,34 @@
+import compiler
+import code_generator
+from conftest import procedures_source
+
+
+def test_flatten_round_trip():
+    tree = ["<A>", [1, ["<B>", [2, 3]], "<C>", []]]
+    flat = code_generator.flatten_tree(tree)
+    assert all(type(x) != list for x in flat)
+    assert code_generator.unflatten_tree(flat) == tree
+
+
+def test_parallel_procedures_match_serial():
+    source = procedures_source(3, 20, "1: RETURN;") \
+        .replace("BEGIN", "LABEL 1;\nBEGIN")
+    serial = compiler.compile_string(source)
+    assert serial["asm"] is not None
+    assert compiler.compile_string(source, procedure_jobs=2) == serial
+
+
+def test_parallel_large_procedures():
+    # A procedure's tree nests one level per statement: it must not be
+    # pickled as it is
+    source = procedures_source(2, 1000)
+    serial = compiler.compile_string(source)
+    assert serial["asm"] is not None
+    assert compiler.compile_string(source, procedure_jobs=2) == serial
+
+
+def test_parallel_duplicate_procedure_name():
+    source = procedures_source(2, 3).replace("P1", "P0")
+    serial = compiler.compile_string(source)
+    assert serial["errors"]
+    assert compiler.compile_string(source, procedure_jobs=2) == serial
@@ -0,0 +1,78 @@
+import sys
+
+import pytest
+
+import benchmark
+import scaling_check
+import workload_generator
+
+
+def test_fit_exponent_of_power_laws():
+    for k in (1, 1.5, 2):
+        points = [[n, 3e-6 * n ** k] for n in (100, 1000, 10000)]
+        assert scaling_check.fit_exponent(points) == pytest.approx(k)
+
+
+def test_fit_exponent_needs_two_usable_points():
+    assert scaling_check.fit_exponent([[100, 0.1]]) is None
+    assert scaling_check.fit_exponent([[100, 0.1], [1000, 0]]) is None
+    assert scaling_check.fit_exponent([[100, 0.1], [100, 0.2]]) is None
+
+
+def test_scale_for_reaches_requested_size(tmp_path):
+    insert_dir = str(tmp_path)
+    small = scaling_check.scale_for("statements", 1000, insert_dir)
+    large = scaling_check.scale_for("statements", 10000, insert_dir)
+    assert 8 * small <= large <= 12 * small
+
+
+def count_calls(source, insert_dir, codegen):
+    """
+    Returns number of function calls made by the phases of compilation of
+    'source' (see benchmark.time_phases). Unlike timings, the count doesn't
+    depend on machine's load.
+    """
+    calls = [0]
+
+    def profile(frame, event, arg):
+        if event in ("call", "c_call"):
+            calls[0] += 1
+    sys.setprofile(profile)
+    try:
+        benchmark.time_phases(source, insert_dir, codegen)
+    finally:
+        sys.setprofile(None)
+    return calls[0]
+
+
+def test_compilation_is_linear(tmp_path):
+    # Wall-clock growth is checked by scaling_check itself; here the number
+    # of calls is fitted, so that the test isn't flaky.
+    insert_dir = str(tmp_path)
+    for scenario in ("statements", "procedures"):
+        codegen = workload_generator.SCENARIOS[scenario][2]
+        points = []
+        for size in (2000, 8000, 32000):
+            source = workload_generator.generate(
+                scenario, scaling_check.scale_for(scenario, size, insert_dir),
+                insert_dir)
+            points.append([scaling_check.program_size(source),
+                           count_calls(source, insert_dir, codegen)])
+        assert scaling_check.fit_exponent(points) < \
+            scaling_check.DEFAULT_LIMIT
+
+
+def test_check_prints_every_scenario(capsys):
+    # The limit is unreachable: only the report is checked, not timings.
+    failed = scaling_check.check(["statements", "procedures"], [500, 2000],
+                                 limit=100, repeat=1)
+    assert failed == []
+    out = capsys.readouterr()[0]
+    assert "statements" in out and "procedures" in out
+
+
+def test_recursion_limit_is_restored():
+    limit = sys.getrecursionlimit()
+    assert benchmark.with_recursion_limit(sys.getrecursionlimit) == \
+        benchmark.RECURSION_LIMIT
+    assert sys.getrecursionlimit() == limit
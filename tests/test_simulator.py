@@ -0,0 +1,72 @@
+import pytest
+
+import compiler
+import simulator
+import x86_backend
+
+
+def test_generated_program_exits_with_final_registers():
+    source = "PROCEDURE P;\nBEGIN\nRETURN;\nEND;\n"
+    asm = compiler.compile_string(source)["asm"]
+    res = simulator.run(asm)
+    assert res["status"] == "exit"
+    assert res["exit_code"] == 0
+    assert res["registers"] == {"ax": 0x4c00, "cx": 0, "dx": 0, "bx": 0,
+                                "bp": 0, "si": 0, "di": 0}
+    res = simulator.run(asm, "@1001")
+    assert res["status"] == "return"
+    # Return address (2 bytes) and ebp (4 bytes)
+    assert res["max_stack"] == 6
+    assert res["registers"]["ax"] == 0
+
+
+@pytest.mark.parametrize("text, registers", [
+    ("mov ax, 0bh", {"ax": 0x0b, "bx": 0}),
+    ("mov bh, 3\nmov al, bh", {"ax": 3, "bx": 0x300}),
+    ("mov dh, 0ffh\nmov ax, 1\nadd al, dh", {"ax": 0, "dx": 0xff00}),
+    ("mov cx, 10\nmov bx, cx\nsub bx, 3", {"bx": 7, "cx": 10}),
+    ("mov ax, -1\nxor ax, 0ffh", {"ax": 0xff00}),
+])
+def test_registers_and_immediates(text, registers):
+    x86_backend.assemble(text)
+    res = simulator.run(text)
+    assert res["status"] == "end"
+    for name in registers:
+        assert res["registers"][name] == registers[name]
+
+
+@pytest.mark.parametrize("text", [
+    "mov ax, bh",
+    "add ax, dh",
+    "mov ax, ffh",
+    "mov al, 100h",
+])
+def test_rejects_what_assembler_rejects(text):
+    with pytest.raises(x86_backend.EncodingError) as assembled:
+        x86_backend.assemble(text)
+    with pytest.raises(x86_backend.EncodingError) as simulated:
+        simulator.run(text)
+    assert simulated.value.reason == assembled.value.reason
+
+
+def test_jumps_calls_and_output():
+    text = "start:\nmov cx, 3\nagain:\nmov dl, 41h\nadd dl, cl\n" \
+        "call put\ndec cx\njnz again\nmov ax, 4c07h\nint 21h\n" \
+        "put:\nmov ah, 2\nint 21h\nret\nend start"
+    res = simulator.run(text)
+    assert res["status"] == "exit"
+    assert res["exit_code"] == 7
+    assert res["output"] == "DCB"
+    assert res["calls"] == 3
+    assert res["jumps"] == 2
+    assert res["max_stack"] == 2
+
+
+def test_limit_and_errors():
+    assert simulator.run("again:\njmp again", limit=10)["status"] == "limit"
+    with pytest.raises(simulator.SimulationError):
+        simulator.run("pop ax")
+    with pytest.raises(simulator.SimulationError):
+        simulator.run("mov ah, 9\nint 21h")
+    with pytest.raises(simulator.SimulationError):
+        simulator.run("nop", "missing")
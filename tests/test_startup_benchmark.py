@@ -0,0 +1,15 @@
+import startup_benchmark
+
+
+def test_budgets_are_options(capsys):
+    assert startup_benchmark.main(["-r", "1", "--import-budget", "100000",
+                                   "--first-token-budget", "100000"]) == 0
+    assert startup_benchmark.main(["-r", "1", "--import-budget", "0"]) == 1
+    out = capsys.readouterr()[0]
+    assert "OVER BUDGET (0.00 ms)" in out
+
+
+def test_probe_imports_nothing_before_the_timer():
+    # Modules imported by the probe itself would be cached for the compiler
+    assert startup_benchmark.PROBE.split("start = ")[0].split() == \
+        ["import", "time"]
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+import code_generator
+import syntax_analyzer
+import tree_export
+from conftest import procedures_source
+
+SOURCE = "PROCEDURE LONGNAME (A, B);\nLABEL 1, 200000;\nBEGIN\n" \
+    "1: 200000: GOTO 1;\n($ INSERT $)\nEND;\n" + procedures_source(3, 300)
+
+
+def parse(source):
+    parser = syntax_analyzer.Parser()
+    parser.parser(io.StringIO(source))
+    return parser.syntax_tree, tree_export.lexer_names(parser.lex)
+
+
+@pytest.mark.parametrize("file_format", ["jsonl", "binary"])
+def test_round_trip(file_format):
+    tree, names = parse(SOURCE)
+    exporter, mode = tree_export.EXPORTERS[file_format]
+    output = io.StringIO() if mode == "w" else io.BytesIO()
+    exporter(tree, output, names)
+    output.seek(0)
+    loaded, loaded_names = tree_export.LOADERS[file_format][0](output)
+    # Trees are deep: they are compared flattened
+    assert code_generator.flatten_tree(loaded) == \
+        code_generator.flatten_tree(tree)
+    assert loaded_names == names
+
+
+def test_truncated_binary_is_rejected():
+    tree, names = parse(SOURCE)
+    output = io.BytesIO()
+    tree_export.export_binary(tree, output, names)
+    data = output.getvalue()
+    for size in (len(data) - 1, len(data) // 2, 6):
+        with pytest.raises(ValueError):
+            tree_export.load_binary(io.BytesIO(data[:size]))
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    '{"format": "other"}\n',
+    '{"format": "signal-syntax-tree", "version": 1}\n',
+    '{"format": "signal-syntax-tree", "version": 1}\n[0]\n[2,1]\n',
+    '{"format": "signal-syntax-tree", "version": 1}\n[0]\n[1,\n',
+])
+def test_malformed_jsonl_is_rejected(text):
+    with pytest.raises(ValueError):
+        tree_export.load_jsonl(io.StringIO(text))
+
+
+def test_print_tree_matches_pretty_print():
+    tree = parse(procedures_source(2, 3))[0]
+    expected = io.StringIO()
+    syntax_analyzer.Parser().pretty_print(tree, output=expected)
+    output = io.StringIO()
+    tree_export.print_tree(tree, output)
+    assert output.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize("file_format", ["jsonl", "binary"])
+def test_deep_tree_round_trip_through_main(file_format, workdir):
+    f = open("deep.sig", "w")
+    f.write(procedures_source(1, 3000))
+    f.close()
+    assert tree_export.main(["deep.sig", "deep.tree", "-f",
+                             file_format]) == 0
+    assert tree_export.main(["--load", "deep.tree", "deep.txt", "-f",
+                             file_format]) == 0
+    f = open("deep.txt")
+    lines = f.read().split("\n")
+    f.close()
+    assert lines[:3] == [" <SIGNAL-PROGRAM>", "| <PROGRAM>", "|| 401"]
+    # RETURN of every statement, nested one list deeper than the previous
+    assert len([x for x in lines if x.endswith("| 406")]) == 3000
+    assert max(len(x) - len(x.lstrip("|")) for x in lines) > 3000
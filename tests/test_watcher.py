@@ -0,0 +1,103 @@
+import io
+import os
+
+import watcher
+
+PROGRAM = "PROCEDURE P;\nBEGIN\nRETURN;\n($ INS $);\nEND;\n"
+
+
+class FakeMonitor:
+    """
+    Event source for Watcher: instead of waiting for real changes, every
+    blocking wait() makes the next change (a function, that returns
+    changed paths) and reports it; waits with a timeout report nothing, so
+    that debouncing ends at once.
+    """
+
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.directories = set()
+
+    def add_directory(self, path):
+        self.directories.add(os.path.abspath(path))
+
+    def wait(self, timeout=None):
+        if timeout is not None:
+            return set()
+        return self.changes.pop(0)()
+
+    def close(self):
+        pass
+
+
+def write(path, text):
+    f = open(path, "w")
+    f.write(text)
+    f.close()
+
+
+def read(path):
+    f = open(path)
+    text = f.read()
+    f.close()
+    return text
+
+
+def rebuilt(output):
+    """
+    Returns lines of the rebuild, that follows the initial build.
+    """
+    text = output.getvalue()
+    return text[text.index("Watching for changes"):].split("\n")
+
+
+def test_changed_insert_rebuilds_dependent_source(workdir):
+    write("a.sig", PROGRAM)
+    write("b.sig", PROGRAM.replace("($ INS $);\n", ""))
+    write("INS.asm", "nop")
+
+    def change():
+        write("INS.asm", "cli")
+        return {os.path.abspath("INS.asm")}
+    monitor = FakeMonitor([change])
+    output = io.StringIO()
+    watcher.Watcher(["."], monitor, output=output).run(builds=1)
+    assert str(workdir) in monitor.directories
+    lines = rebuilt(output)
+    assert any(x.endswith("a.asm file has been generated successfully")
+               for x in lines)
+    assert not any("b.asm" in x for x in lines)
+    assert "cli" in read("a.asm")
+
+
+def test_new_source_and_lost_events(workdir):
+    write("a.sig", PROGRAM)
+    write("INS.asm", "nop")
+
+    def create():
+        write("b.sig", PROGRAM)
+        return {os.path.abspath("b.sig")}
+
+    def overflow():
+        return None
+    output = io.StringIO()
+    w = watcher.Watcher(["."], FakeMonitor([create, overflow]),
+                        output=output)
+    w.run(builds=2)
+    assert os.path.exists("b.asm")
+    assert sorted(os.path.basename(x) for x in w.sources) == ["a", "b"]
+    # Lost events rebuild every source
+    assert output.getvalue().split("\n")[-3].startswith(
+        "2 file(s) compiled, 0 failed")
+
+
+def test_polling_monitor_reports_changed_files(tmp_path):
+    path = str(tmp_path / "a.sig")
+    write(path, PROGRAM)
+    monitor = watcher.PollingMonitor()
+    monitor.add_directory(str(tmp_path))
+    assert monitor.wait(0) == set()
+    write(path, PROGRAM + "\n")
+    assert monitor.wait(0) == {path}
+    os.remove(path)
+    assert monitor.wait(0) == {path}
@@ -0,0 +1,101 @@
+import pytest
+
+import compiler
+import simulator
+import x86_backend
+from conftest import procedures_source
+
+
+@pytest.mark.parametrize("line, code", [
+    ("nop", "90"),
+    ("ret", "c3"),
+    ("push bp", "55"),
+    ("pop bp", "5d"),
+    ("push ebp", "6655"),
+    ("pop eax", "6658"),
+    ("inc cx", "41"),
+    ("dec di", "4f"),
+    ("int 21h", "cd21"),
+    ("mov ax, 4c00h", "b8004c"),
+    ("mov al, 255", "b0ff"),
+    ("mov ax, -1", "b8ffff"),
+    ("mov bx, cx", "89cb"),
+    ("mov al, bl", "88d8"),
+    ("xor ax, ax", "31c0"),
+    ("cmp cx, dx", "39d1"),
+    ("add ax, 1", "81c00100"),
+    ("sub dl, 101b", "80ea05"),
+])
+def test_instruction_encodings(line, code):
+    assert x86_backend.assemble(line).hex() == code
+
+
+def test_jumps_use_16_bit_displacements():
+    image = x86_backend.assemble("back: nop\njmp back\nje next\n"
+                                 "call back\nnext:")
+    assert image.hex() == "90" "e9fcff" "0f840300" "e8f5ff"
+
+
+def test_entry_point_jump():
+    image = x86_backend.assemble("@p proc\nret\n@p endp\nstart:\n"
+                                 "int 20h\nend start")
+    assert image.hex() == "e90100" "c3" "cd20"
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("mov [bx], ax", "unsupported instruction"),
+    ("jmp nowhere", "undefined label"),
+    ("a: nop\na: nop", "label is defined twice"),
+    ("mov al, 256", "number doesn't fit in 8 bits"),
+    ("int x", "number expected"),
+])
+def test_encoding_errors(text, reason):
+    with pytest.raises(x86_backend.EncodingError) as e:
+        x86_backend.assemble(text)
+    assert e.value.reason == reason
+
+
+def test_generated_code_is_assembled_and_runs():
+    source = "PROCEDURE P;\nLABEL 1, 2;\nBEGIN\n1: GOTO 2;\n2: RETURN;\n" \
+        "END;\n" + procedures_source(3, 5)
+    asm = compiler.compile_string(source)["asm"]
+    image = x86_backend.assemble(asm)
+    assert image[:1] == b"\xe9"
+    res = simulator.run(asm)
+    assert res["status"] == "exit"
+    assert res["exit_code"] == 0
+    assert simulator.run(asm, "@1001")["status"] == "return"
+
+
+def test_labels_are_addresses_from_origin():
+    text = "@p proc\nnop\nback: ret\n@p endp\nstart:\ncall back\nend start"
+    image = x86_backend.assemble(text)
+    for origin in (0, 0x100, 0x7c00):
+        assembler = x86_backend.Assembler(origin)
+        # Jumps and calls are relative: the code doesn't depend on origin
+        assert assembler.assemble(text) == image
+        assert assembler.labels == {"@p": origin + 3, "back": origin + 4,
+                                    "start": origin + 5}
+
+
+def test_image_must_fit_in_the_segment():
+    text = "nop\n" * (0x10000 - 0x100)
+    assert len(x86_backend.assemble(text)) == 0x10000 - 0x100
+    with pytest.raises(x86_backend.EncodingError) as e:
+        x86_backend.assemble(text + "nop")
+    assert e.value.reason == "image is larger than 65280 bytes"
+    with pytest.raises(x86_backend.EncodingError):
+        x86_backend.assemble(text, 0x200)
+
+
+@pytest.mark.parametrize("line", ["mov ax, bh", "add ax, dh", "mov al, cx",
+                                  "cmp ax, eax", "int ah", "mov ax, ffh",
+                                  "mov ax, 1_0", "mov ax, x1"])
+def test_registers_and_names_are_not_numbers(line):
+    with pytest.raises(x86_backend.EncodingError):
+        x86_backend.assemble(line)
+
+
+def test_hexadecimal_numbers_start_with_a_digit():
+    assert x86_backend.assemble("mov ax, 0ffh").hex() == "b8ff00"
+    assert x86_backend.assemble("mov ax, 0bh").hex() == "b80b00"
@@ -0,0 +1,375 @@
+import argparse
+import io
+import json
+import sys
+
+import code_generator
+import compiler
+import syntax_analyzer
+
+# Syntax tree (see Parser.syntax_tree description) is a list, which elements
+# are tokens' codes (integers), non-terminal symbols' names (strings) and
+# lists. Both formats are preorder walks of it, written and read iteratively,
+# so the depth of the tree is not limited by the recursion limit, and time
+# and size are linear.
+#
+# JSON Lines format: the first line is a header object:
+#     {"format": "signal-syntax-tree", "version": 1, "names": {CODE: NAME}}
+# ('names' are identifiers and constants of the program), then one line for
+# every node: [DEPTH, CODE] for a token, [DEPTH, "NAME"] for a non-terminal
+# symbol, [DEPTH] for a list, which elements follow with depth DEPTH + 1. The
+# tree itself is the list of depth 0.
+#
+# Binary format: BINARY_MAGIC, the number of names, [code, length, UTF-8
+# bytes] for every name, then nodes; all of the numbers are unsigned LEB128
+# varints. A node is a tag: (value << 2) | kind, where value is token's code
+# (KIND_TOKEN), the number of elements (KIND_LIST, the elements follow) or
+# an index in the table of symbols' names (KIND_SYMBOL): a name is written
+# once, as [length, UTF-8 bytes] after the tag, when its index is the size of
+# the table.
+
+FORMAT_NAME = "signal-syntax-tree"
+VERSION = 1
+BINARY_MAGIC = b"SIGT\x01"
+# Kinds of nodes of binary encoding (two low bits of a node's tag)
+KIND_TOKEN = 0
+KIND_SYMBOL = 1
+KIND_LIST = 2
+# Binary output is written in chunks of this size (bytes); JSON Lines input
+# is decoded in chunks of about this size (characters)
+CHUNK_SIZE = 65536
+
+
+def lexer_names(lex):
+    """
+    Returns dictionary: codes -> names of identifiers and constants of
+    'lex' (lexical_analyzer.Lexer).
+    """
+    res = dict(lex.identifier_names)
+    res.update(lex.constant_names)
+    return res
+
+
+def walk(tree):
+    """
+    Generator of the preorder walk of 'tree' without recursion.
+    :returns pairs [depth, node], where node is an element of the tree (a
+    list is yielded before its elements).
+    """
+    yield [0, tree]
+    stack = [iter(tree)]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            continue
+        yield [len(stack), node]
+        if type(node) == list:
+            stack.append(iter(node))
+
+
+def export_jsonl(tree, output, names=None):
+    """
+    Writes 'tree' into text file 'output' in JSON Lines format.
+    :param names: dictionary: codes -> names of identifiers and constants
+    (see lexer_names()).
+    :returns the number of nodes written.
+    """
+    output.write(json.dumps({"format": FORMAT_NAME, "version": VERSION,
+                             "names": names or {}}) + "\n")
+    symbols = {}
+    count = 0
+    lines = []
+    for depth, node in walk(tree):
+        if type(node) == int:
+            lines.append("[%i,%i]\n" % (depth, node))
+        elif type(node) == str:
+            if node not in symbols:
+                symbols[node] = json.dumps(node)
+            lines.append("[%i,%s]\n" % (depth, symbols[node]))
+        else:
+            lines.append("[%i]\n" % depth)
+        count += 1
+        if len(lines) >= 4096:
+            output.write("".join(lines))
+            lines = []
+    output.write("".join(lines))
+    return count
+
+
+def load_jsonl(input):
+    """
+    Reads a tree written by export_jsonl() from text file 'input'.
+    :returns [tree, names].
+    :raises ValueError if the file is not a tree export.
+    """
+    header = json.loads(input.readline() or "null")
+    if type(header) != dict or header.get("format") != FORMAT_NAME:
+        raise ValueError("not a %s file" % FORMAT_NAME)
+    if header.get("version") != VERSION:
+        raise ValueError("unsupported version: %s" % header.get("version"))
+    names = dict((int(x), y) for x, y in header.get("names", {}).items())
+    tree = None
+    stack = []
+    current = None
+    while True:
+        # Records hold no raw newlines (see export_jsonl()): a chunk of
+        # lines is decoded by one call as a JSON array
+        lines = input.readlines(CHUNK_SIZE)
+        if not lines:
+            break
+        for record in json.loads("[%s]" % ",".join(lines)):
+            depth = record[0]
+            # Usually a node is the next element of the current list
+            if depth != len(stack) or depth == 0:
+                if depth > len(stack):
+                    raise ValueError("node of depth %i outside of a list"
+                                     % depth)
+                if depth == 0:
+                    tree = []
+                    stack = [tree]
+                    current = tree
+                    continue
+                del stack[depth:]
+                current = stack[-1]
+            if len(record) == 1:
+                node = []
+                current.append(node)
+                stack.append(node)
+                current = node
+            else:
+                current.append(record[1])
+    if tree is None:
+        raise ValueError("no tree found")
+    return [tree, names]
+
+
+def varint(n):
+    """
+    Returns unsigned LEB128 encoding of integer 'n'.
+    """
+    res = bytearray()
+    while n >= 0x80:
+        res.append(n & 0x7f | 0x80)
+        n >>= 7
+    res.append(n)
+    return bytes(res)
+
+
+def export_binary(tree, output, names=None):
+    """
+    Writes 'tree' into binary file 'output' in binary format.
+    :param names: see export_jsonl() description.
+    :returns the number of nodes written.
+    """
+    names = names or {}
+    buf = bytearray(BINARY_MAGIC)
+    buf += varint(len(names))
+    for code in names:
+        text = names[code].encode("utf-8")
+        buf += varint(code) + varint(len(text)) + text
+    symbols = {}
+    # Encodings of tags: there are few different ones
+    tags = {}
+    count = 0
+    for depth, node in walk(tree):
+        if type(node) == int:
+            tag = node << 2 | KIND_TOKEN
+        elif type(node) == str:
+            if node not in symbols:
+                symbols[node] = len(symbols)
+                text = node.encode("utf-8")
+                buf += varint(symbols[node] << 2 | KIND_SYMBOL) + \
+                    varint(len(text)) + text
+                count += 1
+                continue
+            tag = symbols[node] << 2 | KIND_SYMBOL
+        else:
+            tag = len(node) << 2 | KIND_LIST
+        if tag not in tags:
+            tags[tag] = varint(tag)
+        buf += tags[tag]
+        count += 1
+        if len(buf) >= CHUNK_SIZE:
+            output.write(bytes(buf))
+            buf.clear()
+    output.write(bytes(buf))
+    return count
+
+
+def load_binary(input):
+    """
+    Reads a tree written by export_binary() from binary file 'input'.
+    :returns [tree, names].
+    :raises ValueError if the file is not a tree export or is truncated.
+    """
+    data = input.read()
+    if not data.startswith(BINARY_MAGIC):
+        raise ValueError("not a %s file" % FORMAT_NAME)
+    pos = len(BINARY_MAGIC)
+
+    def read_varint():
+        nonlocal pos
+        res = shift = 0
+        while True:
+            if pos >= len(data):
+                raise ValueError("unexpected end of data")
+            byte = data[pos]
+            pos += 1
+            res |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return res
+            shift += 7
+
+    def read_text():
+        nonlocal pos
+        length = read_varint()
+        if pos + length > len(data):
+            raise ValueError("unexpected end of data")
+        pos += length
+        return data[pos - length:pos].decode("utf-8")
+
+    names = {}
+    for i in range(read_varint()):
+        code = read_varint()
+        names[code] = read_text()
+    tag = read_varint()
+    if tag & 3 != KIND_LIST:
+        raise ValueError("the tree is not a list")
+    tree = []
+    # The list being filled and the number of its missing elements; the
+    # lists above it are kept in the stack
+    current, missing = tree, tag >> 2
+    stack = []
+    symbols = []
+    try:
+        while True:
+            if missing == 0:
+                if not stack:
+                    break
+                current, missing = stack.pop()
+                continue
+            missing -= 1
+            # Tags of one or two bytes (all but huge codes) are decoded
+            # inline
+            tag = data[pos]
+            pos += 1
+            if tag >= 0x80:
+                byte = data[pos]
+                pos += 1
+                tag = tag & 0x7f | (byte & 0x7f) << 7
+                if byte >= 0x80:
+                    tag |= read_varint() << 14
+            kind = tag & 3
+            if kind == KIND_TOKEN:
+                current.append(tag >> 2)
+            elif kind == KIND_LIST:
+                node = []
+                current.append(node)
+                stack.append([current, missing])
+                current, missing = node, tag >> 2
+            elif kind == KIND_SYMBOL:
+                value = tag >> 2
+                if value == len(symbols):
+                    symbols.append(read_text())
+                elif value > len(symbols):
+                    raise ValueError("unknown symbol #%i" % value)
+                current.append(symbols[value])
+            else:
+                raise ValueError("unknown node kind: %i" % kind)
+    except IndexError:
+        raise ValueError("unexpected end of data")
+    return [tree, names]
+
+
+def print_tree(tree, output=None):
+    """
+    Prints 'tree' as Parser.pretty_print() does, but iteratively (see
+    walk()), so the depth of the tree is not limited.
+    :param output: file, the tree is printed into; if None, prints on the
+    screen.
+    """
+    for depth, node in walk(tree):
+        if type(node) != list:
+            print("%s" % "|" * (depth - 1) + " " + str(node), file=output)
+
+
+EXPORTERS = {"jsonl": [export_jsonl, "w"], "binary": [export_binary, "wb"]}
+LOADERS = {"jsonl": [load_jsonl, "r"], "binary": [load_binary, "rb"]}
+
+
+def export_source(source, output, file_format="jsonl"):
+    """
+    Parses SIGNAL program 'source' (a string) and exports its tree.
+    :param output: file object, text one for "jsonl" format, binary one for
+    "binary" format.
+    :returns None on success, or parser's first error (see
+    Parser.error_list) if the program can't be parsed.
+    """
+    parser = syntax_analyzer.Parser()
+    parser.parser(io.StringIO(source, newline=None))
+    if parser.error_list:
+        return parser.error_list[0]
+    EXPORTERS[file_format][0](parser.syntax_tree, output,
+                              lexer_names(parser.lex))
+    return None
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Exports syntax tree of a SIGNAL program as JSON Lines "
+                    "or compact binary preorder encoding, or loads an "
+                    "export back (--load) and prints the tree.")
+    arg_parser.add_argument("source",
+                            help=".sig file, or an export with --load")
+    arg_parser.add_argument("output", nargs="?",
+                            help="output file (default: standard output)")
+    arg_parser.add_argument("-f", "--format", choices=sorted(EXPORTERS),
+                            default="jsonl",
+                            help="format (default: %(default)s)")
+    arg_parser.add_argument("--load", action="store_true",
+                            help="load an export and pretty print the tree")
+    args = arg_parser.parse_args(argv)
+    if args.load:
+        loader, mode = LOADERS[args.format]
+        f = open(args.source, mode)
+        try:
+            tree = loader(f)[0]
+        except ValueError as e:
+            print("%s: %s" % (args.source, e), file=sys.stderr)
+            return 1
+        finally:
+            f.close()
+        if args.output is None:
+            print_tree(tree)
+        else:
+            f = open(args.output, "w")
+            print_tree(tree, f)
+            f.close()
+        return 0
+    filename = args.source[:-4] if args.source[-4:] == ".sig" \
+        else args.source
+    source = compiler.read_source(filename)
+    if source is None:
+        print("No such file found: %s.sig" % filename, file=sys.stderr)
+        return 1
+    exporter, mode = EXPORTERS[args.format]
+    if args.output is None:
+        output = sys.stdout if mode == "w" else sys.stdout.buffer
+    else:
+        output = open(args.output, mode)
+    try:
+        error = export_source(source, output, args.format)
+    finally:
+        if args.output is not None:
+            output.close()
+    if error is not None:
+        code_gen = code_generator.CodeGenerator()
+        print("%s.sig: %s" % (filename, code_gen.error_message(error)),
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
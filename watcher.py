@@ -0,0 +1,390 @@
+import os
+import select
+import struct
+import sys
+import time
+
+import code_generator
+import compiler
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+    IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyMonitor:
+    """
+    Reports changes of files in watched directories through Linux inotify
+    (called through ctypes, so no extra packages are needed). Directories
+    are watched instead of files, as editors often save a file by writing
+    a new one and renaming it.
+
+    Class contents dictionaries:
+    1. directories - keys are watch descriptors, values are watched
+    directories.
+
+    Class contents methods:
+    1. __init__(self)
+    2. add_directory(self, path)
+    3. wait(self, timeout=None)
+    4. close(self)
+    """
+
+    def __init__(self):
+        """
+        :raises OSError if inotify is not available.
+        """
+        import ctypes
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        try:
+            init = self.libc.inotify_init1
+            self.add_watch = self.libc.inotify_add_watch
+        except AttributeError:
+            raise OSError("inotify is not available")
+        self.add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                   ctypes.c_uint32]
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.directories = {}
+
+    def add_directory(self, path):
+        """
+        Starts watching directory 'path' (nothing happens if it is already
+        watched or doesn't exist).
+        """
+        path = os.path.abspath(path)
+        if path in self.directories.values() or not os.path.isdir(path):
+            return
+        wd = self.add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self.directories[wd] = path
+
+    def wait(self, timeout=None):
+        """
+        Waits for changes.
+        :param timeout: seconds; None means waiting forever.
+        :returns set of absolute paths of changed (written, created, removed
+        or renamed) files, empty if nothing has changed before the timeout,
+        or None if events have been lost (every file is to be treated as
+        changed then).
+        """
+        ready = select.select([self.fd], [], [], timeout)[0]
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data,
+                                                                    offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if wd in self.directories and name:
+                    changed.add(os.path.join(self.directories[wd],
+                                             os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingMonitor:
+    """
+    Reports changes of files in watched directories by comparing their
+    modification times and sizes every 'interval' seconds. It is used where
+    inotify is not available.
+
+    Class contents dictionaries:
+    1. snapshots - keys are watched directories, values are dictionaries:
+    file's path -> [modification time (ns), size].
+
+    Class contents methods:
+    1. __init__(self, interval=0.25)
+    2. add_directory(self, path)
+    3. snapshot(self, directory)
+    4. wait(self, timeout=None)
+    5. close(self)
+    """
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.snapshots = {}
+
+    def add_directory(self, path):
+        path = os.path.abspath(path)
+        if path not in self.snapshots and os.path.isdir(path):
+            self.snapshots[path] = self.snapshot(path)
+
+    @staticmethod
+    def snapshot(directory):
+        """
+        Returns dictionary: path -> [modification time, size] of every file
+        in 'directory'.
+        """
+        res = {}
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return res
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    info = entry.stat()
+                    res[entry.path] = [info.st_mtime_ns, info.st_size]
+            except OSError:
+                pass
+        return res
+
+    def wait(self, timeout=None):
+        """
+        See InotifyMonitor.wait description.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for directory in self.snapshots:
+                old = self.snapshots[directory]
+                new = self.snapshot(directory)
+                for path in set(old) | set(new):
+                    if old.get(path) != new.get(path):
+                        changed.add(path)
+                self.snapshots[directory] = new
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            delay = self.interval
+            if deadline is not None:
+                delay = max(0, min(delay, deadline - time.monotonic()))
+            time.sleep(delay)
+
+    def close(self):
+        pass
+
+
+def make_monitor(poll=False):
+    """
+    Returns InotifyMonitor, or PollingMonitor if 'poll' is True or inotify
+    is not available.
+    """
+    if not poll:
+        try:
+            return InotifyMonitor()
+        except OSError:
+            pass
+    return PollingMonitor()
+
+
+class Watcher:
+    """
+    Watch mode: compiles the sources once, then recompiles them whenever
+    they or assembly insertion files they refer to change.
+
+    Only affected sources are recompiled: a changed .sig file, and sources,
+    which insertion files (including not found ones, so that creating a
+    missing file triggers recompilation) have changed. New .sig files in
+    watched directories are added, removed ones are dropped. Bursts of
+    changes (e.g. saving several files) are debounced: rebuilding starts
+    'delay' seconds after the last change. Sources are compiled by one warm
+    CodeGenerator, that is reused between rebuilds.
+
+    Class contents dictionaries:
+    1. dependencies - keys are sources (file names without '.sig'
+    extension), values are sets of absolute paths of their assembly
+    insertion files.
+
+    Class contents lists:
+    1. paths - files and directories given on the command line.
+    2. sources - sources being watched.
+
+    Class contents methods:
+    1. __init__(self, paths, monitor=None, delay=0.1, binary=False,
+    share_inserts=None, procedure_jobs=1, output=None, max_errors=None)
+    2. scan(self)
+    3. compile(self, filename)
+    4. build(self, filenames)
+    5. affected(self, changed)
+    6. run(self, builds=None)
+    """
+
+    def __init__(self, paths, monitor=None, delay=0.1, binary=False,
+                 share_inserts=None, procedure_jobs=1, output=None,
+                 max_errors=None):
+        """
+        :param paths: list of .sig files and directories (see
+        compiler.collect_sources).
+        :param monitor: InotifyMonitor or PollingMonitor; if None, it is
+        chosen by make_monitor().
+        :param delay: debounce delay (seconds).
+        :param binary, share_inserts, procedure_jobs, max_errors: see
+        compiler.compile_file() description.
+        :param output: file object, where results are reported.
+        """
+        self.paths = list(paths)
+        self.monitor = monitor if monitor is not None else make_monitor()
+        self.delay = delay
+        self.binary = binary
+        self.share_inserts = share_inserts
+        self.procedure_jobs = procedure_jobs
+        self.max_errors = max_errors
+        self.output = output
+        self.code_gen = code_generator.CodeGenerator()
+        self.sources = []
+        self.dependencies = {}
+
+    def scan(self):
+        """
+        Finds the sources (see compiler.collect_sources) and starts watching
+        their directories and the given ones.
+        :returns list of sources, that have not been watched before.
+        """
+        sources = compiler.collect_sources(self.paths)
+        for path in self.paths:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    self.monitor.add_directory(root)
+        known = set(self.sources)
+        new = []
+        for filename in sources:
+            self.monitor.add_directory(os.path.dirname(filename) or ".")
+            if filename not in known:
+                new.append(filename)
+        self.sources = sources
+        return new
+
+    def compile(self, filename):
+        """
+        Compiles 'filename' with the warm CodeGenerator, writes output files
+        and remembers its dependencies.
+        :returns compiler.compile_file() result.
+        """
+        source = compiler.read_source(filename)
+        if source is None:
+            self.dependencies.pop(filename, None)
+            return compiler.file_result(filename)
+        compiled = compiler.compile_string(
+            source, os.path.dirname(filename), self.code_gen,
+            share_inserts=self.share_inserts,
+            procedure_jobs=self.procedure_jobs, max_errors=self.max_errors)
+        res = compiler.file_result(filename, compiled,
+                                   compiler.write_outputs(filename, compiled))
+        if self.binary:
+            res["binary_error"] = compiler.write_binary(filename,
+                                                        compiled["asm"])
+            res["binary"] = compiled["asm"] is not None and \
+                res["binary_error"] is None
+        # The source's own output is never its dependency: otherwise a
+        # program, that inserts its own .asm file, would be rebuilt forever
+        own = os.path.abspath(filename + ".asm")
+        inserts = set(os.path.abspath(x) for x in compiled["inserts"])
+        inserts.discard(own)
+        self.dependencies[filename] = inserts
+        for path in inserts:
+            self.monitor.add_directory(os.path.dirname(path))
+        return res
+
+    def build(self, filenames):
+        """
+        Compiles 'filenames' and reports the results and the time taken.
+        """
+        start = time.perf_counter()
+        failed = 0
+        for filename in filenames:
+            res = self.compile(filename)
+            if not res["found"] or res["errors"]:
+                failed += 1
+            compiler.report(res, self.output)
+        print("%i file(s) compiled, %i failed in %.1f ms\n"
+              % (len(filenames), failed,
+                 (time.perf_counter() - start) * 1000), file=self.output)
+
+    def affected(self, changed):
+        """
+        Returns sources, that are to be recompiled after 'changed' files
+        (see InotifyMonitor.wait) have changed, in the order of
+        self.sources.
+        """
+        new = set(self.scan())
+        if changed is None:
+            return list(self.sources)
+        known = set(self.sources)
+        removed = [x for x in self.dependencies if x not in known]
+        for filename in removed:
+            del self.dependencies[filename]
+        res = []
+        for filename in self.sources:
+            if filename in new or \
+                    os.path.abspath(filename + ".sig") in changed or \
+                    self.dependencies.get(filename, set()) & changed:
+                res.append(filename)
+        return res
+
+    def run(self, builds=None):
+        """
+        Builds all of the sources and rebuilds affected ones on every
+        change until interrupted.
+        :param builds: if given, the number of rebuilds after which the
+        method returns (used to stop the watcher programmatically).
+        """
+        self.build(self.scan())
+        print("Watching for changes (press Ctrl+C to stop)...",
+              file=self.output)
+        count = 0
+        while builds is None or count < builds:
+            changed = self.monitor.wait()
+            # Debounce: wait until changes stop
+            while changed is not None:
+                more = self.monitor.wait(self.delay)
+                if more is None:
+                    changed = None
+                elif more:
+                    changed |= more
+                    continue
+                break
+            filenames = self.affected(changed)
+            if filenames:
+                self.build(filenames)
+                count += 1
+
+
+def watch(paths, poll=False, delay=0.1, binary=False, share_inserts=None,
+          procedure_jobs=1, max_errors=None):
+    """
+    Runs watch mode (see Watcher description) until it is interrupted.
+    :param poll: if True, polling is used instead of inotify.
+    :returns exit code.
+    """
+    watcher = Watcher(paths, make_monitor(poll), delay, binary,
+                      share_inserts, procedure_jobs, max_errors=max_errors)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.monitor.close()
+    return 0
+
+
+if __name__ == "__main__":
+    # Usage: watcher.py [--poll] FILE.sig|DIRECTORY...
+    args = sys.argv[1:]
+    use_polling = "--poll" in args
+    sys.exit(watch([x for x in args if x != "--poll"] or ["."], use_polling))
@@ -0,0 +1,181 @@
+import os
+import random
+import sys
+
+
+def params_program(n, rng, insert_dir):
+    """
+    A procedure with n parameters and empty body.
+    """
+    params = ""
+    if n:
+        params = "(%s)" % ", ".join("A%d" % i for i in range(n))
+    return "PROCEDURE PROG%s;\nBEGIN\nEND;\n" % params
+
+
+def labels_program(n, rng, insert_dir):
+    """
+    n declared labels, each of them marks an empty statement.
+    """
+    labels = ", ".join(str(i) for i in range(1, n + 1))
+    body = "".join(" %d: ;\n" % i for i in range(1, n + 1))
+    return "PROCEDURE PROG;\nLABEL %s;\nBEGIN\n%sEND;\n" % (labels, body)
+
+
+def statements_program(n, rng, insert_dir, error=None):
+    """
+    n statements of all kinds: labelled statements, GOTO, RETURN and empty
+    statements. Every fourth statement is labelled, GOTO statements refer to
+    random labels.
+    :param error: None for a valid program; "syntax" - colon after the last
+    label is missing; "semantic" - the last GOTO statement refers to an
+    undeclared label.
+    """
+    n = max(n, 4)
+    n_labels = (n + 3) // 4
+    labels = ", ".join(str(i) for i in range(1, n_labels + 1))
+    body = []
+    for i in range(n):
+        if i % 4 == 0:
+            body.append(" %d: ;" % (i // 4 + 1))
+        elif i % 4 == 1:
+            body.append(" GOTO %d;" % rng.randint(1, n_labels))
+        elif i % 4 == 2:
+            body.append(" RETURN;")
+        else:
+            body.append(" ;")
+    if error == "syntax":
+        body[(n_labels - 1) * 4] = " %d ;" % n_labels
+    elif error == "semantic":
+        body[((n - 2) // 4) * 4 + 1] = " GOTO %d;" % (n_labels + 1)
+    return "PROCEDURE PROG;\nLABEL %s;\nBEGIN\n%s\nEND;\n" \
+           % (labels, "\n".join(body))
+
+
+def chain_program(n, rng, insert_dir):
+    """
+    One statement marked with a chain of n labels: 1: 2: ... n: ;
+    """
+    labels = ", ".join(str(i) for i in range(1, n + 1))
+    chain = " ".join("%d:" % i for i in range(1, n + 1))
+    return "PROCEDURE PROG;\nLABEL %s;\nBEGIN\n %s ;\nEND;\n" \
+           % (labels, chain)
+
+
+def nested_if_program(n, rng, insert_dir):
+    """
+    IF statement nested n times. Code generator doesn't support IF statement,
+    so such programs are suitable for lexer and parser only.
+    """
+    stmt = ";"
+    for i in range(n):
+        stmt = "IF (A > B) THEN (%s) ELSE (RETURN;);" % stmt
+    return "PROCEDURE PROG(A, B);\nBEGIN\n %s\nEND;\n" % stmt
+
+
+def procedures_program(n, rng, insert_dir):
+    """
+    n procedures with a parameter, a label and a GOTO statement each.
+    """
+    procedures = []
+    for i in range(n):
+        procedures.append("PROCEDURE PROC%d(A%d);\nLABEL 1;\nBEGIN\n"
+                          " 1: GOTO 1;\nEND;\n" % (i, i))
+    return "".join(procedures)
+
+
+def comments_program(n, rng, insert_dir):
+    """
+    A short program with a comment n characters long, broken into lines.
+    """
+    words = []
+    length = 0
+    while length < n:
+        words.append("".join(rng.choice("abcdefghij *(") for i in range(7)))
+        length += 8
+    text = ""
+    for i in range(0, len(words), 9):
+        text += " ".join(words[i:i + 9]) + "\n"
+    return "PROCEDURE PROG;\n(*%s*)\nBEGIN\n RETURN;\nEND;\n" % text
+
+
+def inserts_program(n, rng, insert_dir):
+    """
+    n statements, each of them inserts its own assembly file. Insertion files
+    are written into 'insert_dir'.
+    """
+    body = []
+    for i in range(n):
+        name = "F%d" % i
+        f = open(os.path.join(insert_dir, name + ".asm"), "w")
+        f.write("xor ax, ax\nmov cx, %d\nadd ax, cx\nnop" % i)
+        f.close()
+        body.append(" ($ %s $)" % name)
+    return "PROCEDURE PROG;\nBEGIN\n%s\nEND;\n" % "\n".join(body)
+
+
+def garbage_program(n, rng, insert_dir):
+    """
+    A program of n statements (see statements_program) with n unresolved
+    characters inserted between tokens.
+    """
+    lines = statements_program(n, rng, insert_dir).split("\n")
+    for i in range(n):
+        k = rng.randrange(len(lines))
+        lines[k] += " " + rng.choice("#@!?&%\xa4\xe9")
+    return "\n".join(lines)
+
+
+def syntax_error_program(n, rng, insert_dir):
+    return statements_program(n, rng, insert_dir, "syntax")
+
+
+def semantic_error_program(n, rng, insert_dir):
+    return statements_program(n, rng, insert_dir, "semantic")
+
+
+# Scenario name -> [generator function, is program valid, is it suitable for
+# code generation].
+SCENARIOS = {
+    "params": [params_program, True, True],
+    "labels": [labels_program, True, True],
+    "statements": [statements_program, True, True],
+    "chain": [chain_program, True, True],
+    "nested_if": [nested_if_program, True, False],
+    "procedures": [procedures_program, True, True],
+    "comments": [comments_program, True, True],
+    "inserts": [inserts_program, True, True],
+    "garbage": [garbage_program, False, True],
+    "syntax_error": [syntax_error_program, False, True],
+    "semantic_error": [semantic_error_program, False, True],
+}
+
+
+def generate(scenario, n, insert_dir=".", seed=0):
+    """
+    Generates SIGNAL program.
+    :param scenario: a key of SCENARIOS dictionary.
+    :param n: scale: number of parameters, labels, statements, procedures,
+    nesting depth, comment's length etc., depending on the scenario.
+    :param insert_dir: directory, where assembly insertion files are written
+    (for "inserts" scenario).
+    :param seed: seed of random numbers generator.
+    :returns text of the program.
+    """
+    return SCENARIOS[scenario][0](n, random.Random(seed), insert_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in SCENARIOS:
+        print("Usage: workload_generator.py SCENARIO N [FILE.sig]\n"
+              "Scenarios: %s" % ", ".join(sorted(SCENARIOS)))
+        sys.exit(2)
+    out_name = sys.argv[3] if len(sys.argv) > 3 else None
+    program = generate(sys.argv[1], int(sys.argv[2]),
+                       os.path.dirname(out_name or "") or ".")
+    if out_name is None:
+        sys.stdout.write(program)
+    else:
+        out = open(out_name, "w", encoding="latin-1")
+        out.write(program)
+        out.close()
@@ -0,0 +1,322 @@
+import sys
+
+# 16-bit, 8-bit and 32-bit registers' numbers, as they are encoded in
+# instructions.
+REGISTERS_16 = {"ax": 0, "cx": 1, "dx": 2, "bx": 3,
+                "sp": 4, "bp": 5, "si": 6, "di": 7}
+REGISTERS_8 = {"al": 0, "cl": 1, "dl": 2, "bl": 3,
+               "ah": 4, "ch": 5, "dh": 6, "bh": 7}
+REGISTERS_32 = {"eax": 0, "ecx": 1, "edx": 2, "ebx": 3,
+                "esp": 4, "ebp": 5, "esi": 6, "edi": 7}
+
+# Two-operand arithmetic instructions: mnemonic -> [opcode of 'op r/m16,
+# r16' form, /digit of 'op r/m16, imm16' form (opcode 81h)].
+ARITHMETIC = {"add": [0x01, 0], "or": [0x09, 1], "adc": [0x11, 2],
+              "sbb": [0x19, 3], "and": [0x21, 4], "sub": [0x29, 5],
+              "xor": [0x31, 6], "cmp": [0x39, 7]}
+
+# Conditional jumps: mnemonic -> condition code (0Fh 80h+cc rel16 form).
+CONDITIONS = {"jo": 0, "jno": 1, "jb": 2, "jc": 2, "jnae": 2,
+              "jae": 3, "jnb": 3, "jnc": 3, "je": 4, "jz": 4,
+              "jne": 5, "jnz": 5, "jbe": 6, "jna": 6, "ja": 7, "jnbe": 7,
+              "js": 8, "jns": 9, "jp": 10, "jpe": 10, "jnp": 11, "jpo": 11,
+              "jl": 12, "jnge": 12, "jge": 13, "jnl": 13,
+              "jle": 14, "jng": 14, "jg": 15, "jnle": 15}
+
+# Lines of CodeGenerator's output, that produce no code.
+DIRECTIVES = ["code segment", "assume cs:code", "code ends"]
+
+# .COM image is loaded at offset 100h of a 64 KiB segment.
+COM_ORIGIN = 0x100
+COM_MAX_SIZE = 0x10000 - COM_ORIGIN
+
+
+class EncodingError(ValueError):
+    """
+    Is raised when a line of assembler's code is out of the subset, that
+    Assembler supports, or a label can't be resolved.
+    """
+
+    def __init__(self, line, text, reason):
+        ValueError.__init__(self, "line %i: %s: '%s'" % (line, reason, text))
+        self.line = line
+        self.text = text
+        self.reason = reason
+
+
+class Assembler:
+    """
+    Two-pass assembler of the subset of x86 real mode instructions, that
+    CodeGenerator emits, into a flat binary (.COM) image. It replaces an
+    external assembler for generated programs and for assembly insertion
+    files, that keep to the subset.
+
+    Supported lines (case-insensitive; ';' starts a comment):
+        code segment, assume cs:code, code ends - are skipped;
+        end LABEL - program's entry point;
+        @NAME proc, @NAME endp - procedure's label and end;
+        LABEL: [INSTRUCTION] - label definition;
+        push/pop r16 | r32;
+        mov r16, r16 | imm16; mov r8, r8 | imm8;
+        add, or, adc, sbb, and, sub, xor, cmp r16, r16 | imm16 (the same
+        for r8, r8 | imm8);
+        inc/dec r16;
+        jmp/call LABEL, conditional jumps (je, jne, jl, jg, ...) LABEL;
+        int imm8, ret, nop.
+    Numbers are decimal, or hexadecimal with 'h' suffix (and a leading
+    decimal digit: '0ffh'), or binary with 'b' suffix; a register of another
+    size is not an immediate operand. Jumps and calls always use 16-bit
+    displacements, so sizes of instructions don't depend on labels'
+    addresses: the first pass computes addresses of labels, the second one
+    encodes instructions.
+
+    If the program has an entry point, the image begins with a jump to it
+    ('.COM' files start execution at the first byte).
+
+    Class contents dictionaries:
+    1. labels - keys are labels' names (lowercase), values are their
+    addresses: offsets in the image plus 'origin'.
+
+    Class contents integers:
+    1. origin - address, the image is loaded at (COM_ORIGIN for .COM
+    files); the image may take the rest of the 64 KiB segment.
+
+    Class contents strings:
+    1. entry - name of the entry point label, or None.
+
+    Class contents methods:
+    1. __init__(self, origin=COM_ORIGIN)
+    2. assemble(self, text)
+    3. parse_line(self, number, line)
+    4. size(self, instruction)
+    5. encode(self, instruction, address)
+    6. number(self, instruction, operand, bits)
+    7. target(self, instruction, operand)
+    """
+
+    def __init__(self, origin=COM_ORIGIN):
+        self.origin = origin
+        self.labels = {}
+        self.entry = None
+
+    def assemble(self, text):
+        """
+        Assembles 'text'.
+        :param text: assembler's code.
+        :returns bytes of the image.
+        :raises EncodingError if any line can't be encoded.
+        """
+        self.labels = {}
+        self.entry = None
+        instructions = []
+        for number, line in enumerate(text.split("\n"), 1):
+            for instruction in self.parse_line(number, line):
+                instructions.append(instruction)
+        # Pass 1: addresses of labels
+        address = self.origin + (3 if self.entry is not None else 0)
+        for instruction in instructions:
+            if instruction[2] == ":":
+                if instruction[3] in self.labels:
+                    raise EncodingError(instruction[0], instruction[1],
+                                        "label is defined twice")
+                self.labels[instruction[3]] = address
+            else:
+                address += self.size(instruction)
+        if address > 0x10000:
+            raise EncodingError(instructions[-1][0], instructions[-1][1],
+                                "image is larger than %i bytes"
+                                % (0x10000 - self.origin))
+        # Pass 2: encoding
+        res = bytearray()
+        if self.entry is not None:
+            res += self.encode([0, "end " + self.entry, "jmp",
+                                self.entry], self.origin)
+        for instruction in instructions:
+            if instruction[2] != ":":
+                res += self.encode(instruction, self.origin + len(res))
+        return bytes(res)
+
+    def parse_line(self, number, line):
+        """
+        Splits a line of assembler's code into instructions of next type:
+        [N, T, M, O1, O2, ...], where N is line's number, T is line's text, M
+        is mnemonic (':' for label definition) and O1, O2, ... are operands.
+        :returns list of instructions.
+        """
+        text = line.strip()
+        code = text.split(";", 1)[0].strip().lower()
+        if not code or " ".join(code.split()) in DIRECTIVES:
+            return []
+        words = code.split()
+        if words[0] == "end" and len(words) == 2:
+            self.entry = words[1]
+            return []
+        if len(words) == 2 and words[1] in ("proc", "endp"):
+            if words[1] == "proc":
+                return [[number, text, ":", words[0]]]
+            return []
+        res = []
+        if ":" in words[0]:
+            label, code = code.split(":", 1)
+            if not label or " " in label:
+                raise EncodingError(number, text, "bad label")
+            res.append([number, text, ":", label])
+            code = code.strip()
+            if not code:
+                return res
+        words = code.split(None, 1)
+        operands = []
+        if len(words) > 1:
+            operands = [x.strip() for x in words[1].split(",")]
+        res.append([number, text, words[0]] + operands)
+        return res
+
+    def size(self, instruction):
+        """
+        Returns size of 'instruction' in bytes.
+        """
+        return len(self.encode(instruction, None))
+
+    def encode(self, instruction, address):
+        """
+        Encodes 'instruction' (see self.parse_line description).
+        :param address: address of the instruction (see self.origin); if
+        None, labels are not resolved (only the size of the result
+        matters).
+        :returns bytes of machine code.
+        """
+        mnemonic = instruction[2]
+        operands = instruction[3:]
+        if mnemonic in ("ret", "nop") and not operands:
+            return bytes([0xC3 if mnemonic == "ret" else 0x90])
+        if mnemonic in ("push", "pop") and len(operands) == 1:
+            base = 0x50 if mnemonic == "push" else 0x58
+            if operands[0] in REGISTERS_16:
+                return bytes([base + REGISTERS_16[operands[0]]])
+            if operands[0] in REGISTERS_32:
+                # Operand-size prefix
+                return bytes([0x66, base + REGISTERS_32[operands[0]]])
+        elif mnemonic in ("inc", "dec") and len(operands) == 1 and \
+                operands[0] in REGISTERS_16:
+            return bytes([(0x40 if mnemonic == "inc" else 0x48) +
+                          REGISTERS_16[operands[0]]])
+        elif mnemonic == "int" and len(operands) == 1:
+            return bytes([0xCD, self.number(instruction, operands[0], 8)])
+        elif mnemonic in ("jmp", "call") or mnemonic in CONDITIONS:
+            if len(operands) == 1:
+                if mnemonic == "jmp":
+                    opcode = bytes([0xE9])
+                elif mnemonic == "call":
+                    opcode = bytes([0xE8])
+                else:
+                    opcode = bytes([0x0F, 0x80 + CONDITIONS[mnemonic]])
+                displacement = 0
+                if address is not None:
+                    displacement = self.target(instruction, operands[0]) - \
+                        (address + len(opcode) + 2)
+                return opcode + (displacement & 0xFFFF).to_bytes(2, "little")
+        elif (mnemonic == "mov" or mnemonic in ARITHMETIC) and \
+                len(operands) == 2:
+            for registers, bits in ((REGISTERS_16, 16), (REGISTERS_8, 8)):
+                if operands[0] not in registers:
+                    continue
+                dst = registers[operands[0]]
+                if operands[1] in registers:
+                    opcode = 0x89 if mnemonic == "mov" \
+                        else ARITHMETIC[mnemonic][0]
+                    if bits == 8:
+                        opcode -= 1
+                    return bytes([opcode, 0xC0 | registers[operands[1]] << 3
+                                  | dst])
+                value = self.number(instruction, operands[1], bits)
+                if mnemonic == "mov":
+                    res = bytes([(0xB8 if bits == 16 else 0xB0) + dst])
+                else:
+                    res = bytes([0x81 if bits == 16 else 0x80,
+                                 0xC0 | ARITHMETIC[mnemonic][1] << 3 | dst])
+                return res + value.to_bytes(bits // 8, "little")
+        raise EncodingError(instruction[0], instruction[1],
+                            "unsupported instruction")
+
+    @staticmethod
+    def number(instruction, operand, bits):
+        """
+        Converts 'operand' into an unsigned integer of 'bits' bits.
+        Negative numbers are encoded in two's complement. Numbers start with
+        a decimal digit, so that registers (e.g. 'bh') and names are not
+        taken for hexadecimal numbers ('0bh').
+        """
+        if operand in REGISTERS_8 or operand in REGISTERS_16 or \
+                operand in REGISTERS_32:
+            raise EncodingError(instruction[0], instruction[1],
+                                "number expected, not a register")
+        text = operand
+        negative = text[:1] == "-"
+        if negative:
+            text = text[1:]
+        if not text[:1].isdigit() or not text.isalnum():
+            raise EncodingError(instruction[0], instruction[1],
+                                "number expected")
+        try:
+            if text[-1:] == "h":
+                value = int(text[:-1], 16)
+            elif text[-1:] == "b" and text[:-1] and text[:-1].isdigit():
+                value = int(text[:-1], 2)
+            else:
+                value = int(text[:-1] if text[-1:] == "d" else text, 10)
+        except ValueError:
+            raise EncodingError(instruction[0], instruction[1],
+                                "number expected")
+        if negative:
+            value = -value
+        if not -(1 << (bits - 1)) <= value < 1 << bits:
+            raise EncodingError(instruction[0], instruction[1],
+                                "number doesn't fit in %i bits" % bits)
+        return value & ((1 << bits) - 1)
+
+    def target(self, instruction, operand):
+        """
+        Returns address of label 'operand' (see self.labels).
+        """
+        if operand not in self.labels:
+            raise EncodingError(instruction[0], instruction[1],
+                                "undefined label")
+        return self.labels[operand]
+
+
+def assemble(text, origin=COM_ORIGIN):
+    """
+    Assembles 'text' into .COM image (see Assembler description).
+    :returns bytes of the image.
+    :raises EncodingError if the code is out of supported subset.
+    """
+    return Assembler(origin).assemble(text)
+
+
+def write_image(filename, text):
+    """
+    Assembles 'text' and writes the image into 'filename'.
+    :raises EncodingError (nothing is written then).
+    """
+    image = assemble(text)
+    f = open(filename, "wb")
+    f.write(image)
+    f.close()
+    return len(image)
+
+
+if __name__ == "__main__":
+    # Usage: x86_backend.py FILE.asm... - writes FILE.com images
+    status = 0
+    for name in sys.argv[1:]:
+        base = name[:-4] if name[-4:].lower() == ".asm" else name
+        f = open(base + ".asm", "r")
+        source = f.read()
+        f.close()
+        try:
+            size = write_image(base + ".com", source)
+            print("%s.com: %i bytes" % (base, size))
+        except EncodingError as e:
+            print("%s.asm: %s" % (base, e))
+            status = 1
+    sys.exit(status)